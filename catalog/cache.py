@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+
+class ProfileCatalogCache:
+    """
+    Représentation sérialisée des profils actifs, gardée en mémoire par processus.
+
+    Une version partagée (cache Django) est changée à chaque écriture d'un
+    profil ou de ses valeurs (signals.py) : chaque processus reconstruit sa
+    copie locale dès que la version ne correspond plus.
+    """
+
+    VERSION_KEY = 'catalog:profiles:version'
+
+    _lock = threading.Lock()
+    _local = None  # (version, catalogue)
+
+    @staticmethod
+    def get_version():
+        """
+        Version courante du catalogue.
+
+        Returns:
+            dict: version (str) et modified (timestamp de la dernière écriture)
+        """
+        version = cache.get(ProfileCatalogCache.VERSION_KEY)
+        if version is None:
+            version = ProfileCatalogCache.bump_version()
+        return version
+
+    @staticmethod
+    def bump_version():
+        """Invalide le catalogue en mémoire de tous les processus."""
+        version = {
+            'version': f"{time.time_ns():x}",
+            'modified': time.time(),
+        }
+        cache.set(ProfileCatalogCache.VERSION_KEY, version, None)
+        return version
+
+    @staticmethod
+    def get_queryset():
+        """Profils actifs avec leurs valeurs de spécification et de paramètre préchargées."""
+        from .models import ProfileTemplate, ProfileSpecValue, ProfileParamValue
+
+        return ProfileTemplate.objects.filter(is_active=True).order_by('name').prefetch_related(
+            Prefetch(
+                'profilespecvalue_set',
+                queryset=ProfileSpecValue.objects.select_related('spec_item').order_by('id')
+            ),
+            Prefetch(
+                'profileparamvalue_set',
+                queryset=ProfileParamValue.objects.select_related('param_item').order_by('id')
+            ),
+        )
+
+    @staticmethod
+    def get_catalog():
+        """
+        Catalogue des profils actifs (sérialisation complète), recalculé si la version a changé.
+
+        Returns:
+            dict: profiles (liste triée par nom) et by_id (profil par id)
+        """
+        from .serializers import ProfileTemplateSerializer
+
+        version = ProfileCatalogCache.get_version()['version']
+        local = ProfileCatalogCache._local
+        if local is not None and local[0] == version:
+            return local[1]
+
+        with ProfileCatalogCache._lock:
+            local = ProfileCatalogCache._local
+            if local is not None and local[0] == version:
+                return local[1]
+
+            profiles = ProfileTemplateSerializer(ProfileCatalogCache.get_queryset(), many=True).data
+            catalog = {
+                'profiles': profiles,
+                'by_id': {profile['id']: profile for profile in profiles},
+            }
+            ProfileCatalogCache._local = (version, catalog)
+            return catalog
+
+    @staticmethod
+    def get_profile(pk):
+        """Profil actif sérialisé, ou None."""
+        try:
+            return ProfileCatalogCache.get_catalog()['by_id'].get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def etag():
+        """ETag du catalogue, dérivé de sa version."""
+        version = ProfileCatalogCache.get_version()['version']
+        return hashlib.md5(f"catalog:{version}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def last_modified():
+        """Date de la dernière modification du catalogue."""
+        version = ProfileCatalogCache.get_version()
+        return datetime.fromtimestamp(version['modified'], tz=dt_timezone.utc)
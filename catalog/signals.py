@@ -1 +1,16 @@
-# Fichier vide - les signaux ont été supprimés avec les modèles
\ No newline at end of file
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import ProfileCatalogCache
+from .models import ProfileTemplate, ProfileSpecValue, ProfileParamValue, SpecItem, ParamItem
+
+
+@receiver([post_save, post_delete], sender=ProfileTemplate)
+@receiver([post_save, post_delete], sender=ProfileSpecValue)
+@receiver([post_save, post_delete], sender=ProfileParamValue)
+@receiver([post_save, post_delete], sender=SpecItem)
+@receiver([post_save, post_delete], sender=ParamItem)
+def invalidate_profile_catalog(sender, **kwargs):
+    """Invalide le catalogue des profils en cache après le commit."""
+    transaction.on_commit(ProfileCatalogCache.bump_version)
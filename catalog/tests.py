@@ -1,3 +1,78 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from .models import ProfileTemplate, ProfileSpecValue, ProfileParamValue, SpecItem, ParamItem
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProfileCatalogAPITest(TestCase):
+    """Tests du catalogue des profils (préchargement, cache, requêtes conditionnelles)."""
+
+    def setUp(self):
+        cache.clear()
+        self.spec_items = [
+            SpecItem.objects.create(name=f'spec_{i}', display_name=f'Spec {i}', unit='mm', order=i)
+            for i in range(3)
+        ]
+        self.param_items = [
+            ParamItem.objects.create(name=f'param_{i}', display_name=f'Param {i}', category='autre', order=i)
+            for i in range(3)
+        ]
+        for name in ['40g/m²', '80g/m²']:
+            profile = ProfileTemplate.objects.create(name=name)
+            for spec_item in self.spec_items:
+                ProfileSpecValue.objects.create(profile=profile, spec_item=spec_item, value_nominal=1)
+            for param_item in self.param_items:
+                ProfileParamValue.objects.create(profile=profile, param_item=param_item, value=10)
+        self.profile = ProfileTemplate.objects.get(name='80g/m²')
+
+    def test_catalog_is_prefetched(self):
+        # Profils + valeurs de spécification + valeurs de paramètre
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('catalog:profile-catalog'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['name'] for p in response.json()], ['40g/m²', '80g/m²'])
+        self.assertEqual(len(response.json()[0]['profilespecvalue_set']), 3)
+        self.assertEqual(response.json()[0]['profileparamvalue_set'][0]['param_item']['name'], 'param_0')
+
+    def test_detail_is_served_from_cache(self):
+        url = reverse('catalog:profile-detail', args=[self.profile.pk])
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+
+        self.assertEqual(response.json()['name'], '80g/m²')
+        self.assertEqual(len(response.json()['profilespecvalue_set']), 3)
+
+    def test_conditional_get_and_invalidation(self):
+        url = reverse('catalog:profile-list')
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            spec_value = ProfileSpecValue.objects.filter(profile=self.profile).first()
+            spec_value.value_nominal = 2
+            spec_value.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        detail = self.client.get(reverse('catalog:profile-detail', args=[self.profile.pk])).json()
+        self.assertEqual(float(detail['profilespecvalue_set'][0]['value_nominal']), 2)
+
+    def test_inactive_profile_not_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.is_active = False
+            self.profile.save()
+
+        response = self.client.get(reverse('catalog:profile-detail', args=[self.profile.pk]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,144 @@
+import threading
+
+from .cache import ProfileCatalogCache
+
+
+# Noms des spécifications (SpecItem.name) utilisées pour la conformité des rouleaux
+THICKNESS_SPEC = 'Épaisseur'
+GRAMMAGE_SPEC = 'Masse Surfacique Globale'
+
+# Paramètres machine (ParamItem.name, en minuscules) donnant la laize du feutre en mètres
+FELT_WIDTH_PARAMS = ['laize', 'largeur', 'largeur feutre', 'felt_width']
+DEFAULT_FELT_WIDTH = 1.0
+
+
+def _to_float(value):
+    return float(value) if value is not None else None
+
+
+class SpecTolerance:
+    """Seuils d'une spécification de profil, convertis une fois pour toutes en float."""
+
+    __slots__ = (
+        'value_min', 'value_min_alert', 'value_nominal', 'value_max_alert',
+        'value_max', 'max_nok', 'is_blocking',
+    )
+
+    def __init__(self, value_min=None, value_min_alert=None, value_nominal=None,
+                 value_max_alert=None, value_max=None, max_nok=None, is_blocking=False):
+        self.value_min = _to_float(value_min)
+        self.value_min_alert = _to_float(value_min_alert)
+        self.value_nominal = _to_float(value_nominal)
+        self.value_max_alert = _to_float(value_max_alert)
+        self.value_max = _to_float(value_max)
+        self.max_nok = max_nok
+        self.is_blocking = is_blocking
+
+    @property
+    def has_limits(self):
+        """La spec définit au moins une limite critique (min ou max)."""
+        return self.value_min is not None or self.value_max is not None
+
+    def classify(self, value):
+        """
+        Classe une valeur mesurée (mêmes règles que l'interface de saisie).
+
+        Returns:
+            str: 'nok' hors limites min/max, 'alert' hors seuils d'alerte, 'ok' sinon
+        """
+        value = float(value)
+        if self.value_min is not None and value < self.value_min:
+            return 'nok'
+        if self.value_max is not None and value > self.value_max:
+            return 'nok'
+        if self.value_min_alert is not None and value < self.value_min_alert:
+            return 'alert'
+        if self.value_max_alert is not None and value > self.value_max_alert:
+            return 'alert'
+        return 'ok'
+
+    def classify_many(self, values):
+        """Classe une série de valeurs (seuils déjà compilés, aucune requête)."""
+        return [self.classify(value) for value in values]
+
+
+class ToleranceIndex:
+    """
+    Index des spécifications et paramètres de tous les profils.
+
+    Compilé en trois requêtes et gardé en mémoire par processus ; il suit
+    la version de ProfileCatalogCache et est donc recompilé après toute
+    modification d'un profil, de ses spécifications ou de ses paramètres.
+    """
+
+    _lock = threading.Lock()
+    _local = None  # (version, index)
+
+    @staticmethod
+    def build():
+        """
+        Compile l'index depuis ProfileSpecValue et ProfileParamValue.
+
+        Returns:
+            dict: specs {(profile_id, nom de spec): SpecTolerance},
+                  params {(profile_id, nom de paramètre en minuscules): float},
+                  profiles {nom du profil: profile_id}
+        """
+        from .models import ProfileTemplate, ProfileSpecValue, ProfileParamValue
+
+        spec_rows = ProfileSpecValue.objects.values_list(
+            'profile_id', 'spec_item__name',
+            'value_min', 'value_min_alert', 'value_nominal', 'value_max_alert', 'value_max',
+            'max_nok', 'is_blocking',
+        )
+        param_rows = ProfileParamValue.objects.values_list('profile_id', 'param_item__name', 'value')
+
+        return {
+            'specs': {
+                (profile_id, spec_name): SpecTolerance(*values)
+                for profile_id, spec_name, *values in spec_rows
+            },
+            'params': {
+                (profile_id, param_name.lower()): float(value)
+                for profile_id, param_name, value in param_rows
+            },
+            'profiles': dict(ProfileTemplate.objects.values_list('name', 'id')),
+        }
+
+    @staticmethod
+    def get_index():
+        version = ProfileCatalogCache.get_version()['version']
+        local = ToleranceIndex._local
+        if local is not None and local[0] == version:
+            return local[1]
+
+        with ToleranceIndex._lock:
+            local = ToleranceIndex._local
+            if local is not None and local[0] == version:
+                return local[1]
+            index = ToleranceIndex.build()
+            ToleranceIndex._local = (version, index)
+            return index
+
+    @staticmethod
+    def get(profile_id, spec_name):
+        """Tolérance d'une spec pour un profil, ou None si le profil ne la définit pas."""
+        if not profile_id:
+            return None
+        return ToleranceIndex.get_index()['specs'].get((int(profile_id), spec_name))
+
+    @staticmethod
+    def get_felt_width(profile_id):
+        """Laize du feutre (m) d'un profil, DEFAULT_FELT_WIDTH si non renseignée."""
+        if profile_id:
+            params = ToleranceIndex.get_index()['params']
+            for name in FELT_WIDTH_PARAMS:
+                width = params.get((int(profile_id), name))
+                if width:
+                    return width
+        return DEFAULT_FELT_WIDTH
+
+    @staticmethod
+    def get_profile_id(profile_name):
+        """Id d'un profil d'après son nom (profil historisé dans le TRS), ou None."""
+        return ToleranceIndex.get_index()['profiles'].get(profile_name)
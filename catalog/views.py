@@ -1,23 +1,79 @@
+from django.http import Http404
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import viewsets
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from .cache import ProfileCatalogCache
 from .models import ProfileTemplate, QualityDefectType
 from .serializers import ProfileTemplateSerializer, ProfileTemplateListSerializer, QualityDefectTypeSerializer
 
 
+def catalog_etag(request, *args, **kwargs):
+    return ProfileCatalogCache.etag()
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return ProfileCatalogCache.last_modified()
+
+
+# Réponse conditionnelle (ETag, Last-Modified, 304) dérivée de la version du catalogue
+catalog_condition = method_decorator(
+    condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+)
+
+
 class ProfileTemplateViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet pour la consultation des profils."""
+    """
+    ViewSet pour la consultation des profils.
+    
+    La liste et le détail sont servis depuis ProfileCatalogCache (profils
+    actifs sérialisés une fois par version du catalogue) et supportent les
+    requêtes conditionnelles.
+    """
     queryset = ProfileTemplate.objects.filter(is_active=True).order_by('name')
     permission_classes = [AllowAny]
     
+    def get_queryset(self):
+        return ProfileCatalogCache.get_queryset()
+    
     def get_serializer_class(self):
         """Utilise un serializer différent pour la liste et le détail."""
         if self.action == 'list':
             return ProfileTemplateListSerializer
         return ProfileTemplateSerializer
     
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method == 'GET':
+            # Toujours revalider auprès du serveur (304 si rien n'a changé)
+            patch_cache_control(response, no_cache=True)
+        return response
+    
+    @catalog_condition
+    def list(self, request, *args, **kwargs):
+        fields = ProfileTemplateListSerializer.Meta.fields
+        profiles = ProfileCatalogCache.get_catalog()['profiles']
+        return Response([
+            {field: profile[field] for field in fields} for profile in profiles
+        ])
+    
+    @catalog_condition
+    def retrieve(self, request, *args, **kwargs):
+        profile = ProfileCatalogCache.get_profile(kwargs.get('pk'))
+        if profile is None:
+            raise Http404
+        return Response(profile)
+    
+    @action(detail=False, methods=['get'])
+    @catalog_condition
+    def catalog(self, request):
+        """Catalogue complet des profils actifs (spécifications et paramètres inclus)."""
+        return Response(ProfileCatalogCache.get_catalog()['profiles'])
+    
     @action(detail=True, methods=['post'])
     def set_active(self, request, pk=None):
         """Marquer ce profil comme actif et désactiver les autres."""
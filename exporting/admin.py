@@ -1,3 +1,26 @@
 from django.contrib import admin
+from .models import ExportJob
 
-# Register your models here.
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """Administration de la file d'export Excel."""
+    
+    list_display = ['roll', 'status', 'attempts', 'available_at', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['roll__roll_id', 'last_error']
+    ordering = ['-created_at']
+    readonly_fields = ['roll', 'attempts', 'last_error', 'created_at', 'updated_at']
+    
+    actions = ['retry_jobs']
+    
+    def retry_jobs(self, request, queryset):
+        """Remet en attente les jobs en échec sélectionnés."""
+        from .services import export_queue
+        count = 0
+        for job in queryset.filter(status='failed'):
+            export_queue.enqueue(job.roll_id)
+            job.delete()
+            count += 1
+        self.message_user(request, f"{count} job(s) remis en attente.")
+    retry_jobs.short_description = "Relancer les jobs en échec"
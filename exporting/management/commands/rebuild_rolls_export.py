@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exporting.services import RollExcelExporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Régénère rolls_export.xlsx et ses archives depuis la base de données "
+        "(fichier corrompu ou perdu). Les anciens fichiers sont conservés dans "
+        "exports/replaced_<date>/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Nombre de rouleaux lus par requête',
+        )
+        parser.add_argument(
+            '--discard-old',
+            action='store_true',
+            help='Supprimer les anciens fichiers au lieu de les conserver',
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size doit être >= 1')
+
+        exporter = RollExcelExporter()
+        self.stdout.write(self.style.MIGRATE_HEADING('Reconstruction de rolls_export.xlsx'))
+        start = time.monotonic()
+
+        def progress(written, total):
+            elapsed = time.monotonic() - start
+            percent = written * 100 // total if total else 100
+            self.stdout.write(f"  {written}/{total} rouleaux ({percent}%) - {elapsed:.0f}s")
+
+        try:
+            result = exporter.rebuild(
+                chunk_size=options['chunk_size'],
+                progress=progress,
+                keep_old=not options['discard_old'],
+            )
+        except TimeoutError as e:
+            raise CommandError(f"Classeur en cours d'écriture : {e}")
+
+        for path in result['archives']:
+            self.stdout.write(f"  Archive : {path}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['rows']} rouleau(x) exporté(s) en {time.monotonic() - start:.1f}s "
+            f"({len(result['archives'])} archive(s)) -> {exporter.get_export_path()}"
+        ))
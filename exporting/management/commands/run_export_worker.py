@@ -0,0 +1,120 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from exporting.services import FileLock, RollExcelExporter, export_queue
+from production.models import Roll
+
+
+class Command(BaseCommand):
+    help = (
+        "Traite la file d'export Excel des rouleaux. Un seul worker peut "
+        "tourner à la fois : c'est le seul processus qui écrit rolls_export.xlsx. "
+        "Les lignes sont ajoutées au journal ; le classeur est réécrit tous les "
+        "batch_size lignes de l'exporter, ou quand la file est vide et que "
+        "--flush-interval est écoulé"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Vider la file puis s'arrêter (au lieu de tourner en continu)",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Nombre maximum de jobs traités par écriture du classeur',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help="Attente (secondes) quand la file est vide",
+        )
+        parser.add_argument(
+            '--flush-interval',
+            type=float,
+            default=30.0,
+            help="Délai minimum (secondes) entre deux écritures du classeur quand la file est vide",
+        )
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=7,
+            help='Durée de conservation des jobs terminés (jours)',
+        )
+
+    def handle(self, *args, **options):
+        exporter = RollExcelExporter()
+        worker_lock = FileLock(export_queue.worker_lock_path, timeout=0)
+        
+        if not worker_lock.acquire(blocking=False):
+            raise CommandError("Un worker d'export est déjà en cours d'exécution")
+        
+        try:
+            recovered = export_queue.recover()
+            if recovered:
+                self.stdout.write(f"{recovered} job(s) interrompu(s) remis en attente")
+            
+            purged = export_queue.purge(older_than_days=options['keep_days'])
+            if purged:
+                self.stdout.write(f"{purged} job(s) terminé(s) supprimé(s)")
+            
+            self.stdout.write(self.style.SUCCESS("Worker d'export démarré"))
+            
+            last_flush = time.monotonic()
+            while True:
+                worker_lock.refresh()
+                processed = self._process_batch(exporter, options['batch_size'])
+                
+                if processed:
+                    continue
+                
+                # File vide : écrire le classeur si des lignes attendent depuis assez longtemps
+                if exporter.pending_count() and (
+                    options['once'] or time.monotonic() - last_flush >= options['flush_interval']
+                ):
+                    success, result = exporter.flush()
+                    if success:
+                        last_flush = time.monotonic()
+                    else:
+                        # Le journal est conservé : nouvel essai au prochain passage
+                        self.stderr.write(f"Erreur écriture du classeur: {result}")
+                
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                
+        except KeyboardInterrupt:
+            self.stdout.write("Arrêt du worker d'export")
+        finally:
+            worker_lock.release()
+
+    def _process_batch(self, exporter, batch_size):
+        """
+        Ajouter au journal les lignes d'un lot de jobs.
+        
+        Un job est terminé dès que sa ligne est dans le journal : le journal
+        est conservé jusqu'à ce qu'une écriture du classeur réussisse.
+        """
+        jobs = export_queue.claim_batch(limit=batch_size)
+        if not jobs:
+            return 0
+        
+        # Lignes de tout le lot construites en un nombre fixe de requêtes
+        exported = []
+        success, result = exporter.export_rolls(
+            Roll.objects.filter(id__in=[job.roll_id for job in jobs]), update=True
+        )
+        if success:
+            exported = jobs
+            export_queue.mark_done(exported)
+        else:
+            for job in jobs:
+                export_queue.mark_failed(job, result)
+            self.stderr.write(f"Erreur export des rouleaux: {result}")
+        
+        self.stdout.write(f"{len(exported)}/{len(jobs)} rouleau(x) exporté(s)")
+        return len(jobs)
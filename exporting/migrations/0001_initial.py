@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('production', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], default='pending', max_length=20, verbose_name='Statut')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Tentatives')),
+                ('last_error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Date avant laquelle le job ne sera pas repris (délai entre tentatives)', verbose_name='Disponible à partir de')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('roll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='production.roll', verbose_name='Rouleau')),
+            ],
+            options={
+                'verbose_name': "Job d'export",
+                'verbose_name_plural': "Jobs d'export",
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='exporting_e_status_bdee9b_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('roll',), name='unique_pending_export_job_per_roll')],
+            },
+        ),
+    ]
@@ -1,3 +1,69 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
-# Create your models here.
+
+class ExportJob(models.Model):
+    """Job d'export Excel d'un rouleau, traité par la commande run_export_worker."""
+    
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+    
+    # Relations
+    roll = models.ForeignKey(
+        'production.Roll',
+        on_delete=models.CASCADE,
+        related_name='export_jobs',
+        verbose_name="Rouleau"
+    )
+    
+    # État du job
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Statut"
+    )
+    
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Tentatives"
+    )
+    
+    last_error = models.TextField(
+        blank=True,
+        verbose_name="Dernière erreur"
+    )
+    
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Disponible à partir de",
+        help_text="Date avant laquelle le job ne sera pas repris (délai entre tentatives)"
+    )
+    
+    # Métadonnées
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Job d'export"
+        verbose_name_plural = "Jobs d'export"
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+        constraints = [
+            # Un seul job en attente par rouleau : les mises à jour successives sont fusionnées
+            models.UniqueConstraint(
+                fields=['roll'],
+                condition=Q(status='pending'),
+                name='unique_pending_export_job_per_roll'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Export rouleau {self.roll_id} ({self.get_status_display()})"
@@ -1,10 +1,82 @@
+import csv
+import json
 import os
 import shutil
-from datetime import datetime
+import tempfile
+import time
+from datetime import date, datetime, timedelta
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Prefetch, Q
+from django.utils import timezone
 from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment
-from production.models import Roll, CurrentProfile
+from production.models import Roll
+from quality.models import RollDefect
+from .models import ExportJob
+
+
+class FileLock:
+    """
+    Verrou inter-processus basé sur la création exclusive d'un fichier.
+    
+    Portable (pas de fcntl) ; un verrou non rafraîchi depuis `stale_after`
+    secondes est considéré abandonné (processus tué) et peut être repris.
+    """
+    
+    def __init__(self, path, timeout=30, stale_after=300):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+    
+    def _is_stale(self):
+        try:
+            return time.time() - os.path.getmtime(self.path) > self.stale_after
+        except FileNotFoundError:
+            return False
+    
+    def acquire(self, blocking=True):
+        """Prendre le verrou. Retourne False si non obtenu."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return True
+            except FileExistsError:
+                if self._is_stale():
+                    self.release()
+                    continue
+                if not blocking or time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.05)
+    
+    def refresh(self):
+        """Signaler que le détenteur du verrou est toujours actif."""
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            pass
+    
+    def is_locked(self):
+        """Le verrou est-il détenu par un processus actif ?"""
+        return os.path.exists(self.path) and not self._is_stale()
+    
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+    
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError(f"Verrou {self.path} non obtenu après {self.timeout}s")
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
 
 
 class RollExcelExporter:
@@ -15,6 +87,17 @@ class RollExcelExporter:
         self.filename = 'rolls_export.xlsx'
         self.filepath = os.path.join(self.excel_dir, self.filename)
         self.max_rows = 10000  # Rotation après 10000 lignes
+        self.batch_size = 50  # Écriture du classeur toutes les 50 lignes en attente
+        
+        # Index persistant id rouleau -> numéro de ligne du classeur
+        self.index_path = os.path.join(self.excel_dir, 'rolls_export.index.json')
+        # Métadonnées du classeur (nombre de lignes, dernier rouleau, taille) lues sans l'ouvrir
+        self.meta_path = os.path.join(self.excel_dir, 'rolls_export.meta.json')
+        # Journal des lignes en attente d'écriture dans le classeur
+        self.journal_path = os.path.join(self.excel_dir, 'rolls_export.pending.jsonl')
+        self.processing_path = self.journal_path + '.processing'
+        # Verrou d'écriture du classeur (worker, téléchargement)
+        self.lock_path = os.path.join(self.excel_dir, 'rolls_export.lock')
         
         # Créer le répertoire si nécessaire
         os.makedirs(self.excel_dir, exist_ok=True)
@@ -28,56 +111,111 @@ class RollExcelExporter:
             'Défauts', 'Profil', 'Commentaire'
         ]
     
+    # Largeur des colonnes
+    column_widths = {
+        'A': 8,   # ID
+        'B': 20,  # ID Rouleau
+        'C': 10,  # OF
+        'D': 10,  # Numéro
+        'E': 20,  # Date/Heure
+        'F': 20,  # Opérateur
+        'G': 25,  # Shift
+        'H': 12,  # Longueur (m)
+        'I': 15,  # Statut
+        'J': 15,  # Destination
+        'K': 12,  # Masse Tube
+        'L': 12,  # Masse Totale
+        'M': 12,  # Masse Nette
+        'N': 15,  # Défauts Bloquants
+        'O': 18,  # Problèmes Épaisseur
+        'P': 18,  # Épaisseur Moy. Gauche
+        'Q': 18,  # Épaisseur Moy. Droite
+        'R': 15,  # Grammage Calc.
+        'S': 30,  # Défauts
+        'T': 20,  # Profil
+        'U': 30,  # Commentaire
+    }
+    
+    # Styles
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+    header_align = Alignment(horizontal="center", vertical="center")
+    nok_fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
+    
     def _create_workbook(self):
         """Créer un nouveau fichier Excel avec les en-têtes."""
         wb = Workbook()
         ws = wb.active
         ws.title = "Rouleaux"
         
-        # Style pour les en-têtes
-        header_font = Font(bold=True)
-        header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-        header_align = Alignment(horizontal="center", vertical="center")
-        
         # Ajouter les en-têtes
         for col, header in enumerate(self.headers, 1):
             cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_align
-            
-        # Largeur des colonnes
-        column_widths = {
-            'A': 8,   # ID
-            'B': 20,  # ID Rouleau
-            'C': 10,  # OF
-            'D': 10,  # Numéro
-            'E': 20,  # Date/Heure
-            'F': 20,  # Opérateur
-            'G': 25,  # Shift
-            'H': 12,  # Longueur (m)
-            'I': 15,  # Statut
-            'J': 15,  # Destination
-            'K': 12,  # Masse Tube
-            'L': 12,  # Masse Totale
-            'M': 12,  # Masse Nette
-            'N': 15,  # Défauts Bloquants
-            'O': 18,  # Problèmes Épaisseur
-            'P': 18,  # Épaisseur Moy. Gauche
-            'Q': 18,  # Épaisseur Moy. Droite
-            'R': 15,  # Grammage Calc.
-            'S': 30,  # Défauts
-            'T': 20,  # Profil
-            'U': 30,  # Commentaire
-        }
+            cell.font = self.header_font
+            cell.fill = self.header_fill
+            cell.alignment = self.header_align
         
-        for col, width in column_widths.items():
+        for col, width in self.column_widths.items():
             ws.column_dimensions[col].width = width
             
         return wb
     
+    def _create_write_only_workbook(self):
+        """
+        Créer un classeur en mode write-only (lignes écrites au fil de l'eau),
+        avec la même mise en forme que _create_workbook.
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Rouleaux")
+        
+        for col, width in self.column_widths.items():
+            ws.column_dimensions[col].width = width
+        
+        header = []
+        for value in self.headers:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = self.header_font
+            cell.fill = self.header_fill
+            cell.alignment = self.header_align
+            header.append(cell)
+        ws.append(header)
+        
+        return wb, ws
+    
+    @staticmethod
+    def with_export_relations(rolls):
+        """
+        Rouleaux avec toutes les données utiles à l'export chargées d'avance.
+        
+        Opérateur, TRS (profil utilisé), OF et défauts sont lus en un nombre
+        fixe de requêtes, quel que soit le nombre de rouleaux.
+        """
+        return rolls.select_related(
+            'shift__operator', 'shift__trs', 'fabrication_order'
+        ).prefetch_related(
+            Prefetch('defects', queryset=RollDefect.objects.select_related('defect_type'))
+        )
+    
+    def iter_roll_rows(self, rolls, chunk_size=None):
+        """
+        Lignes d'export d'un ensemble de rouleaux : (rouleau, ligne).
+        
+        Args:
+            rolls: QuerySet de rouleaux
+            chunk_size: Lecture par paquets (iterator) pour les gros volumes
+        """
+        rolls = self.with_export_relations(rolls)
+        if chunk_size:
+            rolls = rolls.iterator(chunk_size=chunk_size)
+        for roll in rolls:
+            yield roll, self._get_roll_data(roll)
+    
     def _get_roll_data(self, roll):
-        """Extraire TOUTES les données d'un rouleau pour l'export."""
+        """
+        Extraire TOUTES les données d'un rouleau pour l'export.
+        
+        N'exécute aucune requête si le rouleau vient de with_export_relations.
+        """
         # Défauts
         defects = roll.defects.all()
         defects_str = ', '.join([
@@ -85,17 +223,11 @@ class RollExcelExporter:
             for d in defects
         ])
         
-        # Profil - récupérer depuis CurrentProfile ou depuis l'OF
+        # Profil utilisé pendant le poste (historisé dans le TRS)
         profile_name = ''
-        
-        # Essayer depuis CurrentProfile d'abord
-        current_profile = CurrentProfile.objects.first()
-        if current_profile and current_profile.profile:
-            profile_name = current_profile.profile.name
-        
-        # Sinon essayer depuis l'OF
-        if not profile_name and roll.fabrication_order and hasattr(roll.fabrication_order, 'profile'):
-            profile_name = roll.fabrication_order.profile.name
+        trs = getattr(roll.shift, 'trs', None) if roll.shift else None
+        if trs is not None:
+            profile_name = trs.profile_name
         
         return [
             roll.id,  # ID unique de la base de données
@@ -121,81 +253,556 @@ class RollExcelExporter:
             roll.comment or ''
         ]
     
-    def _check_rotation(self):
-        """Vérifier si le fichier doit être archivé."""
+    def _load_index(self):
+        """Charger l'index id rouleau -> ligne (reconstruit si absent)."""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            return {'rows': index.get('rows', {}), 'last_row': index.get('last_row', 1)}
+        
+        index = {'rows': {}, 'last_row': 1}
         if os.path.exists(self.filepath):
-            wb = load_workbook(self.filepath)
+            # Ancien fichier sans index : une seule lecture de la colonne A
+            wb = load_workbook(self.filepath, read_only=True)
             ws = wb.active
-            row_count = ws.max_row
+            for row_num, row in enumerate(ws.iter_rows(min_row=2, max_col=1, values_only=True), 2):
+                if row[0] is not None:
+                    index['rows'][str(row[0])] = row_num
+                index['last_row'] = row_num
             wb.close()
+        return index
+    
+    def _save_index(self, index):
+        """Écrire l'index de façon atomique."""
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+    
+    def _save_metadata(self, index):
+        """Enregistrer les métadonnées du classeur qui vient d'être écrit."""
+        stats = os.stat(self.filepath)
+        meta = {
+            'row_count': index['last_row'] - 1,  # -1 pour les en-têtes
+            'last_roll_id': max(map(int, index['rows']), default=None),
+            'last_write': time.time(),
+            'file_size': stats.st_size,
+            'file_mtime': stats.st_mtime,
+        }
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+        return meta
+    
+    def get_metadata(self):
+        """
+        Métadonnées du classeur actif, sans l'ouvrir.
+        
+        Si le fichier a été modifié hors de l'exporter (taille ou date
+        différente), elles sont recalculées une fois depuis l'index. Sans
+        attendre le verrou : pendant une écriture, les dernières métadonnées
+        connues sont renvoyées (l'écriture les met à jour en fin de lot).
+        
+        Returns:
+            dict: row_count, last_roll_id, last_write, file_size, file_mtime ;
+                  None si le classeur n'existe pas (ou n'a pas encore de
+                  métadonnées pendant une écriture)
+        """
+        try:
+            stats = os.stat(self.filepath)
+        except FileNotFoundError:
+            return None
+        
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        
+        if meta and meta.get('file_size') == stats.st_size and meta.get('file_mtime') == stats.st_mtime:
+            return meta
+        
+        lock = FileLock(self.lock_path)
+        if not lock.acquire(blocking=False):
+            return meta
+        try:
+            return self._save_metadata(self._load_index())
+        finally:
+            lock.release()
+    
+    def _check_rotation(self, index):
+        """Vérifier si le fichier doit être archivé (sans ouvrir le classeur)."""
+        if os.path.exists(self.filepath) and index['last_row'] >= self.max_rows:
+            # Archiver le fichier
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            archive_name = f'rolls_export_{timestamp}.xlsx'
+            archive_path = os.path.join(self.excel_dir, 'archives', archive_name)
             
-            if row_count >= self.max_rows:
-                # Archiver le fichier
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                archive_name = f'rolls_export_{timestamp}.xlsx'
-                archive_path = os.path.join(self.excel_dir, 'archives', archive_name)
-                
-                # Créer le répertoire d'archives
-                os.makedirs(os.path.dirname(archive_path), exist_ok=True)
-                
-                # Déplacer le fichier
-                shutil.move(self.filepath, archive_path)
-                return True
+            # Créer le répertoire d'archives
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            
+            # Déplacer le fichier et repartir d'un index vide
+            shutil.move(self.filepath, archive_path)
+            index['rows'] = {}
+            index['last_row'] = 1
+            return True
         return False
     
+    def pending_count(self):
+        """Nombre de lignes en attente dans le journal."""
+        count = 0
+        for path in (self.processing_path, self.journal_path):
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    count += sum(1 for line in f if line.strip())
+        return count
+    
     def export_roll(self, roll, update=True):
-        """Ajouter ou mettre à jour un rouleau dans le fichier Excel."""
+        """Ajouter ou mettre à jour un rouleau dans l'export (voir export_rolls)."""
+        return self.export_rolls(Roll.objects.filter(pk=roll.pk), update=update)
+    
+    def export_rolls(self, rolls, update=True):
+        """
+        Ajouter ou mettre à jour des rouleaux dans l'export.
+        
+        Les lignes sont ajoutées au journal (coût constant) ; le classeur n'est
+        réécrit que par lot de `batch_size` lignes, au téléchargement ou à
+        la rotation (voir flush).
+        
+        L'ajout est fait sous le verrou d'écriture : un flush concurrent ne
+        peut pas isoler puis supprimer le journal pendant qu'on y écrit.
+        
+        Args:
+            rolls: QuerySet de rouleaux
+        """
         try:
-            # Vérifier la rotation
-            self._check_rotation()
+            # Lignes construites avant de prendre le verrou (requêtes en base)
+            lines = [
+                json.dumps({
+                    'id': roll.id,
+                    'row': row,
+                    'update': update,
+                    'conforme': roll.status == 'CONFORME',
+                }) + '\n'
+                for roll, row in self.iter_roll_rows(rolls)
+            ]
             
-            # Charger ou créer le fichier
-            if os.path.exists(self.filepath):
-                wb = load_workbook(self.filepath)
-                ws = wb.active
-            else:
-                wb = self._create_workbook()
-                ws = wb.active
+            with FileLock(self.lock_path):
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
             
-            # Récupérer les données du rouleau
-            row_data = self._get_roll_data(roll)
+            if self.pending_count() >= self.batch_size:
+                return self.flush()
             
-            # Chercher si le rouleau existe déjà (par ID en colonne A)
-            roll_row = None
-            if update:
-                for row_num in range(2, ws.max_row + 1):  # Commencer à 2 pour skip les en-têtes
-                    if ws.cell(row=row_num, column=1).value == roll.id:
-                        roll_row = row_num
-                        break
+            return True, self.filepath
+            
+        except Exception as e:
+            return False, str(e)
+    
+    def flush(self):
+        """Écrire les lignes en attente dans le classeur en une seule passe."""
+        try:
+            with FileLock(self.lock_path):
+                return self._flush()
+        except Exception as e:
+            return False, str(e)
+    
+    def _flush(self):
+        """
+        Corps de flush, appelé avec le verrou d'écriture.
+        
+        Le classeur est relu et réécrit en entier (un xlsx est une archive
+        zip, il ne peut pas être modifié en place) : ce coût reste
+        proportionnel à la taille du fichier, mais il n'est payé qu'une fois
+        par lot de lignes et non plus à chaque rouleau.
+        """
+        # Isoler le journal courant : les nouveaux ajouts vont dans un journal neuf
+        if not os.path.exists(self.processing_path):
+            if not os.path.exists(self.journal_path):
+                return True, self.filepath
+            os.replace(self.journal_path, self.processing_path)
+        
+        # Dédoublonner : la dernière version de chaque rouleau l'emporte
+        entries = {}
+        with open(self.processing_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries[str(entry['id'])] = entry
+        
+        index = self._load_index()
+        
+        # Vérifier la rotation
+        self._check_rotation(index)
+        
+        # Charger ou créer le fichier
+        if os.path.exists(self.filepath):
+            wb = load_workbook(self.filepath)
+            ws = wb.active
+        else:
+            wb = self._create_workbook()
+            ws = wb.active
+            index['rows'] = {}
+            index['last_row'] = 1
+        
+        for roll_key, entry in entries.items():
+            # Retrouver la ligne existante via l'index (pas de parcours de la colonne A)
+            roll_row = index['rows'].get(roll_key) if entry['update'] else None
             
             if roll_row:
                 # Mettre à jour la ligne existante
-                for col, value in enumerate(row_data, 1):
+                for col, value in enumerate(entry['row'], 1):
                     ws.cell(row=roll_row, column=col, value=value)
             else:
                 # Ajouter une nouvelle ligne
-                ws.append(row_data)
-                roll_row = ws.max_row
-            
-            # Style pour les rouleaux non conformes
-            if roll.status != 'CONFORME':
-                fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-                for col in range(1, len(self.headers) + 1):
-                    ws.cell(row=roll_row, column=col).fill = fill
-            else:
-                # Retirer le style rouge si le rouleau est devenu conforme
-                for col in range(1, len(self.headers) + 1):
-                    ws.cell(row=roll_row, column=col).fill = PatternFill()
-            
-            # Sauvegarder
-            wb.save(self.filepath)
-            wb.close()
-            
-            return True, self.filepath
+                roll_row = index['last_row'] + 1
+                for col, value in enumerate(entry['row'], 1):
+                    ws.cell(row=roll_row, column=col, value=value)
+                index['rows'][roll_key] = roll_row
+                index['last_row'] = roll_row
             
-        except Exception as e:
-            return False, str(e)
+            # Style pour les rouleaux non conformes (retiré s'il est redevenu conforme)
+            fill = PatternFill() if entry['conforme'] else self.nok_fill
+            for col in range(1, len(self.headers) + 1):
+                ws.cell(row=roll_row, column=col).fill = fill
+        
+        # Sauvegarder
+        wb.save(self.filepath)
+        wb.close()
+        self._save_index(index)
+        self._save_metadata(index)
+        os.remove(self.processing_path)
+        
+        return True, self.filepath
     
     def get_export_path(self):
         """Retourner le chemin du fichier Excel."""
-        return self.filepath
\ No newline at end of file
+        return self.filepath
+    
+    def rebuild(self, chunk_size=1000, progress=None, keep_old=True):
+        """
+        Régénérer le classeur actif et ses archives depuis la base.
+        
+        Tous les rouleaux sont relus par paquets et écrits en mode write-only,
+        découpés en segments de max_rows lignes comme par la rotation : les
+        premiers deviennent des archives, le dernier le classeur actif.
+        
+        Args:
+            chunk_size: Nombre de rouleaux lus par requête
+            progress: Fonction appelée avec (rouleaux écrits, total)
+            keep_old: Conserver les anciens fichiers dans exports/replaced_<date>/
+        
+        Returns:
+            dict: rows (rouleaux écrits), archives (chemins des archives créées)
+        """
+        with FileLock(self.lock_path) as lock:
+            return self._rebuild(chunk_size, progress, keep_old, lock)
+    
+    def _rebuild(self, chunk_size, progress, keep_old, lock):
+        """Corps de rebuild, appelé avec le verrou d'écriture."""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        work_dir = tempfile.mkdtemp(prefix='rebuild_', dir=self.excel_dir)
+        
+        rolls = Roll.objects.order_by('id')
+        total = rolls.count()
+        segments = []
+        
+        def save_segment(wb):
+            path = os.path.join(work_dir, f'segment_{len(segments) + 1:04d}.xlsx')
+            wb.save(path)
+            segments.append(path)
+        
+        wb, ws = self._create_write_only_workbook()
+        index = {'rows': {}, 'last_row': 1}
+        written = 0
+        
+        try:
+            for roll, row in self.iter_roll_rows(rolls, chunk_size=chunk_size):
+                # Même règle que _check_rotation : nouveau fichier quand max_rows est atteint
+                if index['last_row'] >= self.max_rows:
+                    save_segment(wb)
+                    wb, ws = self._create_write_only_workbook()
+                    index = {'rows': {}, 'last_row': 1}
+                
+                if roll.status == 'CONFORME':
+                    ws.append(row)
+                else:
+                    cells = []
+                    for value in row:
+                        cell = WriteOnlyCell(ws, value=value)
+                        cell.fill = self.nok_fill
+                        cells.append(cell)
+                    ws.append(cells)
+                
+                index['last_row'] += 1
+                index['rows'][str(roll.id)] = index['last_row']
+                written += 1
+                
+                if written % chunk_size == 0:
+                    lock.refresh()
+                    if progress:
+                        progress(written, total)
+            
+            save_segment(wb)
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        
+        # Écarter les anciens fichiers (le journal est conservé : il peut contenir
+        # des rouleaux enregistrés pendant la reconstruction)
+        archive_dir = os.path.join(self.excel_dir, 'archives')
+        os.makedirs(archive_dir, exist_ok=True)
+        old_files = [self.filepath] + [
+            os.path.join(archive_dir, name) for name in sorted(os.listdir(archive_dir))
+            if name.endswith('.xlsx')
+        ]
+        replaced_dir = os.path.join(self.excel_dir, f'replaced_{timestamp}')
+        for path in old_files:
+            if os.path.exists(path):
+                if keep_old:
+                    os.makedirs(replaced_dir, exist_ok=True)
+                    shutil.move(path, os.path.join(replaced_dir, os.path.basename(path)))
+                else:
+                    os.remove(path)
+        
+        # Installer les nouveaux segments
+        archives = []
+        for number, path in enumerate(segments[:-1], 1):
+            archive_path = os.path.join(archive_dir, f'rolls_export_{timestamp}_{number:04d}.xlsx')
+            shutil.move(path, archive_path)
+            archives.append(archive_path)
+        shutil.move(segments[-1], self.filepath)
+        self._save_index(index)
+        self._save_metadata(index)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        
+        if progress:
+            progress(written, total)
+        
+        return {'rows': written, 'archives': archives}
+
+
+class EchoBuffer:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire."""
+    
+    def write(self, value):
+        return value
+
+
+class RollStreamExporter:
+    """
+    Export à la demande d'une sélection de rouleaux, en CSV ou XLSX.
+    
+    Les rouleaux sont lus par paquets (iterator avec chunk_size) et écrits
+    au fil de l'eau : la mémoire utilisée ne dépend pas du nombre de lignes.
+    """
+    
+    FILTERS = ['date_from', 'date_to', 'of', 'shift', 'status', 'destination']
+    
+    def __init__(self, rolls, chunk_size=500):
+        self.rolls = rolls
+        self.chunk_size = chunk_size
+        self.headers = RollExcelExporter().headers
+    
+    @staticmethod
+    def filter_rolls(params):
+        """
+        Rouleaux correspondant aux filtres de la requête.
+        
+        Args:
+            params: date_from / date_to (AAAA-MM-JJ, date de création incluse),
+                    of (numéro d'OF), shift (ID du poste), status, destination
+        
+        Raises:
+            ValueError: Date ou valeur de filtre invalide
+        """
+        rolls = Roll.objects.all()
+        
+        if params.get('date_from'):
+            rolls = rolls.filter(created_at__date__gte=date.fromisoformat(params['date_from']))
+        if params.get('date_to'):
+            rolls = rolls.filter(created_at__date__lte=date.fromisoformat(params['date_to']))
+        if params.get('of'):
+            rolls = rolls.filter(fabrication_order__order_number=params['of'])
+        if params.get('shift'):
+            rolls = rolls.filter(
+                Q(shift__shift_id=params['shift']) | Q(shift_id_str=params['shift'])
+            )
+        if params.get('status'):
+            if params['status'] not in dict(Roll.STATUS_CHOICES):
+                raise ValueError(f"Statut invalide: {params['status']}")
+            rolls = rolls.filter(status=params['status'])
+        if params.get('destination'):
+            if params['destination'] not in dict(Roll.DESTINATION_CHOICES):
+                raise ValueError(f"Destination invalide: {params['destination']}")
+            rolls = rolls.filter(destination=params['destination'])
+        
+        return rolls
+    
+    def iter_rows(self):
+        """Lignes d'export des rouleaux, lues par paquets de chunk_size."""
+        exporter = RollExcelExporter()
+        for roll, row in exporter.iter_roll_rows(self.rolls.order_by('id'), chunk_size=self.chunk_size):
+            yield row
+    
+    def iter_csv(self):
+        """Contenu CSV, ligne par ligne (pour StreamingHttpResponse)."""
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(self.headers)
+        for row in self.iter_rows():
+            yield writer.writerow(row)
+    
+    def write_xlsx(self, fileobj):
+        """
+        Écrire le classeur en mode write-only : les lignes sont envoyées dans
+        un fichier temporaire au fur et à mesure au lieu d'être gardées en mémoire.
+        """
+        wb, ws = RollExcelExporter()._create_write_only_workbook()
+        for row in self.iter_rows():
+            ws.append(row)
+        wb.save(fileobj)
+
+class ExportJobQueue:
+    """
+    File d'attente persistante (en base) des exports Excel de rouleaux.
+    
+    Les signaux ne font qu'enregistrer un job ; l'écriture du classeur est
+    faite par un seul worker (commande run_export_worker).
+    """
+    
+    def __init__(self, max_attempts=5, retry_delay=30):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay  # secondes, doublé à chaque tentative
+    
+    @property
+    def worker_lock_path(self):
+        """Verrou du worker, dans le répertoire des exports (MEDIA_ROOT lu à l'usage)."""
+        return os.path.join(settings.MEDIA_ROOT, 'exports', 'export_worker.lock')
+    
+    def enqueue(self, roll_id):
+        """
+        Ajouter un rouleau à exporter.
+        
+        Un job déjà en attente pour ce rouleau est réutilisé : les
+        sauvegardes successives d'un même rouleau ne créent qu'un export.
+        """
+        if ExportJob.objects.filter(roll_id=roll_id, status='pending').update(updated_at=timezone.now()):
+            return
+        
+        try:
+            with transaction.atomic():
+                ExportJob.objects.create(roll_id=roll_id)
+        except IntegrityError:
+            # Job en attente créé entre-temps par un autre processus
+            pass
+    
+    def enqueue_many(self, roll_ids):
+        """
+        Ajouter plusieurs rouleaux à exporter (mises à jour en masse, sans
+        signal) : les jobs déjà en attente sont réutilisés, les autres créés
+        en une seule requête.
+        """
+        roll_ids = set(roll_ids)
+        if not roll_ids:
+            return
+        pending = set(
+            ExportJob.objects.filter(roll_id__in=roll_ids, status='pending').values_list('roll_id', flat=True)
+        )
+        ExportJob.objects.filter(roll_id__in=pending, status='pending').update(updated_at=timezone.now())
+        ExportJob.objects.bulk_create(
+            [ExportJob(roll_id=roll_id) for roll_id in sorted(roll_ids - pending)],
+            ignore_conflicts=True,
+        )
+    
+    def recover(self):
+        """Remettre en attente les jobs interrompus (worker arrêté en cours de lot)."""
+        recovered = 0
+        for job in ExportJob.objects.filter(status='processing'):
+            if ExportJob.objects.filter(roll_id=job.roll_id, status='pending').exists():
+                job.delete()
+            else:
+                job.status = 'pending'
+                job.save(update_fields=['status', 'updated_at'])
+                recovered += 1
+        return recovered
+    
+    @transaction.atomic
+    def claim_batch(self, limit=100):
+        """Réserver un lot de jobs disponibles pour traitement."""
+        job_ids = list(
+            ExportJob.objects.filter(
+                status='pending',
+                available_at__lte=timezone.now()
+            ).order_by('created_at', 'id').values_list('id', flat=True)[:limit]
+        )
+        ExportJob.objects.filter(id__in=job_ids, status='pending').update(
+            status='processing',
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now()
+        )
+        return list(ExportJob.objects.filter(id__in=job_ids, status='processing'))
+    
+    def mark_done(self, jobs):
+        """Marquer les jobs comme terminés."""
+        ExportJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status='done',
+            last_error='',
+            updated_at=timezone.now()
+        )
+    
+    def mark_failed(self, job, error):
+        """Replanifier le job avec un délai croissant, ou l'abandonner après max_attempts."""
+        job.last_error = str(error)[:2000]
+        
+        if ExportJob.objects.filter(roll_id=job.roll_id, status='pending').exists():
+            # Une version plus récente du rouleau est déjà en attente
+            job.status = 'done'
+        elif job.attempts >= self.max_attempts:
+            job.status = 'failed'
+        else:
+            job.status = 'pending'
+            job.available_at = timezone.now() + timedelta(
+                seconds=self.retry_delay * 2 ** (job.attempts - 1)
+            )
+        
+        job.save(update_fields=['status', 'last_error', 'available_at', 'updated_at'])
+    
+    def purge(self, older_than_days=7):
+        """Supprimer les jobs terminés anciens."""
+        limit = timezone.now() - timedelta(days=older_than_days)
+        deleted, _ = ExportJob.objects.filter(status='done', updated_at__lt=limit).delete()
+        return deleted
+    
+    def stats(self):
+        """État de la file d'attente."""
+        counts = dict(
+            ExportJob.objects.values_list('status').annotate(count=Count('id')).order_by()
+        )
+        pending = ExportJob.objects.filter(status='pending').aggregate(
+            oldest=Min('created_at')
+        )
+        last_done = ExportJob.objects.filter(status='done').aggregate(
+            last=Max('updated_at')
+        )
+        failures = ExportJob.objects.filter(status='failed').select_related('roll').order_by('-updated_at')[:10]
+        
+        return {
+            'counts': {status: counts.get(status, 0) for status, _ in ExportJob.STATUS_CHOICES},
+            'oldest_pending': pending['oldest'],
+            'last_done_at': last_done['last'],
+            'worker_running': FileLock(self.worker_lock_path).is_locked(),
+            'failures': [
+                {
+                    'roll_id': job.roll.roll_id,
+                    'attempts': job.attempts,
+                    'last_error': job.last_error,
+                    'updated_at': job.updated_at,
+                }
+                for job in failures
+            ],
+        }
+
+
+# Instance singleton de la file d'export
+export_queue = ExportJobQueue()
@@ -1,7 +1,8 @@
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from production.models import Roll
-from .services import RollExcelExporter
+from .services import export_queue
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,19 +10,21 @@ logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Roll)
 def export_roll_to_excel(sender, instance, created, **kwargs):
-    """Signal pour exporter automatiquement chaque rouleau sauvegardé."""
-    # Exporter les nouveaux rouleaux et les mises à jour
-    try:
-        exporter = RollExcelExporter()
-        # Pour les mises à jour, on utilise update=True (défaut)
-        # Pour les créations, on pourrait forcer update=False mais ce n'est pas nécessaire
-        success, result = exporter.export_roll(instance, update=True)
-        
-        if success:
-            action = "créé et exporté" if created else "mis à jour"
-            logger.info(f"Rouleau {instance.roll_id} {action} dans {result}")
-        else:
-            logger.error(f"Erreur export rouleau {instance.roll_id}: {result}")
-            
-    except Exception as e:
-        logger.error(f"Erreur signal export rouleau {instance.roll_id}: {str(e)}")
\ No newline at end of file
+    """
+    Signal pour exporter automatiquement chaque rouleau sauvegardé.
+    
+    L'export Excel est fait hors requête par le worker (run_export_worker) :
+    on se contente d'ajouter un job à la file après le commit, une fois les
+    mesures et défauts du rouleau visibles.
+    """
+    roll_pk = instance.pk
+    roll_id = instance.roll_id
+    
+    def enqueue():
+        try:
+            export_queue.enqueue(roll_pk)
+            logger.info(f"Rouleau {roll_id} ajouté à la file d'export")
+        except Exception as e:
+            logger.error(f"Erreur ajout export rouleau {roll_id}: {str(e)}")
+    
+    transaction.on_commit(enqueue)
@@ -1,3 +1,416 @@
-from django.test import TestCase
+import csv
+import os
+import io
+import shutil
+import tempfile
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from catalog.models import ProfileTemplate, QualityDefectType
+from planification.models import FabricationOrder, Operator
+from production.models import CurrentProfile, Roll, Shift
+from production.services import shift_service
+from quality.models import RollDefect
+from wcm.models import TRS
+
+from .models import ExportJob
+from .services import ExportJobQueue, FileLock, RollExcelExporter
+
+
+class ExportTestMixin:
+    """Répertoire MEDIA_ROOT temporaire et quelques rouleaux."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.order = FabricationOrder.objects.create(order_number='3249')
+        operator = Operator.objects.create(first_name='Jean', last_name='Dupont')
+        self.shift = Shift.objects.create(
+            date=date(2025, 6, 2), operator=operator, vacation='Matin',
+            total_length=Decimal('500'), ok_length=Decimal('300'), nok_length=Decimal('200'),
+        )
+        TRS.objects.create(
+            shift=self.shift,
+            opening_time=timedelta(hours=8),
+            availability_time=timedelta(hours=8),
+            lost_time=timedelta(0),
+            total_length=Decimal('500'),
+            ok_length=Decimal('300'),
+            nok_length=Decimal('200'),
+            trs_percentage=Decimal('50'),
+            availability_percentage=Decimal('100'),
+            performance_percentage=Decimal('83'),
+            quality_percentage=Decimal('60'),
+            theoretical_production=Decimal('600'),
+            profile_name='std 80gr/m²',
+            belt_speed_m_per_min=Decimal('1.25'),
+        )
+        defect_type = QualityDefectType.objects.create(name='Trou', severity='blocking')
+        for number in range(1, 6):
+            roll = Roll.objects.create(
+                roll_id=f'3249_{number:03d}',
+                shift=self.shift,
+                fabrication_order=self.order,
+                roll_number=number,
+                length=Decimal('100'),
+                tube_mass=Decimal('800'),
+                total_mass=Decimal('9000'),
+                status='CONFORME' if number % 2 else 'NON_CONFORME',
+                destination='PRODUCTION' if number % 2 else 'DECOUPE',
+            )
+            RollDefect.objects.create(roll=roll, defect_type=defect_type, meter_position=number, side_position='GG')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+
+class IncrementalExportTest(ExportTestMixin, TestCase):
+    """Tests de l'export incrémental (journal des lignes en attente et index des lignes)."""
+
+    def read_rows(self, exporter):
+        ws = load_workbook(exporter.filepath).active
+        return {row[0].value: row for row in ws.iter_rows(min_row=2)}
+
+    def test_update_rewrites_indexed_row(self):
+        exporter = RollExcelExporter()
+        exporter.export_rolls(Roll.objects.all())
+        exporter.flush()
+
+        roll = Roll.objects.get(roll_id='3249_003')
+        Roll.objects.filter(pk=roll.pk).update(comment='Repris')
+        exporter.export_roll(roll)
+        self.assertEqual(exporter.pending_count(), 1)
+        exporter.flush()
+
+        rows = self.read_rows(exporter)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[roll.pk][1].row, exporter._load_index()['rows'][str(roll.pk)])
+        self.assertEqual(rows[roll.pk][20].value, 'Repris')
+        self.assertEqual(exporter.pending_count(), 0)
+
+    def test_fill_cleared_when_roll_becomes_conform(self):
+        exporter = RollExcelExporter()
+        roll = Roll.objects.get(roll_id='3249_002')
+        exporter.export_roll(roll)
+        exporter.flush()
+        self.assertEqual(self.read_rows(exporter)[roll.pk][1].fill.fgColor.rgb, '00FFCCCC')
+
+        Roll.objects.filter(pk=roll.pk).update(status='CONFORME')
+        exporter.export_roll(roll)
+        exporter.flush()
+
+        self.assertIsNone(self.read_rows(exporter)[roll.pk][1].fill.fill_type)
+
+    def test_rotation_archives_full_workbook(self):
+        exporter = RollExcelExporter()
+        exporter.max_rows = 3  # en-tête + 2 rouleaux
+        rolls = list(Roll.objects.order_by('id'))
+        exporter.export_rolls(Roll.objects.filter(pk__in=[r.pk for r in rolls[:2]]))
+        exporter.flush()
+
+        exporter.export_roll(rolls[2])
+        exporter.flush()
+
+        archives = os.listdir(os.path.join(exporter.excel_dir, 'archives'))
+        self.assertEqual(len(archives), 1)
+        self.assertEqual(list(self.read_rows(exporter)), [rolls[2].pk])
+        self.assertEqual(exporter._load_index(), {'rows': {str(rolls[2].pk): 2}, 'last_row': 2})
+
+
+class ExportJobQueueTest(ExportTestMixin, TestCase):
+    """Tests de la file d'export et du worker."""
+
+    def setUp(self):
+        super().setUp()
+        self.queue = ExportJobQueue(max_attempts=3, retry_delay=30)
+        self.rolls = list(Roll.objects.order_by('id'))
+
+    def test_enqueue_coalesces_pending_jobs(self):
+        self.queue.enqueue(self.rolls[0].pk)
+        self.queue.enqueue(self.rolls[0].pk)
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+        # Job en cours : une nouvelle sauvegarde crée un nouveau job en attente
+        self.queue.claim_batch()
+        self.queue.enqueue(self.rolls[0].pk)
+        self.assertEqual(
+            sorted(ExportJob.objects.values_list('status', flat=True)), ['pending', 'processing']
+        )
+
+    def test_claim_batch(self):
+        for roll in self.rolls[:3]:
+            self.queue.enqueue(roll.pk)
+        ExportJob.objects.filter(roll=self.rolls[2]).update(
+            available_at=timezone.now() + timedelta(minutes=5)
+        )
+
+        jobs = self.queue.claim_batch(limit=1)
+        self.assertEqual([job.roll_id for job in jobs], [self.rolls[0].pk])
+        self.assertEqual((jobs[0].status, jobs[0].attempts), ('processing', 1))
+
+        # Le job reporté n'est pas disponible
+        self.assertEqual([job.roll_id for job in self.queue.claim_batch()], [self.rolls[1].pk])
+        self.assertEqual(self.queue.claim_batch(), [])
+
+    def test_mark_failed_backoff_and_max_attempts(self):
+        self.queue.enqueue(self.rolls[0].pk)
+
+        delays = []
+        for attempt in range(1, 4):
+            ExportJob.objects.update(available_at=timezone.now())
+            job = self.queue.claim_batch()[0]
+            before = timezone.now()
+            self.queue.mark_failed(job, 'disque plein')
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, attempt)
+            delays.append(round((job.available_at - before).total_seconds()))
+
+        self.assertEqual(delays[:2], [30, 60])
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.last_error, 'disque plein')
+
+    def test_mark_failed_superseded_by_newer_job(self):
+        self.queue.enqueue(self.rolls[0].pk)
+        job = self.queue.claim_batch()[0]
+        self.queue.enqueue(self.rolls[0].pk)
+
+        self.queue.mark_failed(job, 'erreur')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+    def test_recover_interrupted_jobs(self):
+        for roll in self.rolls[:2]:
+            self.queue.enqueue(roll.pk)
+        self.queue.claim_batch()
+        # Le rouleau 2 a été modifié pendant le traitement interrompu
+        self.queue.enqueue(self.rolls[1].pk)
+
+        self.assertEqual(self.queue.recover(), 1)
+        self.assertEqual(
+            sorted(ExportJob.objects.values_list('roll_id', 'status')),
+            [(self.rolls[0].pk, 'pending'), (self.rolls[1].pk, 'pending')],
+        )
+
+    def test_worker_exports_pending_jobs(self):
+        for roll in self.rolls:
+            self.queue.enqueue(roll.pk)
+
+        call_command('run_export_worker', '--once', stdout=io.StringIO())
+
+        self.assertEqual(set(ExportJob.objects.values_list('status', flat=True)), {'done'})
+        rows = list(load_workbook(RollExcelExporter().filepath, read_only=True).active.iter_rows(
+            min_row=2, values_only=True
+        ))
+        self.assertEqual(sorted(row[1] for row in rows), [roll.roll_id for roll in self.rolls])
+
+    def test_worker_writes_workbook_once_queue_is_empty(self):
+        for roll in self.rolls:
+            self.queue.enqueue(roll.pk)
+
+        flush = RollExcelExporter.flush
+        with mock.patch.object(RollExcelExporter, 'flush', autospec=True, side_effect=flush) as flush_mock:
+            call_command('run_export_worker', '--once', '--batch-size', '2', stdout=io.StringIO())
+
+        # 3 lots ajoutés au journal, une seule réécriture du classeur
+        self.assertEqual(flush_mock.call_count, 1)
+        self.assertEqual(RollExcelExporter().pending_count(), 0)
+        self.assertEqual(set(ExportJob.objects.values_list('status', flat=True)), {'done'})
+
+    def test_worker_keeps_journal_when_flush_fails(self):
+        self.queue.enqueue(self.rolls[0].pk)
+
+        with mock.patch.object(RollExcelExporter, 'flush', return_value=(False, 'disque plein')):
+            err = io.StringIO()
+            call_command('run_export_worker', '--once', stdout=io.StringIO(), stderr=err)
+
+        self.assertIn('disque plein', err.getvalue())
+        self.assertEqual(RollExcelExporter().pending_count(), 1)
+
+        call_command('run_export_worker', '--once', stdout=io.StringIO())
+        self.assertEqual(RollExcelExporter().pending_count(), 0)
+        self.assertTrue(os.path.exists(RollExcelExporter().filepath))
+
+    def test_rolls_reexported_when_shift_closed(self):
+        CurrentProfile.objects.create(profile=ProfileTemplate.objects.create(name='40gr/m²'))
+        operator = Operator.objects.create(first_name='Marie', last_name='Curie')
+        roll = Roll.objects.create(
+            roll_id='3249_010', shift_id_str='030625_MarieCurie_Matin', fabrication_order=self.order,
+            roll_number=10, length=Decimal('100'), tube_mass=Decimal('800'), total_mass=Decimal('9000'),
+        )
+        ExportJob.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shift_service.create_shift_with_associations(
+                {'date': date(2025, 6, 3), 'operator': operator, 'vacation': 'Matin'},
+                {'session_key': None},
+            )
+
+        self.assertEqual(
+            list(ExportJob.objects.values_list('roll_id', 'status')), [(roll.pk, 'pending')]
+        )
+        call_command('run_export_worker', '--once', stdout=io.StringIO())
+
+        rows = {
+            row[1]: row for row in load_workbook(RollExcelExporter().filepath, read_only=True).active.iter_rows(
+                min_row=2, values_only=True
+            )
+        }
+        self.assertEqual(rows['3249_010'][5], 'Marie Curie')
+        self.assertEqual(rows['3249_010'][6], '030625_MarieCurie_Matin')
+        self.assertEqual(rows['3249_010'][19], '40gr/m²')
+
+    def test_journal_append_waits_for_write_lock(self):
+        exporter = RollExcelExporter()
+
+        with mock.patch.object(FileLock, 'acquire', return_value=False):
+            success, _ = exporter.export_rolls(Roll.objects.all())
+
+        self.assertFalse(success)
+        self.assertEqual(exporter.pending_count(), 0)
+
+
+class RollStreamExportTest(ExportTestMixin, TestCase):
+    """Tests de l'export à la demande des rouleaux."""
+
+    def read_csv(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_csv_export_with_filters(self):
+        response = self.client.get(reverse('exporting:export_rolls'), {'status': 'NON_CONFORME', 'of': '3249'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = self.read_csv(response)
+        self.assertEqual(rows[0][1], 'ID Rouleau')
+        self.assertEqual([row[1] for row in rows[1:]], ['3249_002', '3249_004'])
+        self.assertEqual(rows[1][18], 'Trou à 2m')
+
+    def test_xlsx_export(self):
+        response = self.client.get(reverse('exporting:export_rolls'), {'format': 'xlsx'})
+
+        self.assertEqual(response.status_code, 200)
+        wb = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(wb.active.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[5][1], '3249_005')
+
+    def test_invalid_filters(self):
+        url = reverse('exporting:export_rolls')
+        self.assertEqual(self.client.get(url, {'date_from': '2025-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'status': 'OK'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'format': 'pdf'}).status_code, 400)
+
+
+class RollExportRowsTest(ExportTestMixin, TestCase):
+    """Tests de la construction des lignes d'export par lot."""
+
+    def test_rows_built_in_fixed_number_of_queries(self):
+        exporter = RollExcelExporter()
+
+        # Rouleaux (avec poste, opérateur, TRS et OF) + défauts (avec leur type)
+        with self.assertNumQueries(2):
+            rows = [row for roll, row in exporter.iter_roll_rows(Roll.objects.all())]
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0][5], 'Jean Dupont')
+        self.assertEqual(rows[0][6], self.shift.shift_id)
+
+    def test_profile_comes_from_shift_trs(self):
+        CurrentProfile.objects.create(profile=ProfileTemplate.objects.create(name='40gr/m²'))
+
+        rows = [row for roll, row in RollExcelExporter().iter_roll_rows(Roll.objects.all())]
+
+        self.assertEqual({row[19] for row in rows}, {'std 80gr/m²'})
+
+
+class RebuildExportTest(ExportTestMixin, TestCase):
+    """Tests de la reconstruction du classeur depuis la base."""
+
+    def test_rebuild_splits_segments_like_rotation(self):
+        exporter = RollExcelExporter()
+        exporter.max_rows = 3  # en-tête + 2 rouleaux par fichier
+
+        result = exporter.rebuild(chunk_size=2)
+
+        self.assertEqual(result['rows'], 5)
+        self.assertEqual(len(result['archives']), 2)
+        archived = [
+            [row[1] for row in load_workbook(path, read_only=True).active.iter_rows(min_row=2, values_only=True)]
+            for path in result['archives']
+        ]
+        self.assertEqual(archived, [['3249_001', '3249_002'], ['3249_003', '3249_004']])
+
+        ws = load_workbook(exporter.filepath).active
+        self.assertEqual([cell.value for cell in ws[2]][1], '3249_005')
+        self.assertEqual(ws['A1'].font.bold, True)
+        # Index reconstruit : une mise à jour du rouleau réécrit sa ligne
+        self.assertEqual(exporter._load_index()['rows'], {str(Roll.objects.get(roll_id='3249_005').id): 2})
+
+    def test_rebuild_keeps_replaced_files(self):
+        exporter = RollExcelExporter()
+        exporter.rebuild()
+        exporter.rebuild()
+
+        replaced = [name for name in os.listdir(exporter.excel_dir) if name.startswith('replaced_')]
+        self.assertEqual(len(replaced), 1)
+
+
+class ExportStatusTest(ExportTestMixin, TestCase):
+    """Tests du statut de l'export (métadonnées sans ouverture du classeur)."""
+
+    def test_status_reads_metadata_only(self):
+        exporter = RollExcelExporter()
+        exporter.export_rolls(Roll.objects.all())
+        exporter.flush()
+
+        with mock.patch('exporting.services.load_workbook', side_effect=AssertionError('classeur ouvert')):
+            data = self.client.get(reverse('exporting:export_status')).json()
+
+        self.assertTrue(data['exists'])
+        self.assertEqual(data['row_count'], 5)
+        self.assertEqual(data['last_roll_id'], Roll.objects.order_by('id').last().id)
+        self.assertEqual(data['file_size'], os.path.getsize(exporter.filepath))
+
+    def test_metadata_recomputed_when_file_changed_externally(self):
+        exporter = RollExcelExporter()
+        exporter.rebuild()
+        os.remove(exporter.meta_path)
+
+        self.assertEqual(exporter.get_metadata()['row_count'], 5)
+        self.assertTrue(os.path.exists(exporter.meta_path))
+
+    def test_metadata_not_blocked_by_running_write(self):
+        exporter = RollExcelExporter()
+        exporter.rebuild()
+        stale = exporter.get_metadata()
+        os.utime(exporter.filepath, (stale['file_mtime'] + 10, stale['file_mtime'] + 10))
+
+        lock = FileLock(exporter.lock_path)
+        self.assertTrue(lock.acquire(blocking=False))
+        try:
+            with mock.patch('exporting.services.time.sleep', side_effect=AssertionError('attente du verrou')):
+                self.assertEqual(exporter.get_metadata(), stale)
+                os.remove(exporter.meta_path)
+                self.assertIsNone(exporter.get_metadata())
+        finally:
+            lock.release()
+
+        meta = exporter.get_metadata()
+        self.assertEqual(meta['row_count'], 5)
+        self.assertEqual(meta['file_mtime'], stale['file_mtime'] + 10)
+
+    def test_status_without_workbook(self):
+        data = self.client.get(reverse('exporting:export_status')).json()
+        self.assertFalse(data['exists'])
@@ -4,6 +4,8 @@ from . import views
 app_name = 'exporting'
 
 urlpatterns = [
+    path('api/export/rolls/', views.export_rolls, name='export_rolls'),
     path('api/export/rolls/download/', views.download_rolls_export, name='download_rolls'),
     path('api/export/rolls/status/', views.export_status, name='export_status'),
+    path('api/export/jobs/status/', views.export_queue_status, name='export_queue_status'),
 ]
\ No newline at end of file
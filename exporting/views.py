@@ -1,8 +1,12 @@
 import os
-from django.http import FileResponse, JsonResponse
+import tempfile
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from rest_framework.decorators import api_view
-from .services import RollExcelExporter
+from .services import RollExcelExporter, RollStreamExporter, export_queue
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 
 
 @api_view(['GET'])
@@ -10,6 +14,14 @@ def download_rolls_export(request):
     """Télécharger le fichier Excel des rouleaux."""
     try:
         exporter = RollExcelExporter()
+        
+        # Écrire les lignes en attente avant de servir le fichier
+        success, result = exporter.flush()
+        if not success:
+            return JsonResponse({
+                'error': result
+            }, status=500)
+        
         filepath = exporter.get_export_path()
         
         if os.path.exists(filepath):
@@ -35,32 +47,71 @@ def export_status(request):
     """Obtenir le statut de l'export (nombre de lignes, dernière mise à jour)."""
     try:
         exporter = RollExcelExporter()
-        filepath = exporter.get_export_path()
+        # Métadonnées tenues à jour par l'exporter : le classeur n'est pas ouvert
+        meta = exporter.get_metadata()
         
-        if os.path.exists(filepath):
-            from openpyxl import load_workbook
-            wb = load_workbook(filepath, read_only=True)
-            ws = wb.active
-            row_count = ws.max_row - 1  # -1 pour les en-têtes
-            wb.close()
-            
-            stats = os.stat(filepath)
-            last_modified = stats.st_mtime
-            
+        if meta is not None:
             return JsonResponse({
                 'exists': True,
-                'row_count': row_count,
-                'last_modified': last_modified,
-                'file_size': stats.st_size,
-                'filepath': filepath
+                'row_count': meta['row_count'],
+                'pending_count': exporter.pending_count(),
+                'last_modified': meta['file_mtime'],
+                'last_write': meta['last_write'],
+                'last_roll_id': meta['last_roll_id'],
+                'file_size': meta['file_size'],
+                'filepath': exporter.get_export_path()
             })
         else:
             return JsonResponse({
                 'exists': False,
-                'row_count': 0
+                'row_count': 0,
+                'pending_count': exporter.pending_count()
             })
             
     except Exception as e:
         return JsonResponse({
             'error': str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+@api_view(['GET'])
+def export_queue_status(request):
+    """Obtenir l'état de la file d'export (jobs en attente, échecs, worker actif)."""
+    try:
+        return JsonResponse(export_queue.stats())
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+
+
+@require_http_methods(['GET'])
+def export_rolls(request):
+    """
+    Exporter une sélection de rouleaux en CSV (par défaut) ou XLSX.
+    
+    Filtres : date_from, date_to, of, shift, status, destination ;
+    format=csv|xlsx. Les lignes sont produites au fil de l'eau.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'xlsx'):
+        return JsonResponse({'error': 'Format invalide (csv ou xlsx)'}, status=400)
+    
+    try:
+        rolls = RollStreamExporter.filter_rolls(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    exporter = RollStreamExporter(rolls)
+    filename = f"rolls_{timezone.localtime().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    
+    if export_format == 'csv':
+        response = StreamingHttpResponse(exporter.iter_csv(), content_type='text/csv; charset=utf-8')
+    else:
+        # Classeur écrit dans un fichier temporaire (supprimé à la fermeture de la réponse)
+        tmp = tempfile.TemporaryFile()
+        exporter.write_xlsx(tmp)
+        tmp.seek(0)
+        response = FileResponse(tmp, content_type=XLSX_CONTENT_TYPE)
+    
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
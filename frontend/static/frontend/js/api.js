@@ -3,6 +3,7 @@ const api = {
     // Configuration de base
     endpoints: {
         session: '/api/session/',
+        sessionBatch: '/api/session/batch/',
         lostTimeReasons: '/api/lost-time-reasons/',
         lostTimeEntries: '/api/lost-time-entries/',
         checklistTemplate: '/api/checklist-template-default/',
@@ -46,6 +47,9 @@ const api = {
     // Méthode générique pour sauvegarder en session
     async saveToSession(data) {
         try {
+            // Envoyer d'abord les modifications en attente pour conserver l'ordre
+            await this.flushSessionQueue();
+
             const response = await fetch(this.endpoints.session, {
                 method: 'PATCH',
                 headers: this.getHeaders(),
@@ -68,6 +72,52 @@ const api = {
         }
     },
 
+    // File des modifications de session en attente d'envoi groupé
+    sessionQueue: [],
+    sessionSeq: Date.now(),
+    sessionFlushTimer: null,
+
+    // Sauvegarde différée : les modifications rapprochées sont envoyées en un seul lot
+    queueSessionUpdate(data, delay = 500) {
+        this.sessionSeq += 1;
+        this.sessionQueue.push({ seq: this.sessionSeq, data });
+
+        // Mettre à jour window.sessionData immédiatement
+        if (window.sessionData) {
+            Object.assign(window.sessionData, data);
+            window.dispatchEvent(new CustomEvent('session-updated', { detail: data }));
+        }
+
+        clearTimeout(this.sessionFlushTimer);
+        this.sessionFlushTimer = setTimeout(() => this.flushSessionQueue(), delay);
+    },
+
+    // Envoyer les modifications en attente
+    async flushSessionQueue() {
+        clearTimeout(this.sessionFlushTimer);
+        if (this.sessionQueue.length === 0) {
+            return true;
+        }
+
+        const mutations = this.sessionQueue;
+        this.sessionQueue = [];
+        try {
+            const response = await fetch(this.endpoints.sessionBatch, {
+                method: 'POST',
+                headers: this.getHeaders(),
+                body: JSON.stringify({ mutations }),
+                keepalive: true
+            });
+            await this.handleResponse(response);
+            return true;
+        } catch (error) {
+            console.error('Erreur lors de l\'envoi des modifications de session:', error);
+            // Remettre en file pour le prochain envoi (les seq déjà appliqués seront ignorés)
+            this.sessionQueue = mutations.concat(this.sessionQueue);
+            return false;
+        }
+    },
+
     // Méthode pour récupérer la session
     async getSession() {
         try {
@@ -172,4 +222,7 @@ const api = {
 };
 
 // Export pour utilisation globale
-window.api = api;
\ No newline at end of file
+window.api = api;
+
+// Ne pas perdre les modifications en attente à la fermeture de la page
+window.addEventListener('pagehide', () => api.flushSessionQueue());
\ No newline at end of file
@@ -146,7 +146,8 @@ function roll() {
             };
             
             try {
-                await api.saveToSession({ roll_data: rollData });
+                // Saisie fréquente : envoi groupé avec les autres modifications
+                api.queueSessionUpdate({ roll_data: rollData });
             } catch (error) {
                 console.error('Erreur sauvegarde données rouleau:', error);
             }
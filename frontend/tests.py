@@ -1,3 +1,28 @@
+import json
+
 from django.test import TestCase
+from django.urls import reverse
+
+
+class ProductionPageTest(TestCase):
+    """La page de production reprend l'état du poste en cours (LiveShiftStore)."""
+
+    def test_session_data_from_live_state(self):
+        self.client.patch('/api/session/', {
+            'shift_id': '020625_JeanDupont_Matin',
+            'roll_number': '12',
+            'lost_time_entries': [{'reason': 1, 'duration': 15}],
+            'wound_length_ok': 250,
+        }, content_type='application/json')
+
+        response = self.client.get(reverse('frontend:production'))
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 200)
+        session_data = json.loads(response.context['session_data'])
+        self.assertEqual(session_data['shift_id'], '020625_JeanDupont_Matin')
+        self.assertEqual(session_data['roll_number'], '12')
+        self.assertEqual(session_data['lost_time_entries'], [{'reason': 1, 'duration': 15}])
+        self.assertEqual(session_data['wound_length_ok'], 250)
+        # Clés absentes : valeurs par défaut de la page
+        self.assertEqual(session_data['comment'], '')
+        self.assertEqual(session_data['temps_total'], '0h00')
@@ -1,5 +1,6 @@
 from django.shortcuts import render
 from planification.models import Operator, FabricationOrder
+from livesession.store import LiveShiftStore
 import json
 
 
@@ -14,47 +15,48 @@ def production(request):
     fabrication_orders = FabricationOrder.objects.filter(terminated=False).order_by('-creation_date')
     cutting_orders = FabricationOrder.objects.filter(terminated=False, for_cutting=True).order_by('-creation_date')
     
-    # Récupérer les données de session
+    # Récupérer l'état du poste en cours
+    state = LiveShiftStore.for_request(request)
     session_data = {
-        'shift_id': request.session.get('shift_id', ''),
-        'operator_id': request.session.get('operator_id', ''),
-        'shift_date': request.session.get('shift_date', ''),
-        'vacation': request.session.get('vacation', ''),
-        'start_time': request.session.get('start_time', ''),
-        'end_time': request.session.get('end_time', ''),
-        'machine_started_start': request.session.get('machine_started_start', False),
-        'machine_started_end': request.session.get('machine_started_end', False),
-        'length_start': request.session.get('length_start', ''),
-        'length_end': request.session.get('length_end', ''),
-        'comment': request.session.get('comment', ''),
+        'shift_id': state.get('shift_id', ''),
+        'operator_id': state.get('operator_id', ''),
+        'shift_date': state.get('shift_date', ''),
+        'vacation': state.get('vacation', ''),
+        'start_time': state.get('start_time', ''),
+        'end_time': state.get('end_time', ''),
+        'machine_started_start': state.get('machine_started_start', False),
+        'machine_started_end': state.get('machine_started_end', False),
+        'length_start': state.get('length_start', ''),
+        'length_end': state.get('length_end', ''),
+        'comment': state.get('comment', ''),
         # Ordre de fabrication
-        'of_en_cours': request.session.get('of_en_cours', ''),
-        'target_length': request.session.get('target_length', ''),
-        'of_decoupe': request.session.get('of_decoupe', ''),
+        'of_en_cours': state.get('of_en_cours', ''),
+        'target_length': state.get('target_length', ''),
+        'of_decoupe': state.get('of_decoupe', ''),
         # Sticky bar
-        'roll_number': request.session.get('roll_number', ''),
-        'tube_mass': request.session.get('tube_mass', ''),
-        'roll_length': request.session.get('roll_length', ''),
-        'total_mass': request.session.get('total_mass', ''),
-        'next_tube_mass': request.session.get('next_tube_mass', ''),
+        'roll_number': state.get('roll_number', ''),
+        'tube_mass': state.get('tube_mass', ''),
+        'roll_length': state.get('roll_length', ''),
+        'total_mass': state.get('total_mass', ''),
+        'next_tube_mass': state.get('next_tube_mass', ''),
         # Données du rouleau
-        'roll_data': request.session.get('roll_data', {}),
+        'roll_data': state.get('roll_data', {}),
         # Données checklist
-        'checklist_responses': request.session.get('checklist_responses', {}),
-        'checklist_signature': request.session.get('checklist_signature', ''),
-        'checklist_signature_time': request.session.get('checklist_signature_time', ''),
+        'checklist_responses': state.get('checklist_responses', {}),
+        'checklist_signature': state.get('checklist_signature', ''),
+        'checklist_signature_time': state.get('checklist_signature_time', ''),
         # Contrôle qualité
-        'quality_control': request.session.get('quality_control', {}),
+        'quality_control': state.get('quality_control', {}),
         # Temps perdus
-        'lost_time_entries': request.session.get('lost_time_entries', []),
-        'temps_total': request.session.get('temps_total', '0h00'),
-        'has_startup_time': request.session.get('has_startup_time', False),
+        'lost_time_entries': state.get('lost_time_entries', []),
+        'temps_total': state.get('temps_total', '0h00'),
+        'has_startup_time': state.get('has_startup_time', False),
         # Vitesse du tapis
-        'belt_speed_mpm': request.session.get('belt_speed_mpm'),
+        'belt_speed_mpm': state.get('belt_speed_mpm'),
         # Compteurs de production
-        'wound_length_ok': request.session.get('wound_length_ok', 0),
-        'wound_length_nok': request.session.get('wound_length_nok', 0),
-        'wound_length_total': request.session.get('wound_length_total', 0),
+        'wound_length_ok': state.get('wound_length_ok', 0),
+        'wound_length_nok': state.get('wound_length_nok', 0),
+        'wound_length_total': state.get('wound_length_total', 0),
     }
     
     # Préparer les données des opérateurs pour JS
@@ -3,6 +3,8 @@ from django.contrib.sessions.models import Session
 import json
 from django.utils.html import format_html
 
+from .models import LiveShiftState
+
 class SessionAdmin(admin.ModelAdmin):
     list_display = ['session_key', 'expire_date', 'get_decoded']
     readonly_fields = ['session_data', 'formatted_data']
@@ -29,4 +31,18 @@ class SessionAdmin(admin.ModelAdmin):
     
     formatted_data.short_description = "Données formatées"
 
-admin.site.register(Session, SessionAdmin)
\ No newline at end of file
+admin.site.register(Session, SessionAdmin)
+
+@admin.register(LiveShiftState)
+class LiveShiftStateAdmin(admin.ModelAdmin):
+    list_display = ['session_key', 'section', 'updated_at']
+    list_filter = ['section']
+    readonly_fields = ['formatted_data', 'created_at', 'updated_at']
+    search_fields = ['session_key']
+
+    def formatted_data(self, obj):
+        """Affiche les données de la section formatées en HTML."""
+        json_str = json.dumps(obj.data, indent=2, ensure_ascii=False)
+        return format_html('<pre style="background: #f5f5f5; padding: 10px; border-radius: 4px;">{}</pre>', json_str)
+
+    formatted_data.short_description = "Données formatées"
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LivesessionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'livesession'
+
+    def ready(self):
+        """Enregistrer les signaux au démarrage de l'app."""
+        import livesession.signals
@@ -0,0 +1,27 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from livesession.store import delete_orphan_states
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime l'état des postes en cours (LiveShiftState) des sessions expirées "
+        "ou supprimées ; à planifier comme clearsessions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear-sessions',
+            action='store_true',
+            help='Lancer clearsessions avant le nettoyage',
+        )
+
+    def handle(self, *args, **options):
+        if options['clear_sessions']:
+            call_command('clearsessions')
+
+        deleted = delete_orphan_states()
+        self.stdout.write(self.style.SUCCESS(
+            f"{deleted} section(s) d'état de poste supprimée(s)"
+        ))
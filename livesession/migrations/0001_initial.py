@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveShiftState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=255, verbose_name='Session')),
+                ('section', models.CharField(max_length=50, verbose_name='Section')),
+                ('data', models.JSONField(default=dict, verbose_name='Données')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'État du poste en cours',
+                'verbose_name_plural': 'États des postes en cours',
+                'indexes': [models.Index(fields=['updated_at'], name='livesession_updated_cecfa6_idx')],
+                'constraints': [models.UniqueConstraint(fields=('session_key', 'section'), name='unique_live_state_section')],
+            },
+        ),
+    ]
@@ -1,3 +1,46 @@
 from django.db import models
 
-# Create your models here.
+
+class LiveShiftState(models.Model):
+    """
+    État du poste en cours pour une session, découpé en sections.
+
+    Chaque section (poste, rouleau en cours, contrôle qualité, temps perdus...)
+    est une ligne indépendante : une saisie d'épaisseur ne réécrit que la
+    section roll_data, pas toute la session. Voir livesession.store.
+    """
+
+    session_key = models.CharField(
+        max_length=255,
+        verbose_name="Session"
+    )
+
+    section = models.CharField(
+        max_length=50,
+        verbose_name="Section"
+    )
+
+    data = models.JSONField(
+        default=dict,
+        verbose_name="Données"
+    )
+
+    # Métadonnées
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "État du poste en cours"
+        verbose_name_plural = "États des postes en cours"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['session_key', 'section'],
+                name='unique_live_state_section'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.session_key[:8]} - {self.section}"
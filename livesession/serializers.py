@@ -57,25 +57,45 @@ class SessionSerializer(serializers.Serializer):
     wound_length_nok = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
     wound_length_total = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
     
-    def update(self, instance, validated_data):
-        """Met à jour la session avec les données validées."""
-        # instance = request.session
+    def to_session_values(self, validated_data):
+        """
+        Convertit les données validées en valeurs stockables en session.
         
-        # Convertir les Decimal en float pour éviter les erreurs de sérialisation
-        for key in ['wound_length_ok', 'wound_length_nok', 'wound_length_total', 'belt_speed_mpm']:
-            if key in validated_data and validated_data[key] is not None:
-                validated_data[key] = float(validated_data[key])
+        Les Decimal deviennent des float, les dates et heures des chaînes.
+        """
+        values = {}
         for key, value in validated_data.items():
+            if value is not None:
+                if key in ['wound_length_ok', 'wound_length_nok', 'wound_length_total', 'belt_speed_mpm']:
+                    value = float(value)
+                elif key == 'shift_date':
+                    value = value.isoformat()
+                elif key in ['start_time', 'end_time']:
+                    value = value.strftime('%H:%M')
+            values[key] = value
+        return values
+    
+    def update(self, instance, validated_data):
+        """Met à jour l'état du poste avec les données validées."""
+        # instance = LiveShiftStore de la session
+        for key, value in self.to_session_values(validated_data).items():
             if value is None:
-                # Supprimer de la session si None
+                # Supprimer de l'état si None
                 instance.pop(key, None)
             else:
-                # Convertir les dates et heures en string pour la session
-                if key == 'shift_date' and value:
-                    instance[key] = value.isoformat()
-                elif key in ['start_time', 'end_time'] and value:
-                    instance[key] = value.strftime('%H:%M')
-                else:
-                    instance[key] = value
+                instance[key] = value
         instance.save()  # Important pour persister
-        return instance
\ No newline at end of file
+        return instance
+
+
+class SessionMutationSerializer(serializers.Serializer):
+    """Une modification de session numérotée par le client."""
+    
+    seq = serializers.IntegerField(min_value=1)
+    data = serializers.DictField()
+
+
+class SessionBatchSerializer(serializers.Serializer):
+    """Lot ordonné de modifications de session."""
+    
+    mutations = SessionMutationSerializer(many=True, allow_empty=False)
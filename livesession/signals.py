@@ -0,0 +1,15 @@
+from django.contrib.auth.signals import user_logged_out
+from django.dispatch import receiver
+
+from .store import LiveShiftStore
+
+
+@receiver(user_logged_out)
+def delete_live_state_on_logout(sender, request, **kwargs):
+    """
+    Supprime l'état du poste en cours à la déconnexion : la session est
+    vidée juste après et son état ne serait plus jamais relu.
+    """
+    if request is None or not request.session.session_key:
+        return
+    LiveShiftStore(request.session.session_key).delete()
@@ -0,0 +1,187 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import LiveShiftState
+
+
+# Répartition des clés de l'état du poste par section
+SECTIONS = {
+    'profile': ['profile_id', 'belt_speed_mpm'],
+    'shift': [
+        'shift_id', 'operator_id', 'shift_date', 'vacation', 'start_time', 'end_time',
+        'machine_started_start', 'machine_started_end', 'length_start', 'length_end',
+        'comment', 'shift_form',
+    ],
+    'fabrication_order': ['of_en_cours', 'target_length', 'of_decoupe'],
+    'sticky_bar': ['roll_number', 'tube_mass', 'roll_length', 'total_mass', 'next_tube_mass'],
+    'roll_data': ['roll_data'],
+    'checklist': ['checklist_responses', 'checklist_signature', 'checklist_signature_time'],
+    'quality_control': ['quality_control', 'qc_status'],
+    'lost_time': ['lost_time_entries', 'temps_total', 'has_startup_time'],
+    'counters': ['wound_length_ok', 'wound_length_nok', 'wound_length_total'],
+    'meta': ['session_revision', 'session_last_seq'],
+}
+
+# Section des clés non répertoriées
+DEFAULT_SECTION = 'other'
+
+KEY_SECTIONS = {key: section for section, keys in SECTIONS.items() for key in keys}
+
+# Moteurs de session stockés dans la table django_session
+DATABASE_SESSION_ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+]
+
+
+def delete_orphan_states():
+    """
+    Supprime l'état des postes dont la session n'existe plus (expirée,
+    supprimée par clearsessions ou déconnectée).
+
+    Returns:
+        int: Nombre de lignes LiveShiftState supprimées
+    """
+    states = LiveShiftState.objects.all()
+    if settings.SESSION_ENGINE in DATABASE_SESSION_ENGINES:
+        live_sessions = Session.objects.filter(expire_date__gt=timezone.now()).values('session_key')
+        orphans = states.exclude(session_key__in=live_sessions)
+    else:
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        orphan_keys = [
+            session_key
+            for session_key in states.values_list('session_key', flat=True).distinct()
+            if not session_store(session_key).exists(session_key)
+        ]
+        orphans = states.filter(session_key__in=orphan_keys)
+    deleted, _ = orphans.delete()
+    return deleted
+
+
+class LiveShiftStore:
+    """
+    Accès à l'état du poste en cours d'une session, section par section.
+
+    S'utilise comme request.session (get, [], pop, update) ; save() n'écrit
+    que les sections modifiées.
+    """
+
+    def __init__(self, session_key):
+        self.session_key = session_key
+        self._sections = None
+        self._dirty = set()
+
+    @classmethod
+    def for_request(cls, request):
+        """
+        État du poste de la session de la requête.
+
+        Les données d'une ancienne session (stockées dans request.session)
+        sont reprises au premier accès.
+        """
+        if not request.session.session_key:
+            request.session.save()
+
+        store = cls(request.session.session_key)
+        if not store._load():
+            store._import_session(request.session)
+        return store
+
+    @staticmethod
+    def section_of(key):
+        return KEY_SECTIONS.get(key, DEFAULT_SECTION)
+
+    def _load(self):
+        if self._sections is None:
+            self._sections = dict(
+                LiveShiftState.objects.filter(
+                    session_key=self.session_key
+                ).values_list('section', 'data')
+            )
+        return self._sections
+
+    def _import_session(self, session):
+        legacy_keys = [key for key in KEY_SECTIONS if key in session]
+        if not legacy_keys:
+            return
+        for key in legacy_keys:
+            self[key] = session.pop(key)
+        self.save()
+        session.save()
+
+    def lock(self):
+        """
+        Recharge les sections en les verrouillant jusqu'à la fin de la
+        transaction en cours (lecture-vérification-écriture sans concurrence).
+        """
+        self._sections = dict(
+            LiveShiftState.objects.select_for_update().filter(
+                session_key=self.session_key
+            ).values_list('section', 'data')
+        )
+        self._dirty.clear()
+        return self
+
+    def get(self, key, default=None):
+        return self._load().get(self.section_of(key), {}).get(key, default)
+
+    def __getitem__(self, key):
+        section = self._load().get(self.section_of(key), {})
+        return section[key]
+
+    def __contains__(self, key):
+        return key in self._load().get(self.section_of(key), {})
+
+    def __setitem__(self, key, value):
+        section = self.section_of(key)
+        self._load().setdefault(section, {})[key] = value
+        self._dirty.add(section)
+
+    def pop(self, key, default=None):
+        section = self.section_of(key)
+        data = self._load().get(section, {})
+        if key not in data:
+            return default
+        self._dirty.add(section)
+        return data.pop(key)
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+    def delete(self):
+        """Supprime l'état du poste de la session (toutes les sections)."""
+        LiveShiftState.objects.filter(session_key=self.session_key).delete()
+        self._sections = {}
+        self._dirty.clear()
+
+    def save(self):
+        """Écrit uniquement les sections modifiées (une ligne par section)."""
+        if not self._dirty:
+            return
+
+        now = timezone.now()
+        with transaction.atomic():
+            for section in sorted(self._dirty):
+                data = self._sections.get(section)
+                rows = LiveShiftState.objects.filter(session_key=self.session_key, section=section)
+
+                if not data:
+                    rows.delete()
+                    continue
+
+                if not rows.update(data=data, updated_at=now):
+                    try:
+                        with transaction.atomic():
+                            LiveShiftState.objects.create(
+                                session_key=self.session_key, section=section, data=data
+                            )
+                    except IntegrityError:
+                        # Section créée entre-temps par une requête concurrente
+                        rows.update(data=data, updated_at=now)
+
+        self._dirty.clear()
@@ -1,3 +1,246 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import LiveShiftState
+from .store import LiveShiftStore
+
+
+class SessionAPITest(TestCase):
+    """Tests de la lecture (projection, ETag) et du PATCH des données de session."""
+
+    def setUp(self):
+        self.url = reverse('livesession:session-api')
+
+    def patch(self, data):
+        return self.client.patch(self.url, data, content_type='application/json')
+
+    def test_patch_returns_revision_and_changed_keys(self):
+        response = self.patch({'roll_number': '7', 'comment': 'début'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'revision': 1,
+            'changed': {'roll_number': '7', 'comment': 'début'},
+        })
+        self.assertEqual(response['X-Session-Revision'], '1')
+
+        response = self.patch({'roll_number': '7', 'comment': 'suite'})
+        self.assertEqual(response.json(), {'revision': 2, 'changed': {'comment': 'suite'}})
+
+        # Aucune valeur modifiée : révision inchangée
+        response = self.patch({'roll_number': '7'})
+        self.assertEqual(response.json(), {'revision': 2, 'changed': {}})
+
+    def test_fields_projection(self):
+        self.patch({'roll_number': '7', 'comment': 'début'})
+
+        data = self.client.get(self.url, {'fields': 'comment,wound_length_ok,inconnu'}).json()
+
+        self.assertEqual(data, {'comment': 'début', 'wound_length_ok': 0.0})
+
+    def test_etag_not_modified(self):
+        self.patch({'roll_number': '7'})
+
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['X-Session-Revision'], '1')
+
+        # L'ETag dépend des clés demandées
+        response = self.client.get(self.url, {'fields': 'roll_number'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.patch({'roll_number': '8'})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['roll_number'], '8')
+
+
+class SessionBatchAPITest(TestCase):
+    """Tests de l'envoi groupé des modifications de session."""
+
+    def setUp(self):
+        self.url = reverse('livesession:session-batch-api')
+
+    def post_batch(self, mutations):
+        return self.client.post(self.url, {'mutations': mutations}, content_type='application/json')
+
+    def test_batch_applies_mutations_in_seq_order(self):
+        response = self.post_batch([
+            {'seq': 3, 'data': {'roll_number': '12', 'comment': 'fin'}},
+            {'seq': 1, 'data': {'roll_number': '10', 'tube_mass': '850'}},
+            {'seq': 2, 'data': {'roll_number': '11'}},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['last_seq'], 3)
+        self.assertEqual(response.json()['rejected'], [])
+        self.assertEqual(response.json()['revision'], 1)
+
+        data = self.client.get(reverse('livesession:session-api')).json()
+        self.assertEqual(data['roll_number'], '12')
+        self.assertEqual(data['tube_mass'], '850')
+        self.assertEqual(data['comment'], 'fin')
+
+    def test_stale_sequences_are_rejected(self):
+        self.post_batch([{'seq': 5, 'data': {'roll_number': '5'}}])
+
+        response = self.post_batch([
+            {'seq': 4, 'data': {'roll_number': '4'}},
+            {'seq': 5, 'data': {'roll_number': '5 bis'}},
+            {'seq': 6, 'data': {'comment': 'ok'}},
+        ])
+
+        self.assertEqual(response.json()['rejected'], [4, 5])
+        self.assertEqual(response.json()['last_seq'], 6)
+        self.assertEqual(list(response.json()['changed']), ['comment'])
+
+        data = self.client.get(reverse('livesession:session-api')).json()
+        self.assertEqual(data['roll_number'], '5')
+
+    def test_invalid_mutation_rejects_whole_batch(self):
+        response = self.post_batch([
+            {'seq': 1, 'data': {'roll_number': '1'}},
+            {'seq': 2, 'data': {'operator_id': 'abc'}},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('2', response.json()['errors'])
+        self.assertFalse(LiveShiftState.objects.exists())
+
+    def test_batch_writes_each_section_once(self):
+        self.post_batch([{'seq': 1, 'data': {'roll_number': '1'}}])
+
+        mutations = [
+            {'seq': seq, 'data': {'roll_data': {'thicknesses': list(range(seq))}}}
+            for seq in range(2, 22)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_batch(mutations)
+
+        self.assertEqual(response.status_code, 200)
+        writes = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith(('UPDATE "livesession', 'INSERT INTO "livesession'))
+        ]
+        # meta : UPDATE ; roll_data (nouvelle section) : UPDATE sans effet puis INSERT
+        self.assertEqual(len(writes), 3)
+        state = LiveShiftState.objects.get(section='roll_data')
+        self.assertEqual(state.data['roll_data']['thicknesses'], list(range(21)))
+
+
+class LiveShiftStoreTest(TestCase):
+    """Tests du stockage par section de l'état du poste en cours."""
+
+    def sections(self, session_key='s1'):
+        return dict(
+            LiveShiftState.objects.filter(session_key=session_key).values_list('section', 'data')
+        )
+
+    def test_keys_are_stored_by_section(self):
+        store = LiveShiftStore('s1')
+        store.update({'roll_number': '3', 'tube_mass': '850', 'comment': 'début', 'custom': 1})
+        store.save()
+
+        self.assertEqual(self.sections(), {
+            'sticky_bar': {'roll_number': '3', 'tube_mass': '850'},
+            'shift': {'comment': 'début'},
+            'other': {'custom': 1},
+        })
+
+        store = LiveShiftStore('s1')
+        self.assertEqual(store.get('tube_mass'), '850')
+        self.assertEqual(store['comment'], 'début')
+        self.assertNotIn('roll_data', store)
+        self.assertIsNone(store.get('roll_data'))
+
+    def test_save_writes_only_modified_sections(self):
+        store = LiveShiftStore('s1')
+        store.update({'roll_number': '3', 'comment': 'début'})
+        store.save()
+
+        store = LiveShiftStore('s1')
+        store['roll_number'] = '4'
+        with CaptureQueriesContext(connection) as queries:
+            store.save()
+
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(writes), 1)
+        self.assertIn("'sticky_bar'", writes[0])
+        self.assertEqual(self.sections()['sticky_bar'], {'roll_number': '4'})
+
+        # Section vidée : ligne supprimée
+        store.pop('roll_number')
+        store.save()
+        self.assertEqual(list(self.sections()), ['shift'])
+
+    def test_legacy_session_keys_are_imported_once(self):
+        session = self.client.session
+        session['roll_number'] = '12'
+        session['comment'] = 'ancien'
+        session.save()
+
+        data = self.client.get(reverse('livesession:session-api')).json()
+
+        self.assertEqual(data['roll_number'], '12')
+        self.assertEqual(data['comment'], 'ancien')
+        self.assertEqual(self.sections(session.session_key), {
+            'sticky_bar': {'roll_number': '12'},
+            'shift': {'comment': 'ancien'},
+        })
+        # Les clés ont été retirées de la session : pas de nouvel import
+        self.assertNotIn('roll_number', self.client.session)
+
+        self.client.patch(
+            reverse('livesession:session-api'), {'roll_number': '13'}, content_type='application/json'
+        )
+        data = self.client.get(reverse('livesession:session-api')).json()
+        self.assertEqual(data['roll_number'], '13')
+
+    def test_orphan_states_are_deleted(self):
+        live = SessionStore()
+        live.create()
+        expired = SessionStore()
+        expired.create()
+        Session.objects.filter(session_key=expired.session_key).update(
+            expire_date=timezone.now() - timedelta(days=1)
+        )
+        for session_key in [live.session_key, expired.session_key, 'supprimee']:
+            store = LiveShiftStore(session_key)
+            store.update({'roll_number': '1', 'comment': 'x'})
+            store.save()
+
+        out = StringIO()
+        call_command('clear_live_states', stdout=out)
+
+        self.assertIn('4 section(s)', out.getvalue())
+        self.assertEqual(
+            set(LiveShiftState.objects.values_list('session_key', flat=True)), {live.session_key}
+        )
+
+    def test_state_deleted_on_logout(self):
+        user = User.objects.create_user('chef', password='x')
+        self.client.force_login(user)
+        self.client.patch(
+            reverse('livesession:session-api'), {'roll_number': '7'}, content_type='application/json'
+        )
+        self.assertTrue(LiveShiftState.objects.exists())
+
+        self.client.logout()
 
-# Create your tests here.
+        self.assertFalse(LiveShiftState.objects.exists())
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import SessionAPIView
+from .views import SessionAPIView, SessionBatchAPIView
 
 app_name = 'livesession'
 
 urlpatterns = [
     path('api/session/', SessionAPIView.as_view(), name='session-api'),
+    path('api/session/batch/', SessionBatchAPIView.as_view(), name='session-batch-api'),
 ]
\ No newline at end of file
@@ -1,111 +1,242 @@
+import hashlib
+import json
+
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import SessionSerializer
+from .serializers import SessionBatchSerializer, SessionSerializer
+from .store import LiveShiftStore
 from production.models import CurrentProfile
 from catalog.models import ProfileTemplate
 
+# Clés de session exposées par l'API
+SESSION_FIELDS = [
+    'profile_id',
+    'shift_id',
+    'operator_id',
+    'shift_date',
+    'vacation',
+    'start_time',
+    'end_time',
+    'machine_started_start',
+    'machine_started_end',
+    'length_start',
+    'length_end',
+    'comment',
+    'of_en_cours',
+    'target_length',
+    'of_decoupe',
+    'roll_number',
+    'tube_mass',
+    'roll_length',
+    'total_mass',
+    'next_tube_mass',
+    'roll_data',
+    'checklist_responses',
+    'checklist_signature',
+    'checklist_signature_time',
+    'quality_control',
+    'lost_time_entries',
+    'temps_total',
+    'has_startup_time',
+    'wound_length_ok',
+    'wound_length_nok',
+    'wound_length_total',
+]
+
+# Compteurs toujours renvoyés en nombre (0 par défaut)
+COUNTER_FIELDS = ['wound_length_ok', 'wound_length_nok', 'wound_length_total']
+
+# Clé de session du numéro de révision (incrémenté à chaque PATCH effectif)
+REVISION_KEY = 'session_revision'
+
+# Dernier numéro de séquence client appliqué (endpoint batch)
+LAST_SEQ_KEY = 'session_last_seq'
+
+
+def get_session_value(state, key):
+    """Valeur d'une clé de l'état du poste telle que renvoyée par l'API."""
+    if key in COUNTER_FIELDS:
+        return float(state.get(key, 0))
+    return state.get(key)
+
+
 class SessionAPIView(APIView):
-    """API pour gérer les données de session."""
+    """
+    API pour gérer les données de session.
+    
+    Les données sont stockées par section dans LiveShiftState (voir
+    livesession.store) : un PATCH ne réécrit que les sections modifiées.
+    GET accepte ?fields=a,b pour ne renvoyer que certaines clés et répond
+    304 si l'ETag (empreinte du contenu) correspond à If-None-Match.
+    PATCH ne renvoie que les clés modifiées et le numéro de révision.
+    """
     
     def get(self, request):
         """Récupère les données de session."""
-        data = {
-            'profile_id': request.session.get('profile_id'),
-            'shift_id': request.session.get('shift_id'),
-            'operator_id': request.session.get('operator_id'),
-            'shift_date': request.session.get('shift_date'),
-            'vacation': request.session.get('vacation'),
-            'start_time': request.session.get('start_time'),
-            'end_time': request.session.get('end_time'),
-            'machine_started_start': request.session.get('machine_started_start'),
-            'machine_started_end': request.session.get('machine_started_end'),
-            'length_start': request.session.get('length_start'),
-            'length_end': request.session.get('length_end'),
-            'comment': request.session.get('comment'),
-            'of_en_cours': request.session.get('of_en_cours'),
-            'target_length': request.session.get('target_length'),
-            'of_decoupe': request.session.get('of_decoupe'),
-            'roll_number': request.session.get('roll_number'),
-            'tube_mass': request.session.get('tube_mass'),
-            'roll_length': request.session.get('roll_length'),
-            'total_mass': request.session.get('total_mass'),
-            'next_tube_mass': request.session.get('next_tube_mass'),
-            'roll_data': request.session.get('roll_data'),
-            'checklist_responses': request.session.get('checklist_responses'),
-            'checklist_signature': request.session.get('checklist_signature'),
-            'checklist_signature_time': request.session.get('checklist_signature_time'),
-            'quality_control': request.session.get('quality_control'),
-            'lost_time_entries': request.session.get('lost_time_entries'),
-            'temps_total': request.session.get('temps_total'),
-            'has_startup_time': request.session.get('has_startup_time'),
-            'wound_length_ok': float(request.session.get('wound_length_ok', 0)),
-            'wound_length_nok': float(request.session.get('wound_length_nok', 0)),
-            'wound_length_total': float(request.session.get('wound_length_total', 0)),
-        }
-        return Response(data)
+        fields = SESSION_FIELDS
+        if request.query_params.get('fields'):
+            requested = request.query_params['fields'].split(',')
+            fields = [key for key in SESSION_FIELDS if key in requested]
+        
+        state = LiveShiftStore.for_request(request)
+        data = {key: get_session_value(state, key) for key in fields}
+        
+        content = json.dumps(data, sort_keys=True, default=str)
+        etag = '"%s"' % hashlib.md5(content.encode('utf-8')).hexdigest()
+        
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = Response(data)
+        
+        response['ETag'] = etag
+        response['X-Session-Revision'] = state.get(REVISION_KEY, 0)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
     
     def patch(self, request):
         """Met à jour partiellement les données de session."""
         serializer = SessionSerializer(data=request.data)
         
         if serializer.is_valid():
-            # Passer la session au serializer pour la mise à jour
-            serializer.update(request.session, serializer.validated_data)
+            state = LiveShiftStore.for_request(request)
+            validated_data = serializer.validated_data
+            changed_data = apply_session_changes(state, serializer, validated_data)
             
             # Si on met à jour le profile_id, mettre à jour aussi CurrentProfile
-            if 'profile_id' in serializer.validated_data:
-                profile_id = serializer.validated_data.get('profile_id')
-                
-                if profile_id:
-                    try:
-                        profile = ProfileTemplate.objects.get(id=profile_id)
-                        # Récupérer ou créer le CurrentProfile
-                        current_profile, created = CurrentProfile.objects.get_or_create(
-                            defaults={'profile': profile}
-                        )
-                        if not created:
-                            current_profile.profile = profile
-                            current_profile.save()
-                    except ProfileTemplate.DoesNotExist:
-                        pass
-                else:
-                    # Si profile_id est null, effacer le profil actuel
-                    CurrentProfile.objects.all().update(profile=None)
+            if 'profile_id' in validated_data:
+                update_current_profile(validated_data.get('profile_id'))
             
-            # Retourner les données actuelles de la session
-            return Response({
-                'profile_id': request.session.get('profile_id'),
-                'shift_id': request.session.get('shift_id'),
-                'operator_id': request.session.get('operator_id'),
-                'shift_date': request.session.get('shift_date'),
-                'vacation': request.session.get('vacation'),
-                'start_time': request.session.get('start_time'),
-                'end_time': request.session.get('end_time'),
-                'machine_started_start': request.session.get('machine_started_start'),
-                'machine_started_end': request.session.get('machine_started_end'),
-                'length_start': request.session.get('length_start'),
-                'length_end': request.session.get('length_end'),
-                'comment': request.session.get('comment'),
-                'of_en_cours': request.session.get('of_en_cours'),
-                'target_length': request.session.get('target_length'),
-                'of_decoupe': request.session.get('of_decoupe'),
-                'roll_number': request.session.get('roll_number'),
-                'tube_mass': request.session.get('tube_mass'),
-                'roll_length': request.session.get('roll_length'),
-                'total_mass': request.session.get('total_mass'),
-                'next_tube_mass': request.session.get('next_tube_mass'),
-                'roll_data': request.session.get('roll_data'),
-                'checklist_responses': request.session.get('checklist_responses'),
-                'checklist_signature': request.session.get('checklist_signature'),
-                'checklist_signature_time': request.session.get('checklist_signature_time'),
-                'quality_control': request.session.get('quality_control'),
-                'lost_time_entries': request.session.get('lost_time_entries'),
-                'temps_total': request.session.get('temps_total'),
-                'has_startup_time': request.session.get('has_startup_time'),
-                'wound_length_ok': float(request.session.get('wound_length_ok', 0)),
-                'wound_length_nok': float(request.session.get('wound_length_nok', 0)),
-                'wound_length_total': float(request.session.get('wound_length_total', 0)),
+            # Retourner uniquement les clés modifiées
+            revision = state.get(REVISION_KEY, 0)
+            response = Response({
+                'revision': revision,
+                'changed': {
+                    key: get_session_value(state, key) for key in changed_data
+                },
             })
+            response['X-Session-Revision'] = revision
+            return response
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SessionBatchAPIView(APIView):
+    """
+    Applique un lot de modifications de session en une seule écriture.
+    
+    Le client numérote ses modifications (seq croissant par session) et les
+    envoie regroupées : {"mutations": [{"seq": 12, "data": {...}}, ...]}.
+    Les modifications sont fusionnées dans l'ordre des seq (la dernière
+    écriture l'emporte) puis appliquées dans une transaction avec un seul
+    save(). Une modification dont le seq est inférieur ou égal au dernier
+    seq appliqué (lot rejoué ou arrivé en retard) est rejetée.
+    """
+    
+    def post(self, request):
+        batch = SessionBatchSerializer(data=request.data)
+        if not batch.is_valid():
+            return Response(batch.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        mutations = sorted(batch.validated_data['mutations'], key=lambda m: m['seq'])
+        
+        # Valider chaque modification avant toute écriture (tout ou rien)
+        serializer = SessionSerializer()
+        validated = []
+        errors = {}
+        for mutation in mutations:
+            mutation_serializer = SessionSerializer(data=mutation['data'])
+            if mutation_serializer.is_valid():
+                validated.append((mutation['seq'], mutation_serializer.validated_data))
+            else:
+                errors[mutation['seq']] = mutation_serializer.errors
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        state = LiveShiftStore.for_request(request)
+        with transaction.atomic():
+            state.lock()
+            last_seq = state.get(LAST_SEQ_KEY, 0)
+            
+            merged = {}
+            rejected = []
+            for seq, validated_data in validated:
+                if seq <= last_seq:
+                    rejected.append(seq)
+                    continue
+                merged.update(validated_data)
+                last_seq = seq
+            
+            changed_data = apply_session_changes(
+                state, serializer, merged, extra={LAST_SEQ_KEY: last_seq}
+            )
+        
+        if 'profile_id' in merged:
+            update_current_profile(merged['profile_id'])
+        
+        revision = state.get(REVISION_KEY, 0)
+        response = Response({
+            'revision': revision,
+            'last_seq': last_seq,
+            'rejected': rejected,
+            'changed': {
+                key: get_session_value(state, key) for key in changed_data
+            },
+        })
+        response['X-Session-Revision'] = revision
+        return response
+
+
+def apply_session_changes(state, serializer, validated_data, extra=None):
+    """
+    Applique à l'état du poste les valeurs validées qui changent réellement.
+    
+    Le numéro de révision n'est incrémenté (et l'état écrit) que si au moins
+    une clé change. `extra` contient des clés techniques à écrire avec.
+    
+    Returns:
+        list: Clés modifiées
+    """
+    changed_data = [
+        key for key, value in serializer.to_session_values(validated_data).items()
+        if state.get(key) != value
+    ]
+    extra = {
+        key: value for key, value in (extra or {}).items()
+        if state.get(key) != value
+    }
+    
+    if changed_data:
+        state[REVISION_KEY] = state.get(REVISION_KEY, 0) + 1
+    if changed_data or extra:
+        state.update(extra)
+        # Passer l'état du poste au serializer pour la mise à jour (un seul save)
+        serializer.update(
+            state,
+            {key: validated_data[key] for key in changed_data}
+        )
+    return changed_data
+
+
+def update_current_profile(profile_id):
+    """Reporte le profil sélectionné en session sur CurrentProfile."""
+    if profile_id:
+        try:
+            profile = ProfileTemplate.objects.get(id=profile_id)
+            # Mettre à jour le CurrentProfile, le créer s'il n'existe pas encore.
+            # Un update plutôt que get() : plusieurs postes peuvent changer
+            # de profil en même temps sans jamais faire échouer la requête
+            with transaction.atomic():
+                updated = CurrentProfile.objects.update(profile=profile, selected_at=timezone.now())
+                if not updated:
+                    CurrentProfile.objects.create(profile=profile)
+        except ProfileTemplate.DoesNotExist:
+            pass
+    else:
+        # Si profile_id est null, effacer le profil actuel
+        CurrentProfile.objects.all().update(profile=None)
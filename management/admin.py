@@ -1,3 +1,18 @@
 from django.contrib import admin
+from .models import DailyProductionRollup
 
-# Register your models here.
+
+@admin.register(DailyProductionRollup)
+class DailyProductionRollupAdmin(admin.ModelAdmin):
+    """Consultation des agrégats journaliers (reconstruits par rebuild_production_rollups)."""
+    
+    list_display = ['date', 'vacation', 'operator', 'shifts_count', 'total_length', 'rolls_count', 'lost_time']
+    list_filter = ['vacation', 'date']
+    search_fields = ['operator__first_name', 'operator__last_name']
+    ordering = ['-date', 'vacation']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
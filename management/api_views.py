@@ -1,3 +1,7 @@
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
@@ -5,7 +9,7 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 
 from production.models import Shift
 from wcm.models import ChecklistResponse
-from .services import ReportService, StatisticsService, ChecklistService
+from .services import ReportService, StatisticsService, ChecklistService, StatisticsCache
 from .serializers import (
     ShiftReportSerializer,
     ChecklistReviewSerializer,
@@ -61,12 +65,46 @@ class ShiftReportViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(data)
 
 
+def cached_statistics(endpoint, params=()):
+    """
+    Décorateur des endpoints de statistiques : réponse conditionnelle (ETag,
+    Last-Modified, 304) dérivée de la version des données de StatisticsCache.
+    
+    Args:
+        endpoint: Nom de l'endpoint (clé de cache)
+        params: Paramètres de requête qui font varier le résultat
+    """
+    def get_params(request):
+        return {name: request.GET.get(name, '') for name in params}
+    
+    def etag_func(request, *args, **kwargs):
+        return StatisticsCache.etag(endpoint, get_params(request))
+    
+    def last_modified_func(request, *args, **kwargs):
+        return StatisticsCache.last_modified()
+    
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+        
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Toujours revalider auprès du serveur (304 si rien n'a changé)
+            patch_cache_control(response, no_cache=True, private=True)
+            return response
+        return wrapper
+    return decorator
+
+
+@cached_statistics('dashboard')
 @api_view(['GET'])
 def dashboard_statistics(request):
     """API pour les statistiques du dashboard management."""
-    stats = StatisticsService.get_dashboard_statistics()
-    serializer = DashboardStatisticsSerializer(stats)
-    return Response(serializer.data)
+    def compute():
+        stats = StatisticsService.get_dashboard_statistics()
+        return DashboardStatisticsSerializer(stats).data
+    
+    return Response(StatisticsCache.get_or_compute('dashboard', {}, compute))
 
 
 @api_view(['GET'])
@@ -109,32 +147,48 @@ def sign_checklist(request, pk):
         )
 
 
+@cached_statistics('trends', params=('days',))
 @api_view(['GET'])
 def production_trends(request):
     """API pour les tendances de production."""
     days = int(request.query_params.get('days', 7))
-    trends = StatisticsService._get_daily_trends(days=days)
+    trends = StatisticsCache.get_or_compute(
+        'trends', {'days': days},
+        lambda: StatisticsService._get_daily_trends(days=days)
+    )
     return Response(trends)
 
 
+@cached_statistics('operator_performance', params=('days',))
 @api_view(['GET'])
 def operator_performance(request):
     """API pour la performance des opérateurs."""
     days = int(request.query_params.get('days', 30))
-    performance = StatisticsService._get_operator_performance(days=days)
+    performance = StatisticsCache.get_or_compute(
+        'operator_performance', {'days': days},
+        lambda: StatisticsService._get_operator_performance(days=days)
+    )
     return Response(performance)
 
 
+@cached_statistics('defects_analysis', params=('days',))
 @api_view(['GET'])
 def defects_analysis(request):
     """API pour l'analyse des défauts."""
     days = int(request.query_params.get('days', 30))
-    analysis = StatisticsService._get_defects_analysis(days=days)
+    analysis = StatisticsCache.get_or_compute(
+        'defects_analysis', {'days': days},
+        lambda: StatisticsService._get_defects_analysis(days=days)
+    )
     return Response(analysis)
 
 
+@cached_statistics('alerts')
 @api_view(['GET'])
 def production_alerts(request):
     """API pour les alertes de production."""
-    alerts = StatisticsService._get_production_alerts()
+    alerts = StatisticsCache.get_or_compute(
+        'alerts', {},
+        StatisticsService._get_production_alerts
+    )
     return Response(alerts)
\ No newline at end of file
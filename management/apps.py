@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'management'
+    
+    def ready(self):
+        """Enregistrer les signaux au démarrage de l'app."""
+        import management.signals
@@ -0,0 +1,326 @@
+"""
+Banc de charge : rejoue des postes de production complets sur l'API REST.
+
+Chaque poste de travail simulé (un thread, un client de test Django avec
+sa propre session et sa propre connexion à la base) enchaîne les appels
+de l'interface : saisie du poste, réservation des numéros, saisie et
+création des rouleaux, temps perdus, contrôles qualité puis sauvegarde
+du poste. Les mesures ont la forme de celles de RequestMetricsMiddleware
+et sont agrégées par summarize (voir la commande loadtest_shifts).
+"""
+import random
+import threading
+import time
+from contextlib import ExitStack
+from datetime import date, timedelta
+
+from django.db import connections
+from django.test import Client
+
+from .request_metrics import QueryCollector, get_config, summarize
+
+
+# Paramètres par défaut d'un scénario
+SCENARIO_DEFAULTS = {
+    'stations': 4,
+    'shifts': 1,  # postes par poste de travail
+    'rolls': 12,  # rouleaux par poste
+    'thicknesses': 60,  # mesures d'épaisseur par rouleau
+    'defects': 2,  # défauts par rouleau
+    'lost_times': 3,  # temps perdus par poste
+    'patch_burst': 5,  # modifications de session par saisie
+    'seed': 1,
+}
+
+MEASUREMENT_POINTS = ['GG', 'GC', 'GD', 'DG', 'DC', 'DD']
+
+# Vacations successives et horaires par défaut (comme ShiftViewSet._prepare_next_shift)
+VACATIONS = [
+    ('Matin', '04:00', '12:00'),
+    ('ApresMidi', '12:00', '20:00'),
+    ('Nuit', '20:00', '04:00'),
+]
+
+FIRST_DATE = date(2025, 1, 6)
+
+
+def prepare_fixtures(stations):
+    """
+    Données de référence nécessaires au scénario (créées si absentes).
+
+    Chaque poste de travail a son propre opérateur et son propre OF, comme
+    sur la ligne : les identifiants de poste et de rouleau ne se croisent pas.
+
+    Returns:
+        dict: profile_id, defect_type_id, reason_id, operators [(id, nom sans espaces)],
+              orders [(id, numéro d'OF)]
+    """
+    from catalog.models import ProfileTemplate, QualityDefectType, WcmLostTimeReason
+    from planification.models import FabricationOrder, Operator
+
+    profile = ProfileTemplate.objects.filter(is_active=True).order_by('name').first()
+    if profile is None:
+        profile = ProfileTemplate.objects.create(name='Charge 80g/m²')
+
+    defect_type = QualityDefectType.objects.filter(is_active=True).order_by('name').first()
+    if defect_type is None:
+        defect_type = QualityDefectType.objects.create(name='Charge', severity='non_blocking')
+
+    reason = WcmLostTimeReason.objects.filter(is_active=True).order_by('name').first()
+    if reason is None:
+        reason = WcmLostTimeReason.objects.create(name='Charge', category='autre')
+
+    operators = []
+    orders = []
+    for station in range(1, stations + 1):
+        operator, _ = Operator.objects.get_or_create(
+            employee_id=f'CHARGE{station:03d}',
+            defaults={'first_name': 'Charge', 'last_name': f'Poste{station:02d}'},
+        )
+        operators.append((operator.id, f"{operator.first_name}{operator.last_name}".replace(' ', '')))
+        order, _ = FabricationOrder.objects.get_or_create(order_number=f'CHARGE{station:02d}')
+        orders.append((order.id, order.order_number))
+
+    return {
+        'profile_id': profile.id,
+        'defect_type_id': defect_type.id,
+        'reason_id': reason.id,
+        'operators': operators,
+        'orders': orders,
+    }
+
+
+class StationSimulator:
+    """Un poste de travail : rejoue ses postes l'un après l'autre et mesure chaque requête."""
+
+    def __init__(self, station, params, fixtures):
+        self.station = station
+        self.params = params
+        self.fixtures = fixtures
+        self.operator_id, self.operator_name = fixtures['operators'][station - 1]
+        self.order_id, self.order_number = fixtures['orders'][station - 1]
+        self.random = random.Random(params['seed'] * 1000 + station)
+        self.client = Client(raise_request_exception=False)
+        self.records = []
+        self.seq = 0
+
+    def run(self):
+        try:
+            for index in range(self.params['shifts']):
+                self.run_shift(index)
+        finally:
+            # Connexion propre à ce thread
+            connections.close_all()
+
+    def request(self, method, path, data=None):
+        """Exécute une requête et enregistre sa durée, son statut et ses requêtes SQL."""
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            if method == 'get':
+                response = self.client.get(path)
+            else:
+                response = getattr(self.client, method)(path, data, content_type='application/json')
+        duration = time.perf_counter() - start
+
+        match = getattr(response, 'resolver_match', None)
+        self.records.append({
+            'url_name': match.view_name if match and match.view_name else 'unresolved',
+            'method': method.upper(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': collector.count,
+            'sql_ms': round(collector.duration * 1000, 2),
+            'repeated': collector.repeated_shapes(get_config()['N_PLUS_ONE_THRESHOLD']),
+        })
+        return response
+
+    def run_shift(self, index):
+        vacation, start_time, end_time = VACATIONS[index % len(VACATIONS)]
+        shift_date = FIRST_DATE + timedelta(days=index // len(VACATIONS))
+        shift_id = f"{shift_date:%d%m%y}_{self.operator_name}_{vacation}"
+
+        # Saisie de l'en-tête du poste : un PATCH par champ, comme le formulaire
+        for field, value in [
+            ('profile_id', self.fixtures['profile_id']),
+            ('operator_id', self.operator_id),
+            ('shift_date', shift_date.isoformat()),
+            ('vacation', vacation),
+            ('start_time', start_time),
+            ('end_time', end_time),
+            ('shift_id', shift_id),
+            ('of_en_cours', self.order_number),
+        ]:
+            self.request('patch', '/api/session/', {field: value})
+
+        for _ in range(self.params['rolls']):
+            self.create_roll(shift_id)
+
+        for _ in range(self.params['lost_times']):
+            self.request('post', '/api/lost-time-entries/', {
+                'reason': self.fixtures['reason_id'],
+                'duration': self.random.choice([5, 10, 15, 30]),
+                'comment': '',
+            })
+
+        self.request('patch', '/api/session/', {'quality_control': self.quality_control()})
+
+        self.request('post', '/api/shifts/', {
+            'date': shift_date.isoformat(),
+            'operator': self.operator_id,
+            'vacation': vacation,
+            'start_time': start_time,
+            'end_time': end_time,
+            'started_at_beginning': False,
+            'started_at_end': False,
+            'operator_comments': '',
+        })
+
+    def create_roll(self, shift_id):
+        response = self.request('get', f'/api/rolls/next-number/?of={self.order_number}')
+        roll_number = response.json()['next_number'] if response.status_code == 200 else None
+        if roll_number is None:
+            return
+
+        # Saisie du rouleau : modifications regroupées par l'envoi différé du client
+        mutations = []
+        for n in range(self.params['patch_burst']):
+            self.seq += 1
+            mutations.append({'seq': self.seq, 'data': {
+                'roll_data': {'roll_number': roll_number, 'filled_cells': n + 1},
+            }})
+        self.request('post', '/api/session/batch/', {'mutations': mutations})
+
+        length = self.random.choice([80, 100, 120])
+        self.request('post', '/api/rolls/', {
+            'roll_id': f'{self.order_number}_{roll_number:03d}',
+            'shift_id_str': shift_id,
+            'fabrication_order': self.order_id,
+            'roll_number': roll_number,
+            'length': length,
+            'tube_mass': 900,
+            'total_mass': 900 + length * 85,
+            'thicknesses': [
+                {
+                    'meter_position': 3 + (n // len(MEASUREMENT_POINTS)) * 5,
+                    'measurement_point': MEASUREMENT_POINTS[n % len(MEASUREMENT_POINTS)],
+                    'thickness_value': round(self.random.uniform(5.0, 8.0), 2),
+                    'is_catchup': False,
+                }
+                for n in range(self.params['thicknesses'])
+            ],
+            'defects': [
+                {
+                    'defect_type_id': self.fixtures['defect_type_id'],
+                    'meter_position': self.random.randint(0, length),
+                    'side_position': self.random.choice(MEASUREMENT_POINTS),
+                    'comment': '',
+                }
+                for _ in range(self.params['defects'])
+            ],
+        })
+
+    def quality_control(self):
+        left = [round(self.random.uniform(60, 70), 1) for _ in range(3)]
+        right = [round(self.random.uniform(60, 70), 1) for _ in range(3)]
+        return {
+            'micrometry': {
+                'left': left,
+                'right': right,
+                'averageLeft': round(sum(left) / 3, 2),
+                'averageRight': round(sum(right) / 3, 2),
+            },
+            'surfaceMass': {
+                'leftLeft': 80.5,
+                'leftCenter': 81.0,
+                'rightCenter': 80.2,
+                'rightRight': 79.8,
+                'averageLeft': 80.75,
+                'averageRight': 80.0,
+            },
+        }
+
+
+def run_load_test(**params):
+    """
+    Exécute le scénario avec un thread par poste de travail.
+
+    Returns:
+        dict: params, duration_s, requests, throughput_rps, shifts_per_min,
+              endpoints (summarize complété par errors et rps par URL)
+    """
+    params = {**SCENARIO_DEFAULTS, **params}
+    fixtures = prepare_fixtures(params['stations'])
+
+    simulators = [
+        StationSimulator(station, params, fixtures)
+        for station in range(1, params['stations'] + 1)
+    ]
+    threads = [threading.Thread(target=simulator.run) for simulator in simulators]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    records = [record for simulator in simulators for record in simulator.records]
+    endpoints = summarize(records)
+    for row in endpoints:
+        row['errors'] = sum(
+            1 for r in records if r['url_name'] == row['url_name'] and r['status'] >= 400
+        )
+        row['rps'] = round(row['requests'] / duration, 1)
+
+    return {
+        'params': params,
+        'duration_s': round(duration, 2),
+        'requests': len(records),
+        'throughput_rps': round(len(records) / duration, 1),
+        'shifts_per_min': round(params['stations'] * params['shifts'] / duration * 60, 1),
+        'endpoints': endpoints,
+    }
+
+
+def compare_to_baseline(result, baseline, tolerance=0.25, min_delta_ms=5.0):
+    """
+    Régressions par rapport à un résultat de référence.
+
+    Une URL régresse si son p95 dépasse la référence de plus de `tolerance`
+    (et d'au moins `min_delta_ms`, pour ignorer le bruit des requêtes très
+    courtes), si elle exécute plus de requêtes SQL en moyenne ou si elle
+    renvoie plus d'erreurs. Le débit global est comparé avec la même tolérance.
+
+    Returns:
+        list: Messages décrivant chaque régression (vide si aucune)
+    """
+    regressions = []
+    reference = {row['url_name']: row for row in baseline['endpoints']}
+
+    for row in result['endpoints']:
+        base = reference.get(row['url_name'])
+        if base is None:
+            continue
+        if row['p95_ms'] > base['p95_ms'] * (1 + tolerance) and row['p95_ms'] - base['p95_ms'] >= min_delta_ms:
+            regressions.append(
+                f"{row['url_name']}: p95 {row['p95_ms']} ms (référence {base['p95_ms']} ms)"
+            )
+        if row['avg_queries'] > base['avg_queries']:
+            regressions.append(
+                f"{row['url_name']}: {row['avg_queries']} requêtes SQL en moyenne "
+                f"(référence {base['avg_queries']})"
+            )
+        if row['errors'] > base.get('errors', 0):
+            regressions.append(
+                f"{row['url_name']}: {row['errors']} erreur(s) (référence {base.get('errors', 0)})"
+            )
+
+    if result['throughput_rps'] < baseline['throughput_rps'] * (1 - tolerance):
+        regressions.append(
+            f"débit {result['throughput_rps']} req/s (référence {baseline['throughput_rps']} req/s)"
+        )
+
+    return regressions
@@ -0,0 +1,187 @@
+import re
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from management.request_metrics import sql_shape
+from management.services import ReportService, RollupService, StatisticsService
+from production.models import Roll, Shift
+from quality.models import RollDefect
+from wcm.models import LostTimeEntry
+
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+# Parcours complet d'une table dans le plan d'exécution. Sous SQLite, tout
+# SCAN est un parcours complet, y compris « SCAN t USING [COVERING] INDEX i »
+# (tout l'index est lu) ; seul SEARCH utilise l'index pour filtrer. Les SCAN
+# d'une ligne constante ou d'une sous-requête ne lisent pas de table.
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'^SCAN (?!CONSTANT ROW\b)(\w+)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+# Tables de référence lues entièrement par conception (listes complètes
+# affichées ou mises en cache), quelle que soit leur taille
+ALLOWED_FULL_SCANS = {
+    'catalog_qualitydefecttype',
+    'catalog_wcmlosttimereason',
+}
+
+
+class SelectCollector:
+    """execute_wrapper qui garde les SELECT exécutés (une fois par forme de requête)."""
+
+    def __init__(self):
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.queries.setdefault(sql_shape(sql), (sql, params))
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie avec EXPLAIN que les requêtes des statistiques et rapports management "
+        "utilisent un index : échoue si une grande table est parcourue entièrement "
+        "(à lancer sur une base de taille réelle, ex. generate_synthetic_history)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=10000,
+            help='Taille à partir de laquelle le parcours complet d\'une table est signalé',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Période analysée par les statistiques (jours)',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Mettre à jour les statistiques du planificateur (ANALYZE) avant la vérification',
+        )
+        parser.add_argument(
+            '--allow',
+            action='append',
+            default=[],
+            metavar='TABLE',
+            help='Table dont le parcours complet est accepté (option répétable)',
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Afficher le plan complet de chaque requête',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f"Base non prise en charge: {connection.vendor}")
+
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        allowed = ALLOWED_FULL_SCANS | set(options['allow'])
+        large_tables = self._large_tables(options['min_rows']) - allowed
+        self.stdout.write(self.style.MIGRATE_HEADING('Vérification des plans de requêtes'))
+        self.stdout.write(
+            'Tables de plus de {} lignes : {}'.format(
+                options['min_rows'], ', '.join(sorted(large_tables)) or 'aucune'
+            )
+        )
+        self.stdout.write('Parcours complets acceptés : {}'.format(', '.join(sorted(allowed))))
+
+        problems = []
+        for label, run in self._checks(options['days']):
+            collector = SelectCollector()
+            # Pas de cache : les statistiques sont recalculées depuis la base
+            with override_settings(CACHES=DUMMY_CACHES), connection.execute_wrapper(collector):
+                run()
+
+            for sql, params in collector.queries.values():
+                plan = self._explain(sql, params)
+                scans = sorted(self._full_scans(plan) & large_tables)
+                if scans:
+                    problems.append((label, scans, sql, plan))
+                    self.stdout.write(self.style.ERROR(f"  SCAN {label}: {', '.join(scans)}"))
+                    self.stdout.write(f"      {sql[:200]}")
+                else:
+                    self.stdout.write(f"  OK   {label}")
+                if options['verbose_plans'] or scans:
+                    for line in plan:
+                        self.stdout.write(f"        {line}")
+
+        if problems:
+            raise CommandError(
+                f"{len(problems)} requête(s) parcourent entièrement une grande table"
+            )
+        self.stdout.write(self.style.SUCCESS('Toutes les requêtes vérifiées utilisent un index'))
+
+    def _checks(self, days):
+        """Requêtes vérifiées : services management et filtres fréquents."""
+        today = timezone.now().date()
+        start_date = today - timedelta(days=days)
+        last_shift = Shift.objects.order_by('-date', '-created_at').first()
+        shift_date = last_shift.date if last_shift else today
+
+        checks = [
+            ('statistiques du tableau de bord', StatisticsService.get_dashboard_statistics),
+            ('tendances', lambda: StatisticsService._get_daily_trends(days=days)),
+            ('performance des opérateurs', lambda: StatisticsService._get_operator_performance(days=days)),
+            ('analyse des défauts', lambda: StatisticsService._get_defects_analysis(days=days)),
+            ('alertes', StatisticsService._get_production_alerts),
+            ('postes récents', lambda: ReportService.get_recent_shifts(days=days, limit=50)),
+            ('agrégats journaliers', lambda: RollupService.compute(
+                Shift.objects.filter(date__gte=start_date)
+            )),
+            ('rouleaux d\'une journée', lambda: list(Roll.objects.filter(shift__date=shift_date))),
+            ('défauts bloquants d\'une période', lambda: list(RollDefect.objects.filter(
+                roll__shift__date__range=(start_date, today), defect_type__severity='blocking'
+            ))),
+            ('temps perdus d\'une journée', lambda: list(LostTimeEntry.objects.filter(shift__date=shift_date))),
+        ]
+        if last_shift:
+            checks += [
+                ('postes d\'un opérateur', lambda: list(Shift.objects.filter(
+                    date__range=(start_date, today), operator_id=last_shift.operator_id
+                ))),
+                ('rouleaux d\'un poste (clôture)', lambda: list(
+                    Roll.objects.filter(shift_id_str=last_shift.shift_id)
+                )),
+                ('rapport de poste', lambda: ReportService.get_shift_comprehensive_data(last_shift.pk)),
+            ]
+        return checks
+
+    def _large_tables(self, min_rows):
+        """Tables du projet dont le nombre de lignes dépasse min_rows."""
+        tables = set()
+        for model in apps.get_models():
+            if model._meta.managed and model.objects.count() >= min_rows:
+                tables.add(model._meta.db_table)
+        return tables
+
+    def _explain(self, sql, params):
+        """Plan d'exécution d'une requête, une ligne par étape."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute('EXPLAIN ' + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def _full_scans(self, plan):
+        """Tables parcourues entièrement d'après le plan."""
+        pattern = FULL_SCAN_PATTERNS[connection.vendor]
+        return {match.group(1) for line in plan if (match := pattern.search(line.strip()))}
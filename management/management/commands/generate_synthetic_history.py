@@ -0,0 +1,573 @@
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, pre_delete
+from django.utils import timezone
+
+from catalog.models import ProfileTemplate, QualityDefectType, WcmLostTimeReason
+from catalog.tolerances import GRAMMAGE_SPEC, THICKNESS_SPEC, ToleranceIndex
+from management.services import RollupService
+from management.services.statistics_cache import StatisticsCache
+from planification.models import FabricationOrder, Operator
+from production.models import Roll, Shift
+from production.services import roll_service, shift_service
+from quality.models import Controls, RollDefect, RollThickness
+from wcm.models import TRS, LostTimeEntry
+
+
+# Préfixe des opérateurs et OF générés (permet de les retrouver pour --clear)
+PREFIX = 'SYN'
+
+VACATIONS = [
+    ('Matin', time(4, 0), time(12, 0)),
+    ('ApresMidi', time(12, 0), time(20, 0)),
+    ('Nuit', time(20, 0), time(4, 0)),
+]
+
+MEASUREMENT_POINTS = ['GG', 'GC', 'GD', 'DG', 'DC', 'DD']
+
+# Longueurs de rouleau (m) et fréquences
+ROLL_LENGTHS = [60, 80, 100, 120]
+ROLL_LENGTH_WEIGHTS = [10, 25, 50, 15]
+
+# Nombre de défauts par rouleau et fréquences
+DEFECT_COUNTS = [0, 1, 2, 3]
+DEFECT_COUNT_WEIGHTS = [82, 13, 4, 1]
+
+# Nombre d'arrêts par poste et fréquences
+LOST_TIME_COUNTS = [0, 1, 2, 3, 4]
+LOST_TIME_WEIGHTS = [25, 30, 22, 15, 8]
+
+OPERATORS_COUNT = 6
+
+
+@contextmanager
+def historical_timestamps(*models):
+    """Désactive auto_now/auto_now_add pour écrire les dates de l'historique généré."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def statistics_invalidation_muted():
+    """
+    Suspend l'invalidation du cache des statistiques et le recalcul des
+    agrégats par objet supprimé (agrégats reconstruits une seule fois à la fin).
+    """
+    from management import signals
+
+    handlers = [
+        (post_delete, signals.invalidate_statistics_cache, [Roll, Shift, LostTimeEntry, RollDefect, TRS]),
+        (post_delete, signals.refresh_shift_rollup, [Shift]),
+        (post_delete, signals.refresh_related_rollup, [Roll, LostTimeEntry, TRS]),
+        (post_delete, signals.refresh_defect_rollup, [RollDefect]),
+        (pre_delete, signals.release_operator_rollups, [Operator]),
+    ]
+    for signal, handler, senders in handlers:
+        for sender in senders:
+            signal.disconnect(handler, sender=sender)
+    try:
+        yield
+    finally:
+        for signal, handler, senders in handlers:
+            for sender in senders:
+                signal.connect(handler, sender=sender)
+
+
+def decimal(value, places=2):
+    return Decimal(str(round(value, places)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un historique de production synthétique et reproductible (postes, rouleaux, "
+        "épaisseurs, défauts, temps perdus, contrôles qualité et TRS) pour mesurer les "
+        "tableaux de bord et exports sur de gros volumes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years',
+            type=float,
+            default=1.0,
+            help="Durée de l'historique en années",
+        )
+        parser.add_argument(
+            '--end',
+            dest='end_date',
+            help="Dernier jour de l'historique (AAAA-MM-JJ, aujourd'hui par défaut)",
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Graine du générateur : mêmes paramètres et même graine, mêmes données',
+        )
+        parser.add_argument(
+            '--rolls-per-shift',
+            type=int,
+            default=12,
+            help='Nombre moyen de rouleaux par poste',
+        )
+        parser.add_argument(
+            '--thicknesses',
+            type=int,
+            default=60,
+            help="Mesures d'épaisseur par rouleau",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Lignes insérées par requête (bulk_create)',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Supprimer un historique synthétique déjà généré avant de générer',
+        )
+        parser.add_argument(
+            '--skip-rollups',
+            action='store_true',
+            help='Ne pas reconstruire les agrégats journaliers de la période',
+        )
+
+    def handle(self, *args, **options):
+        if options['years'] <= 0:
+            raise CommandError('--years doit être > 0')
+        if options['rolls_per_shift'] < 1 or options['chunk_size'] < 1 or options['thicknesses'] < 0:
+            raise CommandError('--rolls-per-shift et --chunk-size doivent être >= 1, --thicknesses >= 0')
+
+        end_date = self._parse_date(options['end_date']) or timezone.localdate()
+        start_date = end_date - timedelta(days=round(options['years'] * 365) - 1)
+
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self._load_reference_data()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Génération de l'historique synthétique du {start_date} au {end_date}"
+        ))
+
+        if options['clear']:
+            self._clear()
+        elif Operator.objects.filter(employee_id__startswith=PREFIX).exists():
+            raise CommandError('Un historique synthétique existe déjà (utiliser --clear pour le remplacer)')
+
+        self.operators = [
+            Operator.objects.create(
+                first_name='Synthese',
+                last_name=f'Equipe{n}',
+                employee_id=f'{PREFIX}{n:03d}',
+                training_completed=True,
+            )
+            for n in range(1, OPERATORS_COUNT + 1)
+        ]
+        self.order = None
+        self.order_count = 0
+        self.meter_reading = 0.0
+
+        totals = {'shifts': 0, 'rolls': 0, 'thicknesses': 0, 'defects': 0, 'lost_times': 0}
+        with historical_timestamps(Shift, Roll, RollThickness, RollDefect, LostTimeEntry, Controls, TRS,
+                                   FabricationOrder):
+            for period_start, period_end in self._months(start_date, end_date):
+                with transaction.atomic():
+                    counts = self._generate_period(period_start, period_end)
+                for key, value in counts.items():
+                    totals[key] += value
+                self.stdout.write(
+                    f"  {period_start:%Y-%m} : {counts['shifts']} postes, {counts['rolls']} rouleaux, "
+                    f"{counts['thicknesses']} épaisseurs"
+                )
+
+        if not options['skip_rollups']:
+            RollupService.rebuild(start_date, end_date)
+        StatisticsCache.bump_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['shifts']} postes, {totals['rolls']} rouleaux, {totals['thicknesses']} épaisseurs, "
+            f"{totals['defects']} défauts et {totals['lost_times']} temps perdus générés"
+        ))
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Date invalide: {value} (format attendu AAAA-MM-JJ)")
+
+    def _months(self, start_date, end_date):
+        """Découpe la période en mois (une transaction par mois)."""
+        current = start_date
+        while current <= end_date:
+            next_month = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+            yield current, min(end_date, next_month - timedelta(days=1))
+            current = next_month
+
+    def _load_reference_data(self):
+        """Profils, types de défauts et motifs d'arrêt existants (load_initial_data)."""
+        profiles = list(ProfileTemplate.objects.filter(is_active=True).order_by('-is_default', 'id'))
+        self.defect_types = list(QualityDefectType.objects.filter(is_active=True).order_by('id'))
+        self.reasons = list(WcmLostTimeReason.objects.filter(is_active=True).order_by('id'))
+        if not profiles or not self.defect_types or not self.reasons:
+            raise CommandError(
+                "Profils, types de défauts ou motifs d'arrêt manquants : lancer d'abord load_initial_data"
+            )
+
+        self.severities = {defect_type.id: defect_type.severity for defect_type in self.defect_types}
+        self.profiles = []
+        for profile in profiles:
+            thickness = ToleranceIndex.get(profile.id, THICKNESS_SPEC)
+            grammage = ToleranceIndex.get(profile.id, GRAMMAGE_SPEC)
+            self.profiles.append({
+                'id': profile.id,
+                'name': profile.name,
+                'belt_speed': float(profile.belt_speed_m_per_minute or 5.0),
+                'width': ToleranceIndex.get_felt_width(profile.id),
+                'thickness': (thickness and thickness.value_nominal) or 6.5,
+                'thickness_min': (thickness and thickness.value_min) or 3.2,
+                'grammage': (grammage and grammage.value_nominal) or 80.0,
+                'micronaire': self._nominal(profile.id, 'Micronaire', 32.0),
+                'surface_mass': self._nominal(profile.id, 'Masse Surfacique', 0.0112),
+                'dry_extract': self._nominal(profile.id, 'Extrait Sec', 0.26),
+            })
+        # Le profil par défaut est produit la plupart du temps
+        self.profile_weights = [6] + [1] * (len(self.profiles) - 1)
+        self.profile = self.profiles[0]
+        self.profile_until = None
+
+    @staticmethod
+    def _nominal(profile_id, spec_name, default):
+        tolerance = ToleranceIndex.get(profile_id, spec_name)
+        return (tolerance and tolerance.value_nominal) or default
+
+    def _clear(self):
+        """Supprime l'historique synthétique et les agrégats de sa période."""
+        shifts = Shift.objects.filter(operator__employee_id__startswith=PREFIX)
+        period = shifts.aggregate(start=Min('date'), end=Max('date'))
+        rolls = Roll.objects.filter(fabrication_order__order_number__startswith=PREFIX)
+
+        with statistics_invalidation_muted(), transaction.atomic():
+            RollThickness.objects.filter(roll__in=rolls).delete()
+            RollDefect.objects.filter(roll__in=rolls).delete()
+            rolls.delete()
+            shifts.delete()
+            FabricationOrder.objects.filter(order_number__startswith=PREFIX).delete()
+            # Agrégats reconstruits avant de supprimer les opérateurs : il n'en
+            # reste plus aucun qui les référence
+            if period['start']:
+                RollupService.rebuild(period['start'], period['end'])
+            Operator.objects.filter(employee_id__startswith=PREFIX).delete()
+
+        self.stdout.write('  Historique synthétique précédent supprimé')
+
+    def _next_order(self, day):
+        """Nouvel OF tous les 2 à 5 jours."""
+        self.order_count += 1
+        self.order = FabricationOrder.objects.create(
+            order_number=f'{PREFIX}{self.order_count:05d}',
+            creation_date=day,
+            target_roll_length=Decimal('100'),
+            created_at=self._aware(day, time(4, 0)),
+            updated_at=self._aware(day, time(4, 0)),
+        )
+        self.order_until = day + timedelta(days=self.random.randint(2, 5))
+        self.roll_number = 0
+
+    def _switch_profile(self, day):
+        """Campagnes de production de 5 à 15 jours par profil."""
+        self.profile = self.random.choices(self.profiles, weights=self.profile_weights)[0]
+        self.profile_until = day + timedelta(days=self.random.randint(5, 15))
+
+    @staticmethod
+    def _aware(day, at):
+        return timezone.make_aware(datetime.combine(day, at))
+
+    def _shift_plan(self, day):
+        """Vacations travaillées : 3x8 en semaine, matin un samedi sur deux, pas le dimanche."""
+        if day.weekday() < 5:
+            return VACATIONS
+        if day.weekday() == 5 and day.isocalendar()[1] % 2 == 0:
+            return VACATIONS[:1]
+        return []
+
+    def _generate_period(self, period_start, period_end):
+        shifts = []
+        rolls = []  # (index du poste, rouleau, épaisseurs, défauts)
+        lost_times = []  # (index du poste, temps perdu)
+        controls = []
+        trs_list = []
+
+        day = period_start
+        while day <= period_end:
+            if self.order is None or day > self.order_until:
+                self._next_order(day)
+            if self.profile_until is None or day > self.profile_until:
+                self._switch_profile(day)
+
+            for vacation, start_time, end_time in self._shift_plan(day):
+                index = len(shifts)
+                shift, shift_rolls, shift_lost_times = self._build_shift(day, vacation, start_time, end_time)
+                shifts.append(shift)
+                rolls.extend((index, *roll) for roll in shift_rolls)
+                lost_times.extend((index, entry) for entry in shift_lost_times)
+                controls.append((index, self._build_controls(shift)))
+                trs_list.append((index, self._build_trs(shift)))
+            day += timedelta(days=1)
+
+        chunk_size = self.options['chunk_size']
+        Shift.objects.bulk_create(shifts, batch_size=chunk_size)
+
+        for index, roll, _, _ in rolls:
+            roll.shift = shifts[index]
+            roll.production_date = shifts[index].date
+            roll.vacation = shifts[index].vacation
+        Roll.objects.bulk_create([roll for _, roll, _, _ in rolls], batch_size=chunk_size)
+
+        thicknesses = []
+        defects = []
+        for _, roll, roll_thicknesses, roll_defects in rolls:
+            for thickness in roll_thicknesses:
+                thickness.roll = roll
+            for defect in roll_defects:
+                defect.roll = roll
+                defect.production_date = roll.production_date
+            thicknesses.extend(roll_thicknesses)
+            defects.extend(roll_defects)
+        RollThickness.objects.bulk_create(thicknesses, batch_size=chunk_size)
+        RollDefect.objects.bulk_create(defects, batch_size=chunk_size)
+
+        for related in (lost_times, controls, trs_list):
+            for index, obj in related:
+                obj.shift = shifts[index]
+        LostTimeEntry.objects.bulk_create([entry for _, entry in lost_times], batch_size=chunk_size)
+        Controls.objects.bulk_create([control for _, control in controls], batch_size=chunk_size)
+        TRS.objects.bulk_create([trs for _, trs in trs_list], batch_size=chunk_size)
+
+        return {
+            'shifts': len(shifts),
+            'rolls': len(rolls),
+            'thicknesses': len(thicknesses),
+            'defects': len(defects),
+            'lost_times': len(lost_times),
+        }
+
+    def _build_shift(self, day, vacation, start_time, end_time):
+        """Poste avec ses rouleaux et temps perdus, totaux calculés comme à la clôture."""
+        operator = self.operators[
+            (day.isocalendar()[1] * len(VACATIONS) + [v[0] for v in VACATIONS].index(vacation))
+            % len(self.operators)
+        ]
+        start = self._aware(day, start_time)
+        end = start + timedelta(hours=8)
+
+        lost_times = []
+        for _ in range(self.random.choices(LOST_TIME_COUNTS, weights=LOST_TIME_WEIGHTS)[0]):
+            duration = min(120, max(5, round(self.random.expovariate(1 / 20))))
+            lost_times.append(LostTimeEntry(
+                reason=self.random.choice(self.reasons),
+                duration=duration,
+                created_by=operator,
+                created_at=start + timedelta(minutes=self.random.randint(0, 470)),
+            ))
+        lost_time = timedelta(minutes=sum(entry.duration for entry in lost_times))
+        availability_time = shift_service.calculate_availability_time(start_time, end_time, lost_time, vacation)
+
+        # Moins de rouleaux quand la ligne a été arrêtée longtemps
+        availability_ratio = availability_time.total_seconds() / (8 * 3600)
+        roll_count = max(0, round(self.random.gauss(self.options['rolls_per_shift'] * availability_ratio, 1.5)))
+
+        shift_id = f"{day:%d%m%y}_{operator.first_name}{operator.last_name}_{vacation}".replace(' ', '')
+        rolls = [
+            self._build_roll(shift_id, start + (end - start) * (n + 1) / (roll_count + 1))
+            for n in range(roll_count)
+        ]
+
+        lengths = [(roll.length, roll.status) for roll, _, _ in rolls]
+        total_length = sum(length for length, _ in lengths)
+        ok_length = sum(length for length, status in lengths if status == 'CONFORME')
+
+        def average(values, places):
+            values = [value for value in values if value is not None]
+            return round(sum(values) / len(values), places) if values else None
+
+        meter_reading_start = self.meter_reading
+        self.meter_reading += float(total_length)
+
+        shift = Shift(
+            shift_id=shift_id,
+            date=day,
+            operator=operator,
+            vacation=vacation,
+            start_time=start_time,
+            end_time=end_time,
+            availability_time=availability_time,
+            lost_time=lost_time,
+            total_length=total_length,
+            ok_length=ok_length,
+            nok_length=total_length - ok_length,
+            raw_waste_length=0,
+            avg_thickness_left_shift=average([roll.avg_thickness_left for roll, _, _ in rolls], 2),
+            avg_thickness_right_shift=average([roll.avg_thickness_right for roll, _, _ in rolls], 2),
+            avg_grammage_shift=average([roll.grammage_calc for roll, _, _ in rolls], 1),
+            started_at_beginning=True,
+            meter_reading_start=decimal(meter_reading_start),
+            started_at_end=True,
+            meter_reading_end=decimal(self.meter_reading),
+            checklist_signed=f"{operator.first_name[0]}{operator.last_name[0]}",
+            operator_comments='',
+            created_at=end,
+            updated_at=end,
+        )
+        return shift, rolls, lost_times
+
+    def _build_roll(self, shift_id, created_at):
+        """Rouleau, épaisseurs et défauts ; conformité évaluée par RollService."""
+        profile = self.profile
+        length = Decimal(self.random.choices(ROLL_LENGTHS, weights=ROLL_LENGTH_WEIGHTS)[0])
+        tube_mass = Decimal(self.random.choice([850, 900, 950]))
+        grammage_target = self.random.gauss(profile['grammage'], profile['grammage'] * 0.03)
+        total_mass = tube_mass + decimal(float(length) * profile['width'] * grammage_target)
+
+        net_mass = roll_service.calculate_net_mass(total_mass, tube_mass)
+        grammage = roll_service.calculate_grammage(net_mass, length, width=profile['width'])
+
+        # Quelques rouleaux avec une dérive d'épaisseur (réglage, usure)
+        if self.random.random() < 0.03:
+            mean = profile['thickness_min'] + 0.2
+        else:
+            mean = profile['thickness']
+        thicknesses = [
+            RollThickness(
+                meter_position=3 + (n // len(MEASUREMENT_POINTS)) * 5,
+                measurement_point=MEASUREMENT_POINTS[n % len(MEASUREMENT_POINTS)],
+                thickness_value=decimal(max(0.5, self.random.gauss(mean, profile['thickness'] * 0.08))),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            for n in range(self.options['thicknesses'])
+        ]
+
+        defects = []
+        seen = set()
+        for _ in range(self.random.choices(DEFECT_COUNTS, weights=DEFECT_COUNT_WEIGHTS)[0]):
+            defect_type = self.random.choice(self.defect_types)
+            key = (self.random.randint(0, int(length)), self.random.choice(MEASUREMENT_POINTS), defect_type.id)
+            if key in seen:
+                continue
+            seen.add(key)
+            defects.append(RollDefect(
+                defect_type=defect_type,
+                meter_position=key[0],
+                side_position=key[1],
+                comment='',
+                created_at=created_at,
+                updated_at=created_at,
+            ))
+
+        evaluation = roll_service.evaluate_thicknesses(thicknesses, profile['id'])
+        if evaluation is not None:
+            has_thickness_issues = evaluation['has_issues']
+            thickness_non_conform = evaluation['is_blocking']
+        else:
+            has_thickness_issues = thickness_non_conform = False
+        has_blocking_defects = any(self.severities[d.defect_type_id] == 'blocking' for d in defects)
+        grammage_ok = roll_service.evaluate_grammage(grammage, profile['id']) is not False
+        status = roll_service.determine_roll_status(thickness_non_conform, has_blocking_defects, grammage_ok)
+
+        self.roll_number += 1
+        roll = Roll(
+            roll_id=f'{self.order.order_number}_{self.roll_number:03d}',
+            shift_id_str=shift_id,
+            fabrication_order=self.order,
+            roll_number=self.roll_number,
+            length=length,
+            tube_mass=tube_mass,
+            total_mass=total_mass,
+            net_mass=net_mass,
+            grammage_calc=grammage,
+            status=status,
+            destination=roll_service.determine_destination(status),
+            has_blocking_defects=has_blocking_defects,
+            has_thickness_issues=has_thickness_issues,
+            avg_thickness_left=roll_service.calculate_avg_thickness(thicknesses, side='left'),
+            avg_thickness_right=roll_service.calculate_avg_thickness(thicknesses, side='right'),
+            created_at=created_at,
+            updated_at=created_at,
+        )
+        return roll, thicknesses, defects
+
+    def _build_controls(self, shift):
+        """Contrôles qualité du poste autour des valeurs nominales du profil."""
+        profile = self.profile
+        left = [self.random.gauss(profile['micronaire'], profile['micronaire'] * 0.05) for _ in range(3)]
+        right = [self.random.gauss(profile['micronaire'], profile['micronaire'] * 0.05) for _ in range(3)]
+        masses = [self.random.gauss(profile['surface_mass'], profile['surface_mass'] * 0.04) for _ in range(4)]
+        return Controls(
+            micrometer_left_1=decimal(left[0], 3),
+            micrometer_left_2=decimal(left[1], 3),
+            micrometer_left_3=decimal(left[2], 3),
+            micrometer_left_avg=decimal(sum(left) / 3, 3),
+            micrometer_right_1=decimal(right[0], 3),
+            micrometer_right_2=decimal(right[1], 3),
+            micrometer_right_3=decimal(right[2], 3),
+            micrometer_right_avg=decimal(sum(right) / 3, 3),
+            dry_extract=decimal(self.random.gauss(profile['dry_extract'], profile['dry_extract'] * 0.05), 3),
+            surface_mass_gg=decimal(masses[0], 6),
+            surface_mass_gc=decimal(masses[1], 6),
+            surface_mass_dc=decimal(masses[2], 6),
+            surface_mass_dd=decimal(masses[3], 6),
+            surface_mass_left_avg=decimal((masses[0] + masses[1]) / 2, 6),
+            surface_mass_right_avg=decimal((masses[2] + masses[3]) / 2, 6),
+            created_by=shift.operator,
+            created_at=shift.created_at - timedelta(hours=4),
+        )
+
+    def _build_trs(self, shift):
+        """TRS du poste (mêmes formules que wcm.services.calculate_and_create_trs)."""
+        opening_minutes = 8 * 60
+        available_minutes = shift.availability_time.total_seconds() / 60
+        availability = available_minutes / opening_minutes * 100
+
+        total_length = float(shift.total_length)
+        if total_length > 0 and available_minutes > 0:
+            theoretical_production = available_minutes * self.profile['belt_speed']
+            performance = min(100, total_length / theoretical_production * 100)
+        else:
+            theoretical_production = 0
+            performance = 0
+        quality = float(shift.ok_length) / total_length * 100 if total_length > 0 else 0
+
+        return TRS(
+            opening_time=timedelta(minutes=opening_minutes),
+            availability_time=shift.availability_time,
+            lost_time=shift.lost_time,
+            total_length=shift.total_length,
+            ok_length=shift.ok_length,
+            nok_length=shift.nok_length,
+            raw_waste_length=0,
+            trs_percentage=decimal(availability * performance * quality / 10000, 1),
+            availability_percentage=decimal(availability, 1),
+            performance_percentage=decimal(performance, 1),
+            quality_percentage=decimal(quality, 1),
+            theoretical_production=decimal(theoretical_production),
+            profile_name=self.profile['name'],
+            belt_speed_m_per_min=decimal(self.profile['belt_speed']),
+            created_at=shift.created_at,
+        )
@@ -0,0 +1,152 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from management.loadtest import SCENARIO_DEFAULTS, compare_to_baseline, run_load_test
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc de charge : simule plusieurs postes de travail qui enregistrent des postes "
+        "complets via l'API REST (base jetable) et rapporte débit, latences et requêtes SQL "
+        "par endpoint ; échoue en cas de régression par rapport à une référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stations', type=int, default=SCENARIO_DEFAULTS['stations'],
+                            help='Postes de travail simulés en parallèle')
+        parser.add_argument('--shifts', type=int, default=SCENARIO_DEFAULTS['shifts'],
+                            help='Postes enregistrés par poste de travail')
+        parser.add_argument('--rolls', type=int, default=SCENARIO_DEFAULTS['rolls'],
+                            help='Rouleaux par poste')
+        parser.add_argument('--thicknesses', type=int, default=SCENARIO_DEFAULTS['thicknesses'],
+                            help="Mesures d'épaisseur par rouleau")
+        parser.add_argument('--defects', type=int, default=SCENARIO_DEFAULTS['defects'],
+                            help='Défauts par rouleau')
+        parser.add_argument('--lost-times', type=int, default=SCENARIO_DEFAULTS['lost_times'],
+                            help='Temps perdus par poste')
+        parser.add_argument('--patch-burst', type=int, default=SCENARIO_DEFAULTS['patch_burst'],
+                            help='Modifications de session envoyées par saisie de rouleau')
+        parser.add_argument('--seed', type=int, default=SCENARIO_DEFAULTS['seed'],
+                            help='Graine des valeurs mesurées (résultats reproductibles)')
+        parser.add_argument(
+            '--baseline',
+            help='Fichier JSON de référence : la commande échoue si un endpoint régresse',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            help='Enregistrer le résultat comme nouvelle référence dans ce fichier',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Dégradation tolérée du p95 et du débit par rapport à la référence (0.25 = 25%%)',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['table', 'json'],
+            default='table',
+            help='Format de sortie',
+        )
+        parser.add_argument(
+            '--in-place',
+            action='store_true',
+            help='Utiliser la base configurée au lieu d\'une base jetable (les données créées sont conservées)',
+        )
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in SCENARIO_DEFAULTS}
+        if any(value < 0 for value in params.values()) or params['stations'] < 1 or params['shifts'] < 1:
+            raise CommandError('--stations et --shifts doivent être >= 1, les autres paramètres >= 0')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Référence illisible: {options['baseline']} ({e})")
+            if baseline['params'] != params:
+                raise CommandError(
+                    f"La référence a été mesurée avec d'autres paramètres: {baseline['params']}"
+                )
+
+        # Pas de métriques du middleware ni de cache partagé avec l'application
+        metrics = {**getattr(settings, 'REQUEST_METRICS', {}), 'ENABLED': False}
+        with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=LOCMEM_CACHES, REQUEST_METRICS=metrics):
+            if options['in_place']:
+                result = run_load_test(**params)
+            else:
+                result = self._run_in_scratch_database(params)
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            self._write_table(result)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Référence enregistrée: {options['save_baseline']}"))
+
+        if baseline is not None:
+            regressions = compare_to_baseline(result, baseline, tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError(
+                    'Régression par rapport à la référence :\n  ' + '\n  '.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Aucune régression par rapport à la référence'))
+
+    def _run_in_scratch_database(self, params):
+        """Crée une base de test migrée, y charge les données de référence et lance le scénario."""
+        work_dir = tempfile.mkdtemp(prefix='loadtest_')
+        test_settings = connection.settings_dict['TEST']
+        previous_name = test_settings.get('NAME')
+        if connection.vendor == 'sqlite':
+            # Base fichier : les threads des postes de travail ont chacun leur connexion
+            test_settings['NAME'] = os.path.join(work_dir, 'loadtest.sqlite3')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Préparation de la base de charge...'))
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command('load_initial_data', stdout=StringIO())
+            return run_load_test(**params)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = previous_name
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _write_table(self, result):
+        params = result['params']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Charge : {params['stations']} poste(s) de travail x {params['shifts']} poste(s), "
+            f"{params['rolls']} rouleaux de {params['thicknesses']} mesures"
+        ))
+        self.stdout.write(
+            f"{'URL':<40} {'Req.':>6} {'Err.':>5} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'SQL moy':>8} {'SQL max':>8}"
+        )
+        for row in result['endpoints']:
+            self.stdout.write(
+                f"{row['url_name'][:40]:<40} {row['requests']:>6} {row['errors']:>5} {row['rps']:>7} "
+                f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+                f"{row['avg_queries']:>8} {row['max_queries']:>8}"
+            )
+        self.stdout.write(
+            f"{result['requests']} requêtes en {result['duration_s']} s : "
+            f"{result['throughput_rps']} req/s, {result['shifts_per_min']} postes/min"
+        )
@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from management.models import DailyProductionRollup
+from management.services import RollupService
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les agrégats journaliers de production (DailyProductionRollup) "
+        "à partir des postes, rouleaux, défauts et temps perdus"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='start_date',
+            help='Date de début incluse (AAAA-MM-JJ), tout l\'historique par défaut',
+        )
+        parser.add_argument(
+            '--to',
+            dest='end_date',
+            help='Date de fin incluse (AAAA-MM-JJ)',
+        )
+
+    def handle(self, *args, **options):
+        start_date = self._parse_date(options['start_date'])
+        end_date = self._parse_date(options['end_date'])
+        
+        if start_date and end_date and start_date > end_date:
+            raise CommandError('La date de début doit précéder la date de fin')
+        
+        self.stdout.write(self.style.MIGRATE_HEADING('Reconstruction des agrégats journaliers'))
+        
+        created = RollupService.rebuild(start_date, end_date)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} agrégat(s) reconstruit(s) "
+            f"({DailyProductionRollup.objects.count()} au total)"
+        ))
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Date invalide: {value} (format attendu AAAA-MM-JJ)")
@@ -0,0 +1,118 @@
+import csv
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from management.request_metrics import dump_paths, get_config, load_dumps, summarize
+
+
+CSV_FIELDS = [
+    'url_name', 'requests', 'p50_ms', 'p95_ms', 'p99_ms',
+    'avg_queries', 'max_queries', 'avg_sql_ms', 'n_plus_one_requests',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Rapport des métriques collectées par RequestMetricsMiddleware : "
+        "latences p50/p95/p99, requêtes SQL et motifs N+1 par nom d'URL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=['table', 'json', 'csv'],
+            default='table',
+            help='Format de sortie',
+        )
+        parser.add_argument(
+            '--output',
+            help='Fichier de sortie (sortie standard par défaut)',
+        )
+        parser.add_argument(
+            '--dir',
+            help='Répertoire des sauvegardes de métriques (REQUEST_METRICS DUMP_DIR par défaut)',
+        )
+        parser.add_argument(
+            '--url',
+            action='append',
+            default=[],
+            help="Limiter le rapport à ce nom d'URL (option répétable)",
+        )
+        parser.add_argument(
+            '--raw',
+            action='store_true',
+            help='Exporter les mesures brutes au lieu du résumé (json/csv)',
+        )
+        parser.add_argument(
+            '--include-dead',
+            action='store_true',
+            help='Inclure les sauvegardes des processus serveurs terminés',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Supprimer les sauvegardes après le rapport',
+        )
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'] or get_config()['DUMP_DIR'])
+        if not directory.exists():
+            raise CommandError(f"Aucune métrique trouvée dans {directory}")
+
+        records = load_dumps(directory, include_dead=options['include_dead'])
+        if options['url']:
+            records = [r for r in records if r['url_name'] in options['url']]
+
+        rows = records if options['raw'] else summarize(records)
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            if options['format'] == 'json':
+                json.dump(rows, output, indent=2, ensure_ascii=False)
+                output.write('\n')
+            elif options['format'] == 'csv':
+                self._write_csv(rows, output, raw=options['raw'])
+            else:
+                self._write_table(rows)
+        finally:
+            if options['output']:
+                output.close()
+
+        if options['reset']:
+            for path in dump_paths(directory, include_dead=True):
+                path.unlink()
+            self.stdout.write(self.style.SUCCESS('Métriques réinitialisées'))
+
+    def _write_csv(self, rows, output, raw=False):
+        if raw:
+            fields = ['url_name', 'method', 'status', 'duration_ms', 'queries', 'sql_ms', 'timestamp']
+        else:
+            fields = CSV_FIELDS
+        writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+    def _write_table(self, rows):
+        self.stdout.write(self.style.MIGRATE_HEADING('Métriques par endpoint'))
+        self.stdout.write(
+            f"{'URL':<45} {'Req.':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'SQL moy':>8} {'SQL max':>8} {'SQL ms':>8} {'N+1':>5}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['url_name'][:45]:<45} {row['requests']:>6} {row['p50_ms']:>8} "
+                f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['avg_queries']:>8} "
+                f"{row['max_queries']:>8} {row['avg_sql_ms']:>8} {row['n_plus_one_requests']:>5}"
+            )
+
+        flagged = [row for row in rows if row['n_plus_one_shapes']]
+        if flagged:
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING('Motifs N+1 détectés (requêtes SQL identiques répétées) :'))
+            for row in flagged:
+                self.stdout.write(f"  {row['url_name']}")
+                for shape in row['n_plus_one_shapes']:
+                    self.stdout.write(f"    x{shape['count']}: {shape['sql'][:150]}")
@@ -0,0 +1,86 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from .request_metrics import QueryCollector, get_config, metrics_store, prune_dead_dumps
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Mesure la durée de chaque requête HTTP et les requêtes SQL qu'elle exécute.
+
+    Désactivé tant que REQUEST_METRICS['ENABLED'] est faux (retiré de la
+    chaîne des middlewares). Les mesures sont regroupées par nom d'URL (ex:
+    roll-list, management:api-dashboard-stats) ; voir la commande
+    request_metrics_report.
+    """
+
+    def __init__(self, get_response):
+        self.config = get_config()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        metrics_store.resize(self.config['BUFFER_SIZE'])
+        try:
+            prune_dead_dumps(self.config['DUMP_DIR'])
+        except OSError as e:
+            logger.error(f"Erreur nettoyage métriques: {str(e)}")
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with self._collecting(collector):
+            response = self.get_response(request)
+
+        if response.streaming and not response.is_async and getattr(response, 'file_to_stream', None) is None:
+            # Les requêtes SQL du contenu sont exécutées pendant l'itération :
+            # la mesure est enregistrée à la fin du flux (sauf FileResponse,
+            # envoyé par le serveur via wsgi.file_wrapper, sans requête SQL)
+            response.streaming_content = self._stream(
+                request, response, response.streaming_content, collector, start
+            )
+            return response
+
+        self._record(request, response, collector, time.perf_counter() - start)
+        return response
+
+    @contextmanager
+    def _collecting(self, collector):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            yield
+
+    def _stream(self, request, response, content, collector, start):
+        try:
+            with self._collecting(collector):
+                yield from content
+        finally:
+            self._record(request, response, collector, time.perf_counter() - start)
+
+    def _record(self, request, response, collector, duration):
+        try:
+            match = getattr(request, 'resolver_match', None)
+            url_name = match.view_name if match and match.view_name else 'unresolved'
+
+            metrics_store.record({
+                'url_name': url_name,
+                'method': request.method,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'queries': collector.count,
+                'sql_ms': round(collector.duration * 1000, 2),
+                'repeated': collector.repeated_shapes(self.config['N_PLUS_ONE_THRESHOLD']),
+                'timestamp': timezone.now().isoformat(),
+            })
+            metrics_store.dump_if_due(self.config['DUMP_INTERVAL'])
+        except Exception as e:
+            # Les métriques ne doivent jamais faire échouer une requête
+            logger.error(f"Erreur enregistrement métriques: {str(e)}")
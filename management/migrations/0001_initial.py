@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('planification', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('vacation', models.CharField(max_length=20, verbose_name='Vacation')),
+                ('shifts_count', models.PositiveIntegerField(default=0, verbose_name='Nombre de postes')),
+                ('total_length', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Longueur totale (m)')),
+                ('ok_length', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Longueur conforme (m)')),
+                ('nok_length', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Longueur non conforme (m)')),
+                ('rolls_count', models.PositiveIntegerField(default=0, verbose_name='Nombre de rouleaux')),
+                ('non_blocking_defects_count', models.PositiveIntegerField(default=0, verbose_name='Défauts non bloquants')),
+                ('blocking_defects_count', models.PositiveIntegerField(default=0, verbose_name='Défauts bloquants')),
+                ('threshold_defects_count', models.PositiveIntegerField(default=0, verbose_name='Défauts bloquants selon seuil')),
+                ('lost_time', models.PositiveIntegerField(default=0, verbose_name='Temps perdu (minutes)')),
+                ('kpi_length', models.DecimalField(decimal_places=2, default=0, help_text='Dénominateur des moyennes pondérées', max_digits=12, verbose_name='Longueur des postes avec KPIs (m)')),
+                ('trs_weighted', models.FloatField(default=0, verbose_name='TRS pondéré')),
+                ('availability_weighted', models.FloatField(default=0, verbose_name='Disponibilité pondérée')),
+                ('performance_weighted', models.FloatField(default=0, verbose_name='Performance pondérée')),
+                ('quality_weighted', models.FloatField(default=0, verbose_name='Qualité pondérée')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('operator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_rollups', to='planification.operator', verbose_name='Opérateur')),
+            ],
+            options={
+                'verbose_name': 'Agrégat de production journalier',
+                'verbose_name_plural': 'Agrégats de production journaliers',
+                'ordering': ['-date', 'vacation'],
+                'indexes': [models.Index(fields=['date'], name='management__date_bc7505_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'vacation', 'operator'), name='unique_daily_rollup_per_operator')],
+            },
+        ),
+    ]
@@ -0,0 +1,161 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:59
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, Q, Sum
+
+
+# Copie figée des règles de RollupService.compute et de
+# ReportService._calculate_kpis au moment de la migration : la migration
+# n'utilise que les modèles historiques et ne dépend pas du code courant.
+KPI_KEYS = ['trs', 'availability', 'performance', 'quality']
+
+SEVERITY_FIELDS = {
+    'non_blocking': 'non_blocking_defects_count',
+    'blocking': 'blocking_defects_count',
+    'threshold': 'threshold_defects_count',
+}
+
+
+def legacy_kpis(shift, lost_time_total):
+    """KPIs d'un ancien poste sans TRS (calcul de repli du rapport de poste)."""
+    if shift.start_time and shift.end_time:
+        start = datetime.combine(shift.date, shift.start_time)
+        end = datetime.combine(shift.date, shift.end_time)
+        if end < start:
+            end += timedelta(days=1)
+        opening_time = (end - start).total_seconds() / 60
+    else:
+        opening_time = 480
+
+    available_time = opening_time - lost_time_total
+    availability = (available_time / opening_time * 100) if opening_time > 0 else 0
+
+    actual_production = float(shift.total_length or 0)
+    if actual_production > 0 and available_time > 0:
+        performance = min(100, actual_production / (available_time * 5) * 100)
+    else:
+        performance = 0
+
+    total_length = float(shift.total_length or 0)
+    quality = (float(shift.ok_length or 0) / total_length * 100) if total_length > 0 else 0
+
+    return {
+        'trs': round(availability * performance * quality / 10000, 1),
+        'availability': round(availability, 1),
+        'performance': round(performance, 1),
+        'quality': round(quality, 1),
+    }
+
+
+def rebuild_rollups(apps, schema_editor):
+    """
+    Remplit les agrégats depuis l'historique existant.
+
+    La reconstruction supprime aussi d'éventuels doublons sans opérateur
+    avant l'ajout de la contrainte.
+    """
+    Shift = apps.get_model('production', 'Shift')
+    Roll = apps.get_model('production', 'Roll')
+    RollDefect = apps.get_model('quality', 'RollDefect')
+    LostTimeEntry = apps.get_model('wcm', 'LostTimeEntry')
+    DailyProductionRollup = apps.get_model('management', 'DailyProductionRollup')
+
+    key_fields = ['date', 'vacation', 'operator_id']
+    rollups = {}
+
+    # Production et TRS pré-calculé, pondéré par la longueur
+    with_trs = Q(total_length__gt=0, trs__isnull=False)
+    shift_rows = Shift.objects.values(*key_fields).annotate(
+        count=Count('id'),
+        length_sum=Sum('total_length'),
+        ok_length_sum=Sum('ok_length'),
+        nok_length_sum=Sum('nok_length'),
+        kpi_length_sum=Sum('total_length', filter=with_trs),
+        **{
+            f'{key}_sum': Sum(
+                F(f'trs__{key}_percentage') * F('total_length'),
+                filter=with_trs,
+                output_field=FloatField()
+            )
+            for key in KPI_KEYS
+        }
+    ).order_by()
+    for row in shift_rows:
+        values = {
+            'shifts_count': row['count'],
+            'total_length': row['length_sum'] or 0,
+            'ok_length': row['ok_length_sum'] or 0,
+            'nok_length': row['nok_length_sum'] or 0,
+            'kpi_length': row['kpi_length_sum'] or 0,
+            'rolls_count': 0,
+            'lost_time': 0,
+        }
+        for key in KPI_KEYS:
+            values[f'{key}_weighted'] = row[f'{key}_sum'] or 0
+        for field in SEVERITY_FIELDS.values():
+            values[field] = 0
+        rollups[tuple(row[field] for field in key_fields)] = values
+
+    # Anciens postes sans TRS : calcul de repli
+    legacy_shifts = list(Shift.objects.filter(trs__isnull=True, total_length__gt=0))
+    lost_by_shift = dict(
+        LostTimeEntry.objects.filter(shift__in=[shift.pk for shift in legacy_shifts]).values(
+            'shift_id'
+        ).annotate(total=Sum('duration')).values_list('shift_id', 'total').order_by()
+    )
+    for shift in legacy_shifts:
+        kpis = legacy_kpis(shift, lost_by_shift.get(shift.pk) or 0)
+        values = rollups[(shift.date, shift.vacation, shift.operator_id)]
+        values['kpi_length'] += shift.total_length
+        for key in KPI_KEYS:
+            values[f'{key}_weighted'] += kpis[key] * float(shift.total_length)
+
+    # Rouleaux, défauts et temps perdus par clé de poste
+    shift_keys = ['shift__date', 'shift__vacation', 'shift__operator_id']
+    for row in Roll.objects.filter(shift__isnull=False).values(*shift_keys).annotate(
+        count=Count('id')
+    ).order_by():
+        rollups[tuple(row[field] for field in shift_keys)]['rolls_count'] = row['count']
+
+    for row in LostTimeEntry.objects.filter(shift__isnull=False).values(*shift_keys).annotate(
+        total=Sum('duration')
+    ).order_by():
+        rollups[tuple(row[field] for field in shift_keys)]['lost_time'] = row['total'] or 0
+
+    roll_keys = ['roll__shift__date', 'roll__shift__vacation', 'roll__shift__operator_id']
+    for row in RollDefect.objects.filter(roll__shift__isnull=False).values(
+        *roll_keys, 'defect_type__severity'
+    ).annotate(count=Count('id')).order_by():
+        field = SEVERITY_FIELDS.get(row['defect_type__severity'])
+        if field:
+            rollups[tuple(row[key] for key in roll_keys)][field] += row['count']
+
+    DailyProductionRollup.objects.all().delete()
+    DailyProductionRollup.objects.bulk_create(
+        [
+            DailyProductionRollup(date=date, vacation=vacation, operator_id=operator_id, **values)
+            for (date, vacation, operator_id), values in rollups.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0001_initial'),
+        ('planification', '0001_initial'),
+        ('production', '0004_roll_production_date_roll_vacation_and_more'),
+        ('quality', '0002_rolldefect_production_date_and_more'),
+        ('wcm', '0002_trs'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyproductionrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('operator__isnull', True)), fields=('date', 'vacation'), name='unique_daily_rollup_without_operator'),
+        ),
+    ]
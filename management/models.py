@@ -1,3 +1,150 @@
 from django.db import models
 
-# Create your models here.
+
+class DailyProductionRollup(models.Model):
+    """
+    Agrégats de production par date, vacation et opérateur.
+
+    Recalculé après chaque écriture d'un poste, rouleau, défaut, temps perdu
+    ou TRS (management.signals) et reconstruit par la commande
+    rebuild_production_rollups. Les indicateurs TRS sont stockés
+    sous forme de numérateurs pondérés par la longueur (somme kpi * longueur)
+    et de dénominateur (kpi_length) pour pouvoir être additionnés entre lignes.
+    """
+
+    # Clé
+    date = models.DateField(
+        verbose_name="Date"
+    )
+
+    vacation = models.CharField(
+        max_length=20,
+        verbose_name="Vacation"
+    )
+
+    operator = models.ForeignKey(
+        'planification.Operator',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='daily_rollups',
+        verbose_name="Opérateur"
+    )
+
+    # Production
+    shifts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Nombre de postes"
+    )
+
+    total_length = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name="Longueur totale (m)"
+    )
+
+    ok_length = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name="Longueur conforme (m)"
+    )
+
+    nok_length = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name="Longueur non conforme (m)"
+    )
+
+    rolls_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Nombre de rouleaux"
+    )
+
+    # Défauts par criticité
+    non_blocking_defects_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Défauts non bloquants"
+    )
+
+    blocking_defects_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Défauts bloquants"
+    )
+
+    threshold_defects_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Défauts bloquants selon seuil"
+    )
+
+    # Temps perdu
+    lost_time = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Temps perdu (minutes)"
+    )
+
+    # TRS pondéré par la longueur
+    kpi_length = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name="Longueur des postes avec KPIs (m)",
+        help_text="Dénominateur des moyennes pondérées"
+    )
+
+    trs_weighted = models.FloatField(
+        default=0,
+        verbose_name="TRS pondéré"
+    )
+
+    availability_weighted = models.FloatField(
+        default=0,
+        verbose_name="Disponibilité pondérée"
+    )
+
+    performance_weighted = models.FloatField(
+        default=0,
+        verbose_name="Performance pondérée"
+    )
+
+    quality_weighted = models.FloatField(
+        default=0,
+        verbose_name="Qualité pondérée"
+    )
+
+    # Métadonnées
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Agrégat de production journalier"
+        verbose_name_plural = "Agrégats de production journaliers"
+        ordering = ['-date', 'vacation']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'vacation', 'operator'],
+                name='unique_daily_rollup_per_operator'
+            ),
+            # NULL n'est égal à rien : unicité des postes sans opérateur vérifiée à part
+            models.UniqueConstraint(
+                fields=['date', 'vacation'],
+                condition=models.Q(operator__isnull=True),
+                name='unique_daily_rollup_without_operator'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.vacation} - {self.operator or 'Sans opérateur'}"
+
+    @property
+    def defects_count(self):
+        return (
+            self.non_blocking_defects_count
+            + self.blocking_defects_count
+            + self.threshold_defects_count
+        )
@@ -0,0 +1,230 @@
+"""
+Métriques des requêtes HTTP : durée, nombre et temps des requêtes SQL par URL.
+
+Les mesures sont collectées par RequestMetricsMiddleware (désactivé par
+défaut, voir REQUEST_METRICS['ENABLED']) dans un buffer circulaire borné (un
+par processus), sauvegardé périodiquement en JSON dans
+REQUEST_METRICS['DUMP_DIR'] et agrégé par la commande request_metrics_report.
+Les sauvegardes des processus terminés sont ignorées par le rapport et
+supprimées au démarrage du processus suivant.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BUFFER_SIZE': 5000,
+    'DUMP_DIR': None,
+    'DUMP_INTERVAL': 30,  # secondes
+    'N_PLUS_ONE_THRESHOLD': 5,  # requêtes SQL identiques dans une même requête HTTP
+}
+
+
+def get_config():
+    """Configuration des métriques (settings.REQUEST_METRICS complété par les défauts)."""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'REQUEST_METRICS', {}))
+    if not config['DUMP_DIR']:
+        config['DUMP_DIR'] = Path(settings.BASE_DIR) / 'metrics'
+    return config
+
+
+_IN_LIST = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+def sql_shape(sql):
+    """Forme normalisée d'une requête SQL (valeurs et listes IN remplacées)."""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    return _IN_LIST.sub('IN (...)', shape)
+
+
+class QueryCollector:
+    """execute_wrapper qui compte les requêtes SQL, leur durée et leurs formes."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def repeated_shapes(self, threshold):
+        """Formes SQL exécutées au moins `threshold` fois (motif N+1)."""
+        return [
+            {'sql': shape[:300], 'count': count}
+            for shape, count in self.shapes.most_common(3)
+            if count >= threshold
+        ]
+
+
+class RequestMetricsStore:
+    """Buffer circulaire borné des mesures de requêtes, partagé par les threads du processus."""
+
+    def __init__(self, size=DEFAULTS['BUFFER_SIZE']):
+        self.records = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.last_dump = time.monotonic()
+
+    def resize(self, size):
+        with self.lock:
+            if self.records.maxlen != size:
+                self.records = deque(self.records, maxlen=size)
+
+    def record(self, entry):
+        with self.lock:
+            self.records.append(entry)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.records)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    @property
+    def dump_path(self):
+        return Path(get_config()['DUMP_DIR']) / f"request_metrics.{os.getpid()}.json"
+
+    def dump(self, path=None):
+        """Écrit le buffer en JSON (écriture atomique)."""
+        path = Path(path or self.dump_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+        self.last_dump = time.monotonic()
+        return path
+
+    def dump_if_due(self, interval):
+        if time.monotonic() - self.last_dump >= interval:
+            self.dump()
+
+
+# Instance unique par processus
+metrics_store = RequestMetricsStore()
+
+
+def pid_is_alive(pid):
+    """Indique si le processus `pid` existe encore sur cette machine."""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill(pid, 0) enverrait CTRL_C_EVENT sous Windows : pas de vérification
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def dump_paths(directory=None, include_dead=False):
+    """
+    Sauvegardes présentes dans le répertoire des métriques.
+
+    Args:
+        include_dead: Inclure les sauvegardes des processus terminés
+    """
+    directory = Path(directory or get_config()['DUMP_DIR'])
+    paths = []
+    for path in sorted(directory.glob('request_metrics.*.json')):
+        try:
+            pid = int(path.name.split('.')[1])
+        except ValueError:
+            continue
+        if include_dead or pid_is_alive(pid):
+            paths.append(path)
+    return paths
+
+
+def prune_dead_dumps(directory=None):
+    """Supprime les sauvegardes des processus terminés. Retourne le nombre supprimé."""
+    live = set(dump_paths(directory))
+    removed = 0
+    for path in dump_paths(directory, include_dead=True):
+        if path not in live:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def load_dumps(directory=None, include_dead=False):
+    """Charge les mesures sauvegardées par les processus serveurs en cours d'exécution."""
+    records = []
+    for path in dump_paths(directory, include_dead=include_dead):
+        try:
+            with open(path, encoding='utf-8') as f:
+                records.extend(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return records
+
+
+def percentile(values, pct):
+    """Percentile par rang le plus proche (values triées)."""
+    if not values:
+        return 0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def summarize(records):
+    """
+    Agrège les mesures par nom d'URL.
+
+    Returns:
+        list: Une ligne par URL, triée par latence p95 décroissante
+    """
+    by_url = {}
+    for record in records:
+        by_url.setdefault(record['url_name'], []).append(record)
+
+    rows = []
+    for url_name, url_records in by_url.items():
+        durations = sorted(r['duration_ms'] for r in url_records)
+        queries = sorted(r['queries'] for r in url_records)
+        n_plus_one = Counter()
+        for r in url_records:
+            for shape in r.get('repeated', []):
+                n_plus_one[shape['sql']] = max(n_plus_one[shape['sql']], shape['count'])
+
+        rows.append({
+            'url_name': url_name,
+            'requests': len(url_records),
+            'p50_ms': round(percentile(durations, 50), 1),
+            'p95_ms': round(percentile(durations, 95), 1),
+            'p99_ms': round(percentile(durations, 99), 1),
+            'avg_queries': round(sum(queries) / len(queries), 1),
+            'max_queries': queries[-1],
+            'avg_sql_ms': round(sum(r['sql_ms'] for r in url_records) / len(url_records), 1),
+            'n_plus_one_requests': sum(1 for r in url_records if r.get('repeated')),
+            'n_plus_one_shapes': [
+                {'sql': sql, 'count': count} for sql, count in n_plus_one.most_common(3)
+            ],
+        })
+
+    rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+    return rows
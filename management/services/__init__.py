@@ -2,5 +2,7 @@
 from .report_service import ReportService
 from .statistics_service import StatisticsService
 from .checklist_service import ChecklistService
+from .rollup_service import RollupService
+from .statistics_cache import StatisticsCache
 
-__all__ = ['ReportService', 'StatisticsService', 'ChecklistService']
\ No newline at end of file
+__all__ = ['ReportService', 'StatisticsService', 'ChecklistService', 'RollupService', 'StatisticsCache']
\ No newline at end of file
@@ -24,7 +24,8 @@ class ReportService:
         """
         shift = Shift.objects.select_related(
             'operator',
-            'checklist_response'
+            'checklist_response',
+            'trs'
         ).prefetch_related(
             'rolls',
             'lost_time_entries__reason',
@@ -43,10 +44,47 @@ class ReportService:
         }
     
     @staticmethod
-    def _calculate_kpis(shift):
+    def calculate_kpis_batch(shifts):
+        """
+        Calcule les KPIs d'un ensemble de shifts en un nombre fixe de requêtes.
+        
+        Le TRS pré-calculé est chargé par jointure (select_related) et les
+        temps perdus des anciens shifts sans TRS par une seule requête groupée.
+        
+        Args:
+            shifts: QuerySet de shifts
+            
+        Returns:
+            list: Couples (shift, kpis) dans l'ordre du QuerySet
+        """
+        shifts = list(shifts.select_related('trs'))
+        
+        legacy_ids = [shift.id for shift in shifts if not hasattr(shift, 'trs')]
+        lost_by_shift = {}
+        if legacy_ids:
+            lost_by_shift = dict(
+                LostTimeEntry.objects.filter(
+                    shift_id__in=legacy_ids
+                ).values('shift_id').annotate(
+                    total=Sum('duration')
+                ).values_list('shift_id', 'total').order_by()
+            )
+        
+        return [
+            (shift, ReportService._calculate_kpis(shift, lost_time_total=lost_by_shift.get(shift.id, 0)))
+            for shift in shifts
+        ]
+    
+    @staticmethod
+    def _calculate_kpis(shift, lost_time_total=None):
         """
         Calcule les KPIs principaux du shift.
         
+        Args:
+            shift: Le poste
+            lost_time_total: Temps perdu total en minutes, si déjà agrégé
+                (évite une requête par poste pour les anciens shifts)
+        
         Returns:
             dict: TRS, disponibilité, performance, qualité
         """
@@ -76,9 +114,10 @@ class ReportService:
             opening_time = 480  # 8h par défaut
         
         # Temps disponible
-        lost_time_total = shift.lost_time_entries.aggregate(
-            total=Sum('duration')
-        )['total'] or 0
+        if lost_time_total is None:
+            lost_time_total = shift.lost_time_entries.aggregate(
+                total=Sum('duration')
+            )['total'] or 0
         available_time = opening_time - lost_time_total
         
         # Disponibilité
@@ -234,8 +273,7 @@ class ReportService:
         ).order_by('-date', '-created_at')[:limit]
         
         shifts_data = []
-        for shift in shifts:
-            kpis = ReportService._calculate_kpis(shift)
+        for shift, kpis in ReportService.calculate_kpis_batch(shifts):
             shifts_data.append({
                 'id': shift.id,
                 'shift_id': shift.shift_id,
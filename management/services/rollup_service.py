@@ -0,0 +1,229 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F, FloatField
+
+from production.models import Shift, Roll
+from quality.models import RollDefect
+from wcm.models import LostTimeEntry
+
+from ..models import DailyProductionRollup
+from .statistics_cache import StatisticsCache
+
+
+# Indicateurs pondérés par la longueur produite (TRS et ses composantes)
+KPI_KEYS = ['trs', 'availability', 'performance', 'quality']
+
+# Champ de l'agrégat pour chaque criticité de défaut
+SEVERITY_FIELDS = {
+    'non_blocking': 'non_blocking_defects_count',
+    'blocking': 'blocking_defects_count',
+    'threshold': 'threshold_defects_count',
+}
+
+# Recalculs programmés après le commit, par clé (date, vacation, opérateur)
+_scheduled = threading.local()
+
+
+class RollupService:
+    """Service de maintenance des agrégats journaliers de production."""
+
+    @staticmethod
+    def update_for_shift(shift):
+        """
+        Met à jour l'agrégat (date, vacation, opérateur) du poste.
+
+        Seule la ligne concernée est recalculée, à partir des postes de la
+        même clé : l'opération reste idempotente si le poste est re-clôturé.
+        """
+        RollupService.refresh(shift.date, shift.vacation, shift.operator_id)
+
+    @staticmethod
+    def schedule_refresh(date, vacation, operator_id):
+        """
+        Recalcule l'agrégat (date, vacation, opérateur) après le commit.
+
+        Une clé n'est recalculée qu'une fois par transaction, quel que soit le
+        nombre d'écritures qui la touchent ; si la transaction est annulée,
+        le recalcul l'est aussi et sera reprogrammé à la prochaine écriture.
+        """
+        key = (date, vacation, operator_id)
+        callbacks = _scheduled.__dict__.setdefault('callbacks', {})
+        callback = callbacks.get(key)
+        connection = transaction.get_connection()
+        if callback is not None and any(entry[1] is callback for entry in connection.run_on_commit):
+            return
+
+        def callback():
+            callbacks.pop(key, None)
+            RollupService.refresh(*key)
+            # Les statistiques ont pu être mises en cache avant ce recalcul
+            StatisticsCache.bump_version()
+
+        callbacks[key] = callback
+        # robust : un échec du recalcul est journalisé sans faire échouer la requête
+        transaction.on_commit(callback, robust=True)
+
+    @staticmethod
+    @transaction.atomic
+    def refresh(date, vacation, operator_id):
+        """Recalcule un seul agrégat (date, vacation, opérateur)."""
+        shifts = Shift.objects.filter(date=date, vacation=vacation, operator_id=operator_id)
+        values = RollupService.compute(shifts).get((date, vacation, operator_id))
+
+        rollups = DailyProductionRollup.objects.filter(
+            date=date, vacation=vacation, operator_id=operator_id
+        )
+        if values is None:
+            rollups.delete()
+            return None
+
+        rollup = rollups.first()
+        if rollup is None:
+            return DailyProductionRollup.objects.create(
+                date=date, vacation=vacation, operator_id=operator_id, **values
+            )
+
+        for field, value in values.items():
+            setattr(rollup, field, value)
+        rollup.save()
+        return rollup
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(start_date=None, end_date=None, batch_size=500):
+        """
+        Reconstruit les agrégats d'une période (tout l'historique par défaut).
+
+        Returns:
+            int: Nombre d'agrégats créés
+        """
+        shifts = Shift.objects.all()
+        rollups = DailyProductionRollup.objects.all()
+        if start_date:
+            shifts = shifts.filter(date__gte=start_date)
+            rollups = rollups.filter(date__gte=start_date)
+        if end_date:
+            shifts = shifts.filter(date__lte=end_date)
+            rollups = rollups.filter(date__lte=end_date)
+
+        rollups.delete()
+        objects = [
+            DailyProductionRollup(date=date, vacation=vacation, operator_id=operator_id, **values)
+            for (date, vacation, operator_id), values in RollupService.compute(shifts).items()
+        ]
+        DailyProductionRollup.objects.bulk_create(objects, batch_size=batch_size)
+        return len(objects)
+
+    @staticmethod
+    def compute(shifts):
+        """
+        Calcule les agrégats des postes donnés, groupés par (date, vacation, opérateur).
+
+        Le nombre de requêtes est fixe, quel que soit le nombre de postes.
+
+        Args:
+            shifts: QuerySet de postes
+
+        Returns:
+            dict: {(date, vacation, operator_id): valeurs des champs de l'agrégat}
+        """
+        from .report_service import ReportService
+
+        key_fields = ['date', 'vacation', 'operator_id']
+        rollups = {}
+
+        # 1. Production et TRS pré-calculé, pondéré directement en SQL
+        with_trs = Q(total_length__gt=0, trs__isnull=False)
+        shift_rows = shifts.values(*key_fields).annotate(
+            count=Count('id'),
+            length_sum=Sum('total_length'),
+            ok_length_sum=Sum('ok_length'),
+            nok_length_sum=Sum('nok_length'),
+            kpi_length_sum=Sum('total_length', filter=with_trs),
+            **{
+                f'{key}_sum': Sum(
+                    F(f'trs__{key}_percentage') * F('total_length'),
+                    filter=with_trs,
+                    output_field=FloatField()
+                )
+                for key in KPI_KEYS
+            }
+        ).order_by()
+
+        for row in shift_rows:
+            values = {
+                'shifts_count': row['count'],
+                'total_length': row['length_sum'] or 0,
+                'ok_length': row['ok_length_sum'] or 0,
+                'nok_length': row['nok_length_sum'] or 0,
+                'kpi_length': row['kpi_length_sum'] or 0,
+                'rolls_count': 0,
+                'lost_time': 0,
+            }
+            for key in KPI_KEYS:
+                values[f'{key}_weighted'] = row[f'{key}_sum'] or 0
+            for field in SEVERITY_FIELDS.values():
+                values[field] = 0
+            rollups[tuple(row[field] for field in key_fields)] = values
+
+        # 2. Anciens postes sans TRS : calcul de repli
+        legacy_shifts = shifts.filter(trs__isnull=True, total_length__gt=0)
+        for shift, kpis in ReportService.calculate_kpis_batch(legacy_shifts):
+            values = rollups[(shift.date, shift.vacation, shift.operator_id)]
+            values['kpi_length'] += shift.total_length
+            for key in KPI_KEYS:
+                values[f'{key}_weighted'] += kpis[key] * float(shift.total_length)
+
+        # 3. Rouleaux, défauts et temps perdus par clé de poste
+        shift_keys = ['shift__date', 'shift__vacation', 'shift__operator_id']
+        for row in Roll.objects.filter(shift__in=shifts).values(*shift_keys).annotate(
+            count=Count('id')
+        ).order_by():
+            rollups[tuple(row[field] for field in shift_keys)]['rolls_count'] = row['count']
+
+        for row in LostTimeEntry.objects.filter(shift__in=shifts).values(*shift_keys).annotate(
+            total=Sum('duration')
+        ).order_by():
+            rollups[tuple(row[field] for field in shift_keys)]['lost_time'] = row['total'] or 0
+
+        roll_keys = ['roll__shift__date', 'roll__shift__vacation', 'roll__shift__operator_id']
+        for row in RollDefect.objects.filter(roll__shift__in=shifts).values(
+            *roll_keys, 'defect_type__severity'
+        ).annotate(count=Count('id')).order_by():
+            field = SEVERITY_FIELDS.get(row['defect_type__severity'])
+            if field:
+                rollups[tuple(row[key] for key in roll_keys)][field] += row['count']
+
+        return rollups
+
+    @staticmethod
+    def as_groups(rollups):
+        """
+        Convertit des agrégats en dictionnaires de groupes pour StatisticsService.
+
+        Args:
+            rollups: QuerySet de DailyProductionRollup (avec select_related('operator'))
+        """
+        groups = []
+        for rollup in rollups:
+            group = {
+                'date': rollup.date,
+                'vacation': rollup.vacation,
+                'operator_id': rollup.operator_id,
+                'operator__first_name': rollup.operator.first_name if rollup.operator else None,
+                'operator__last_name': rollup.operator.last_name if rollup.operator else None,
+                'shifts_count': rollup.shifts_count,
+                'total_length': float(rollup.total_length),
+                'ok_length': float(rollup.ok_length),
+                'nok_length': float(rollup.nok_length),
+                'kpi_length': float(rollup.kpi_length),
+                'rolls_count': rollup.rolls_count,
+                'defects_count': rollup.defects_count,
+                'blocking_defects_count': rollup.blocking_defects_count,
+                'lost_time': rollup.lost_time,
+            }
+            for key in KPI_KEYS:
+                group[f'{key}_weighted'] = getattr(rollup, f'{key}_weighted')
+            groups.append(group)
+        return groups
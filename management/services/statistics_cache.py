@@ -0,0 +1,84 @@
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+
+class StatisticsCache:
+    """
+    Cache des résultats de StatisticsService, étiqueté par une version des données.
+
+    La version est changée (signals.py) à chaque écriture d'un rouleau, poste,
+    temps perdu, défaut ou TRS : les résultats calculés avec l'ancienne version
+    ne sont plus jamais relus et expirent d'eux-mêmes.
+    """
+
+    VERSION_KEY = 'management:statistics:version'
+    KEY_PREFIX = 'management:statistics'
+    TIMEOUT = 300  # secondes
+
+    @staticmethod
+    def get_version():
+        """
+        Version courante des données.
+
+        Returns:
+            dict: version (str) et modified (timestamp de la dernière écriture)
+        """
+        version = cache.get(StatisticsCache.VERSION_KEY)
+        if version is None:
+            # Cache vidé ou premier appel : nouvelle version, les anciennes entrées sont ignorées
+            version = StatisticsCache.bump_version()
+        return version
+
+    @staticmethod
+    def bump_version():
+        """Invalide tous les résultats en cache en changeant de version."""
+        now = time.time()
+        version = {
+            'version': f"{time.time_ns():x}",
+            'modified': now,
+        }
+        cache.set(StatisticsCache.VERSION_KEY, version, None)
+        return version
+
+    @staticmethod
+    def _signature(endpoint, params, version):
+        # La date du jour fait partie de la clé : les périodes glissantes changent à minuit
+        today = timezone.localdate().isoformat()
+        params_str = '&'.join(f"{key}={params[key]}" for key in sorted(params))
+        return f"{endpoint}:{params_str}:{today}:{version['version']}"
+
+    @staticmethod
+    def get_or_compute(endpoint, params, compute):
+        """
+        Retourne le résultat en cache ou le calcule.
+
+        Args:
+            endpoint: Nom de l'endpoint (fait partie de la clé)
+            params: Paramètres de la requête (dict)
+            compute: Fonction sans argument qui calcule le résultat
+        """
+        version = StatisticsCache.get_version()
+        key = f"{StatisticsCache.KEY_PREFIX}:{StatisticsCache._signature(endpoint, params, version)}"
+
+        data = cache.get(key)
+        if data is None:
+            data = compute()
+            cache.set(key, data, StatisticsCache.TIMEOUT)
+        return data
+
+    @staticmethod
+    def etag(endpoint, params):
+        """ETag du résultat, dérivé de la version des données."""
+        version = StatisticsCache.get_version()
+        signature = StatisticsCache._signature(endpoint, params, version)
+        return hashlib.md5(signature.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def last_modified():
+        """Date de la dernière écriture des données de production."""
+        version = StatisticsCache.get_version()
+        return datetime.fromtimestamp(version['modified'], tz=dt_timezone.utc)
@@ -1,137 +1,195 @@
-from django.db.models import Avg, Sum, Count, Q, F
+from collections import defaultdict
+
+from django.db.models import Count
 from django.utils import timezone
-from datetime import timedelta, date
-from decimal import Decimal
+from datetime import timedelta
 
-from production.models import Shift, Roll
+from production.models import Shift
 from quality.models import RollDefect
-from wcm.models import LostTimeEntry
-from planification.models import Operator, FabricationOrder
+
+from .rollup_service import KPI_KEYS
+
+
+# Compteurs additionnés entre groupes
+COUNT_KEYS = ['shifts_count', 'rolls_count', 'defects_count', 'blocking_defects_count', 'lost_time']
+SUMMED_KEYS = COUNT_KEYS + ['total_length', 'ok_length', 'nok_length', 'kpi_length']
 
 
 class StatisticsService:
-    """Service pour les statistiques et analyses de production."""
-    
+    """
+    Service pour les statistiques et analyses de production.
+
+    Les statistiques sont calculées à partir des agrégats journaliers
+    (DailyProductionRollup, voir _collect) : le nombre de requêtes ne dépend
+    ni de la période ni du nombre d'opérateurs.
+    """
+
     @staticmethod
     def get_dashboard_statistics():
         """
         Récupère les statistiques globales pour le dashboard management.
-        
+
         Returns:
             dict: KPIs globaux, tendances, alertes
         """
         today = timezone.now().date()
         week_start = today - timedelta(days=today.weekday())
         month_start = today.replace(day=1)
-        
+
+        # Une seule collecte couvrant toutes les sections (périodes précédentes incluses)
+        since = min(
+            today - timedelta(days=30),
+            StatisticsService._previous_period(week_start, today)[0],
+            StatisticsService._previous_period(month_start, today)[0],
+        )
+        data = StatisticsService._collect(since)
+
         return {
-            'current_kpis': StatisticsService._get_current_kpis(),
-            'daily_trends': StatisticsService._get_daily_trends(days=7),
-            'weekly_comparison': StatisticsService._get_period_comparison(week_start, today),
-            'monthly_stats': StatisticsService._get_monthly_statistics(month_start, today),
-            'operator_performance': StatisticsService._get_operator_performance(days=30),
-            'defects_analysis': StatisticsService._get_defects_analysis(days=30),
-            'alerts': StatisticsService._get_production_alerts()
+            'current_kpis': StatisticsService._get_current_kpis(data=data),
+            'daily_trends': StatisticsService._get_daily_trends(days=7, data=data),
+            'weekly_comparison': StatisticsService._get_period_comparison(week_start, today, data=data),
+            'monthly_stats': StatisticsService._get_monthly_statistics(month_start, today, data=data),
+            'operator_performance': StatisticsService._get_operator_performance(days=30, data=data),
+            'defects_analysis': StatisticsService._get_defects_analysis(days=30, data=data),
+            'alerts': StatisticsService._get_production_alerts(data=data)
+        }
+
+    @staticmethod
+    def _collect(start_date, end_date=None, with_defect_types=True):
+        """
+        Charge les agrégats nécessaires aux statistiques à partir de start_date.
+
+        Les totaux viennent de la table DailyProductionRollup (une ligne par
+        date, vacation et opérateur) ; seule la répartition par type de défaut
+        est lue sur les données brutes.
+
+        Returns:
+            dict: groupes (date, vacation, opérateur) et défauts par date et type
+        """
+        from ..models import DailyProductionRollup
+        from .rollup_service import RollupService
+
+        rollups = DailyProductionRollup.objects.filter(date__gte=start_date)
+        if end_date:
+            rollups = rollups.filter(date__lte=end_date)
+
+        data = {
+            'groups': RollupService.as_groups(
+                rollups.select_related('operator').order_by('date', 'vacation', 'operator_id')
+            ),
+            'defects': [],
         }
-    
+
+        if with_defect_types:
+            # Date du poste recopiée sur le défaut : pas de jointure rouleau / poste
+            defects = RollDefect.objects.filter(production_date__gte=start_date)
+            if end_date:
+                defects = defects.filter(production_date__lte=end_date)
+            data['defects'] = list(
+                defects.values(
+                    'production_date', 'defect_type__name', 'defect_type__severity'
+                ).annotate(count=Count('id')).order_by()
+            )
+
+        return data
+
     @staticmethod
-    def _get_current_kpis():
+    def _previous_period(start_date, end_date):
+        """Période de même durée précédant [start_date, end_date]."""
+        period_length = (end_date - start_date).days + 1
+        prev_end_date = start_date - timedelta(days=1)
+        prev_start_date = prev_end_date - timedelta(days=period_length-1)
+        return prev_start_date, prev_end_date
+
+    @staticmethod
+    def _sum_groups(groups):
+        """Additionne des groupes de postes et calcule les moyennes pondérées."""
+        totals = defaultdict(float)
+        for group in groups:
+            for key in SUMMED_KEYS:
+                totals[key] += group[key]
+            for key in KPI_KEYS:
+                totals[f'{key}_weighted'] += group[f'{key}_weighted']
+
+        for key in KPI_KEYS:
+            totals[f'avg_{key}'] = (
+                totals[f'{key}_weighted'] / totals['kpi_length'] if totals['kpi_length'] > 0 else 0
+            )
+        for key in COUNT_KEYS:
+            totals[key] = int(totals[key])
+        return totals
+
+    @staticmethod
+    def _in_range(day, start_date, end_date=None):
+        return day >= start_date and (end_date is None or day <= end_date)
+
+    @staticmethod
+    def _get_current_kpis(data=None):
         """KPIs de la journée en cours."""
         today = timezone.now().date()
-        shifts_today = Shift.objects.filter(date=today)
-        
-        # Calcul des moyennes pondérées
-        total_length = 0
-        weighted_trs = 0
-        weighted_availability = 0
-        weighted_performance = 0
-        weighted_quality = 0
-        
-        for shift in shifts_today:
-            length = float(shift.total_length or 0)
-            if length > 0:
-                from .report_service import ReportService
-                kpis = ReportService._calculate_kpis(shift)
-                
-                total_length += length
-                weighted_trs += kpis['trs'] * length
-                weighted_availability += kpis['availability'] * length
-                weighted_performance += kpis['performance'] * length
-                weighted_quality += kpis['quality'] * length
-        
-        if total_length > 0:
-            avg_trs = weighted_trs / total_length
-            avg_availability = weighted_availability / total_length
-            avg_performance = weighted_performance / total_length
-            avg_quality = weighted_quality / total_length
-        else:
-            avg_trs = avg_availability = avg_performance = avg_quality = 0
-        
+        if data is None:
+            data = StatisticsService._collect(today, today, with_defect_types=False)
+
+        totals = StatisticsService._sum_groups(
+            g for g in data['groups'] if g['date'] == today
+        )
+
         return {
             'date': today,
-            'shifts_count': shifts_today.count(),
-            'total_production': total_length,
-            'avg_trs': round(avg_trs, 1),
-            'avg_availability': round(avg_availability, 1),
-            'avg_performance': round(avg_performance, 1),
-            'avg_quality': round(avg_quality, 1)
+            'shifts_count': totals['shifts_count'],
+            'total_production': totals['total_length'],
+            'avg_trs': round(totals['avg_trs'], 1),
+            'avg_availability': round(totals['avg_availability'], 1),
+            'avg_performance': round(totals['avg_performance'], 1),
+            'avg_quality': round(totals['avg_quality'], 1)
         }
-    
+
     @staticmethod
-    def _get_daily_trends(days=7):
+    def _get_daily_trends(days=7, data=None):
         """Tendances journalières sur N jours."""
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days-1)
-        
+        if data is None:
+            data = StatisticsService._collect(start_date, end_date, with_defect_types=False)
+
+        groups_by_date = defaultdict(list)
+        for group in data['groups']:
+            groups_by_date[group['date']].append(group)
+
         trends = []
         current_date = start_date
-        
+
         while current_date <= end_date:
-            shifts = Shift.objects.filter(date=current_date)
-            
+            totals = StatisticsService._sum_groups(groups_by_date.get(current_date, []))
+
             daily_stats = {
                 'date': current_date,
-                'shifts_count': shifts.count(),
-                'total_production': float(shifts.aggregate(Sum('total_length'))['total_length__sum'] or 0),
-                'ok_production': float(shifts.aggregate(Sum('ok_length'))['ok_length__sum'] or 0),
-                'nok_production': float(shifts.aggregate(Sum('nok_length'))['nok_length__sum'] or 0),
-                'rolls_count': Roll.objects.filter(shift__date=current_date).count(),
-                'defects_count': RollDefect.objects.filter(roll__shift__date=current_date).count(),
-                'lost_time': LostTimeEntry.objects.filter(shift__date=current_date).aggregate(Sum('duration'))['duration__sum'] or 0
+                'shifts_count': totals['shifts_count'],
+                'total_production': totals['total_length'],
+                'ok_production': totals['ok_length'],
+                'nok_production': totals['nok_length'],
+                'rolls_count': totals['rolls_count'],
+                'defects_count': totals['defects_count'],
+                'lost_time': totals['lost_time'],
+                # TRS moyen pondéré par la longueur
+                'avg_trs': round(totals['avg_trs'], 1) if totals['total_length'] > 0 else 0
             }
-            
-            # Calcul du TRS moyen pondéré
-            if daily_stats['total_production'] > 0:
-                from .report_service import ReportService
-                total_length = 0
-                weighted_trs = 0
-                
-                for shift in shifts:
-                    length = float(shift.total_length or 0)
-                    if length > 0:
-                        kpis = ReportService._calculate_kpis(shift)
-                        total_length += length
-                        weighted_trs += kpis['trs'] * length
-                
-                daily_stats['avg_trs'] = round(weighted_trs / total_length, 1) if total_length > 0 else 0
-            else:
-                daily_stats['avg_trs'] = 0
-            
+
             trends.append(daily_stats)
             current_date += timedelta(days=1)
-        
+
         return trends
-    
+
     @staticmethod
-    def _get_period_comparison(start_date, end_date):
+    def _get_period_comparison(start_date, end_date, data=None):
         """Compare la période actuelle avec la période précédente."""
-        period_length = (end_date - start_date).days + 1
-        prev_end_date = start_date - timedelta(days=1)
-        prev_start_date = prev_end_date - timedelta(days=period_length-1)
-        
-        current_stats = StatisticsService._get_period_stats(start_date, end_date)
-        previous_stats = StatisticsService._get_period_stats(prev_start_date, prev_end_date)
-        
+        prev_start_date, prev_end_date = StatisticsService._previous_period(start_date, end_date)
+        if data is None:
+            data = StatisticsService._collect(prev_start_date, end_date, with_defect_types=False)
+
+        current_stats = StatisticsService._get_period_stats(start_date, end_date, data=data)
+        previous_stats = StatisticsService._get_period_stats(prev_start_date, prev_end_date, data=data)
+
         # Calcul des variations
         comparison = {
             'current_period': {
@@ -146,7 +204,7 @@ class StatisticsService:
             },
             'variations': {}
         }
-        
+
         # Calcul des variations en pourcentage
         for key in ['total_production', 'avg_trs', 'quality_rate', 'defects_rate']:
             if key in current_stats and key in previous_stats:
@@ -155,196 +213,189 @@ class StatisticsService:
                     comparison['variations'][key] = round(variation, 1)
                 else:
                     comparison['variations'][key] = 100 if current_stats[key] > 0 else 0
-        
+
         return comparison
-    
+
     @staticmethod
-    def _get_period_stats(start_date, end_date):
+    def _get_period_stats(start_date, end_date, data=None):
         """Statistiques pour une période donnée."""
-        shifts = Shift.objects.filter(date__range=[start_date, end_date])
-        
-        total_production = float(shifts.aggregate(Sum('total_length'))['total_length__sum'] or 0)
-        ok_production = float(shifts.aggregate(Sum('ok_length'))['ok_length__sum'] or 0)
-        
+        if data is None:
+            data = StatisticsService._collect(start_date, end_date, with_defect_types=False)
+
+        in_range = StatisticsService._in_range
+        totals = StatisticsService._sum_groups(
+            g for g in data['groups'] if in_range(g['date'], start_date, end_date)
+        )
+
+        total_production = totals['total_length']
+        ok_production = totals['ok_length']
+
         stats = {
-            'shifts_count': shifts.count(),
+            'shifts_count': totals['shifts_count'],
             'total_production': total_production,
             'ok_production': ok_production,
             'quality_rate': round((ok_production / total_production * 100) if total_production > 0 else 0, 1),
-            'rolls_count': Roll.objects.filter(shift__date__range=[start_date, end_date]).count(),
-            'defects_count': RollDefect.objects.filter(roll__shift__date__range=[start_date, end_date]).count()
+            'rolls_count': totals['rolls_count'],
+            'defects_count': totals['defects_count'],
+            # TRS moyen pondéré
+            'avg_trs': round(totals['avg_trs'], 1) if total_production > 0 else 0
         }
-        
-        # Calcul du TRS moyen
-        if total_production > 0:
-            from .report_service import ReportService
-            total_length = 0
-            weighted_trs = 0
-            
-            for shift in shifts:
-                length = float(shift.total_length or 0)
-                if length > 0:
-                    kpis = ReportService._calculate_kpis(shift)
-                    total_length += length
-                    weighted_trs += kpis['trs'] * length
-            
-            stats['avg_trs'] = round(weighted_trs / total_length, 1) if total_length > 0 else 0
-        else:
-            stats['avg_trs'] = 0
-        
+
         # Taux de défauts
         stats['defects_rate'] = round(stats['defects_count'] / stats['rolls_count'] * 100, 1) if stats['rolls_count'] > 0 else 0
-        
+
         return stats
-    
+
     @staticmethod
-    def _get_monthly_statistics(start_date, end_date):
+    def _get_monthly_statistics(start_date, end_date, data=None):
         """Statistiques mensuelles détaillées."""
-        shifts = Shift.objects.filter(
-            date__range=[start_date, end_date]
-        ).select_related('operator')
-        
+        if data is None:
+            data = StatisticsService._collect(start_date, end_date, with_defect_types=False)
+
+        groups = [
+            g for g in data['groups']
+            if StatisticsService._in_range(g['date'], start_date, end_date)
+        ]
+
         # Statistiques par vacation
         vacation_stats = {}
         for vacation_choice in Shift.VACATION_CHOICES:
             vacation = vacation_choice[0]
-            vacation_shifts = shifts.filter(vacation=vacation)
-            
+            totals = StatisticsService._sum_groups(g for g in groups if g['vacation'] == vacation)
+
             vacation_stats[vacation] = {
-                'count': vacation_shifts.count(),
-                'total_production': float(vacation_shifts.aggregate(Sum('total_length'))['total_length__sum'] or 0),
+                'count': totals['shifts_count'],
+                'total_production': totals['total_length'],
                 'avg_production': 0
             }
-            
+
             if vacation_stats[vacation]['count'] > 0:
                 vacation_stats[vacation]['avg_production'] = round(
                     vacation_stats[vacation]['total_production'] / vacation_stats[vacation]['count'], 1
                 )
-        
+
         # Top 5 opérateurs
-        operator_production = shifts.values(
-            'operator__first_name',
-            'operator__last_name'
-        ).annotate(
-            total_production=Sum('total_length'),
-            shifts_count=Count('id')
-        ).order_by('-total_production')[:5]
-        
+        operator_production = {}
+        for group in groups:
+            key = (group['operator__first_name'], group['operator__last_name'])
+            entry = operator_production.setdefault(key, {
+                'operator__first_name': key[0],
+                'operator__last_name': key[1],
+                'total_production': 0,
+                'shifts_count': 0
+            })
+            entry['total_production'] += group['total_length']
+            entry['shifts_count'] += group['shifts_count']
+
+        top_operators = sorted(
+            operator_production.values(),
+            key=lambda x: x['total_production'],
+            reverse=True
+        )[:5]
+
         return {
             'period': f"{start_date} au {end_date}",
-            'total_shifts': shifts.count(),
+            'total_shifts': sum(g['shifts_count'] for g in groups),
             'vacation_statistics': vacation_stats,
-            'top_operators': list(operator_production),
-            'total_production': float(shifts.aggregate(Sum('total_length'))['total_length__sum'] or 0),
-            'total_lost_time': LostTimeEntry.objects.filter(
-                shift__date__range=[start_date, end_date]
-            ).aggregate(Sum('duration'))['duration__sum'] or 0
+            'top_operators': top_operators,
+            'total_production': sum(g['total_length'] for g in groups),
+            'total_lost_time': sum(g['lost_time'] for g in groups)
         }
-    
+
     @staticmethod
-    def _get_operator_performance(days=30):
+    def _get_operator_performance(days=30, data=None):
         """Performance des opérateurs sur N jours."""
         since_date = timezone.now().date() - timedelta(days=days)
-        
-        operators = Operator.objects.filter(
-            shifts__date__gte=since_date
-        ).distinct()
-        
+        if data is None:
+            data = StatisticsService._collect(since_date, with_defect_types=False)
+
+        groups_by_operator = defaultdict(list)
+        for group in data['groups']:
+            if group['operator_id'] is not None and group['date'] >= since_date:
+                groups_by_operator[group['operator_id']].append(group)
+
         performance_data = []
-        
-        for operator in operators:
-            operator_shifts = Shift.objects.filter(
-                operator=operator,
-                date__gte=since_date
-            )
-            
-            if operator_shifts.exists():
-                total_production = float(operator_shifts.aggregate(Sum('total_length'))['total_length__sum'] or 0)
-                ok_production = float(operator_shifts.aggregate(Sum('ok_length'))['ok_length__sum'] or 0)
-                
-                # Calcul du TRS moyen
-                from .report_service import ReportService
-                total_length = 0
-                weighted_trs = 0
-                
-                for shift in operator_shifts:
-                    length = float(shift.total_length or 0)
-                    if length > 0:
-                        kpis = ReportService._calculate_kpis(shift)
-                        total_length += length
-                        weighted_trs += kpis['trs'] * length
-                
-                avg_trs = round(weighted_trs / total_length, 1) if total_length > 0 else 0
-                
-                performance_data.append({
-                    'operator': f"{operator.first_name} {operator.last_name}",
-                    'shifts_count': operator_shifts.count(),
-                    'total_production': total_production,
-                    'avg_production_per_shift': round(total_production / operator_shifts.count(), 1),
-                    'quality_rate': round((ok_production / total_production * 100) if total_production > 0 else 0, 1),
-                    'avg_trs': avg_trs
-                })
-        
+
+        for operator_groups in groups_by_operator.values():
+            totals = StatisticsService._sum_groups(operator_groups)
+            total_production = totals['total_length']
+            ok_production = totals['ok_length']
+            first = operator_groups[0]
+
+            performance_data.append({
+                'operator': f"{first['operator__first_name']} {first['operator__last_name']}",
+                'shifts_count': totals['shifts_count'],
+                'total_production': total_production,
+                'avg_production_per_shift': round(total_production / totals['shifts_count'], 1),
+                'quality_rate': round((ok_production / total_production * 100) if total_production > 0 else 0, 1),
+                'avg_trs': round(totals['avg_trs'], 1)
+            })
+
         # Trier par TRS moyen décroissant
         performance_data.sort(key=lambda x: x['avg_trs'], reverse=True)
-        
+
         return performance_data[:10]  # Top 10
-    
+
     @staticmethod
-    def _get_defects_analysis(days=30):
+    def _get_defects_analysis(days=30, data=None):
         """Analyse des défauts sur N jours."""
-        since_date = timezone.now().date() - timedelta(days=days)
-        
-        defects = RollDefect.objects.filter(
-            roll__shift__date__gte=since_date
-        ).values(
-            'defect_type__name',
-            'defect_type__severity'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
+        today = timezone.now().date()
+        since_date = today - timedelta(days=days)
+        if data is None:
+            data = StatisticsService._collect(min(since_date, today - timedelta(days=6)))
+
+        by_type = {}
+        for row in data['defects']:
+            if row['production_date'] >= since_date:
+                key = (row['defect_type__name'], row['defect_type__severity'])
+                entry = by_type.setdefault(key, {
+                    'defect_type__name': key[0],
+                    'defect_type__severity': key[1],
+                    'count': 0
+                })
+                entry['count'] += row['count']
+
+        blocking_by_date = defaultdict(int)
+        for group in data['groups']:
+            blocking_by_date[group['date']] += group['blocking_defects_count']
+
+        defects = sorted(by_type.values(), key=lambda d: d['count'], reverse=True)
         total_defects = sum(d['count'] for d in defects)
-        
+
         # Ajouter le pourcentage
-        defects_with_percentage = []
         for defect in defects:
             defect['percentage'] = round((defect['count'] / total_defects * 100) if total_defects > 0 else 0, 1)
-            defects_with_percentage.append(defect)
-        
+
         # Tendance des défauts bloquants
         blocking_trend = []
         for i in range(7):
-            date = timezone.now().date() - timedelta(days=i)
-            blocking_count = RollDefect.objects.filter(
-                roll__shift__date=date,
-                defect_type__severity='blocking'
-            ).count()
+            date = today - timedelta(days=i)
             blocking_trend.append({
                 'date': date,
-                'count': blocking_count
+                'count': blocking_by_date.get(date, 0)
             })
         blocking_trend.reverse()
-        
+
         return {
             'total_count': total_defects,
-            'by_type': defects_with_percentage[:10],  # Top 10
+            'by_type': defects[:10],  # Top 10
             'blocking_defects_trend': blocking_trend
         }
-    
+
     @staticmethod
-    def _get_production_alerts():
+    def _get_production_alerts(data=None):
         """Génère des alertes basées sur les seuils de production."""
         alerts = []
         today = timezone.now().date()
         yesterday = today - timedelta(days=1)
-        
+        if data is None:
+            data = StatisticsService._collect(yesterday, with_defect_types=False)
+
         # Alerte TRS faible
+        from .report_service import ReportService
         recent_shifts = Shift.objects.filter(date__gte=yesterday)
-        for shift in recent_shifts:
-            from .report_service import ReportService
-            kpis = ReportService._calculate_kpis(shift)
-            
+
+        for shift, kpis in ReportService.calculate_kpis_batch(recent_shifts):
             if kpis['trs'] < 60:  # Seuil TRS à 60%
                 alerts.append({
                     'type': 'trs_low',
@@ -353,13 +404,11 @@ class StatisticsService:
                     'shift_id': shift.id,
                     'date': shift.date
                 })
-        
+
         # Alerte défauts bloquants élevés
-        blocking_defects_today = RollDefect.objects.filter(
-            roll__shift__date=today,
-            defect_type__severity='blocking'
-        ).count()
-        
+        today_totals = StatisticsService._sum_groups(g for g in data['groups'] if g['date'] == today)
+        blocking_defects_today = today_totals['blocking_defects_count']
+
         if blocking_defects_today > 10:  # Seuil à 10 défauts bloquants
             alerts.append({
                 'type': 'blocking_defects_high',
@@ -367,12 +416,10 @@ class StatisticsService:
                 'message': f"{blocking_defects_today} défauts bloquants aujourd'hui",
                 'date': today
             })
-        
+
         # Alerte temps perdu élevé
-        lost_time_today = LostTimeEntry.objects.filter(
-            shift__date=today
-        ).aggregate(Sum('duration'))['duration__sum'] or 0
-        
+        lost_time_today = today_totals['lost_time']
+
         if lost_time_today > 120:  # Seuil à 2 heures
             alerts.append({
                 'type': 'lost_time_high',
@@ -380,5 +427,5 @@ class StatisticsService:
                 'message': f"{lost_time_today} minutes de temps perdu aujourd'hui",
                 'date': today
             })
-        
-        return alerts
\ No newline at end of file
+
+        return alerts
@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from planification.models import Operator
+from production.models import Roll, Shift
+from quality.models import RollDefect
+from wcm.models import LostTimeEntry, TRS
+
+from .models import DailyProductionRollup
+from .services.rollup_service import RollupService
+from .services.statistics_cache import StatisticsCache
+
+
+@receiver([post_save, post_delete], sender=Roll)
+@receiver([post_save, post_delete], sender=Shift)
+@receiver([post_save, post_delete], sender=LostTimeEntry)
+@receiver([post_save, post_delete], sender=RollDefect)
+@receiver([post_save, post_delete], sender=TRS)
+def invalidate_statistics_cache(sender, **kwargs):
+    """
+    Invalide le cache des statistiques management à chaque écriture.
+
+    Le changement de version est fait après le commit : une requête
+    concurrente ne peut pas mettre en cache des données encore incomplètes
+    sous la nouvelle version.
+    """
+    transaction.on_commit(StatisticsCache.bump_version)
+
+
+def _shift_key(shift):
+    return (shift.date, shift.vacation, shift.operator_id)
+
+
+def _schedule_for_shifts(shifts):
+    """Programme le recalcul des agrégats d'un QuerySet de postes."""
+    for key in shifts.values_list('date', 'vacation', 'operator_id'):
+        RollupService.schedule_refresh(*key)
+
+
+@receiver(pre_save, sender=Shift)
+@receiver(pre_save, sender=Roll)
+def remember_rollup_key(sender, instance, raw=False, **kwargs):
+    """
+    Mémorise le poste d'origine avant modification : si la date, la vacation
+    ou l'opérateur d'un poste (ou le poste d'un rouleau) change, l'ancien
+    agrégat doit aussi être recalculé.
+    """
+    if raw or instance.pk is None:
+        return
+    if sender is Shift:
+        instance._previous_rollup_key = (
+            Shift.objects.filter(pk=instance.pk).values_list('date', 'vacation', 'operator_id').first()
+        )
+    else:
+        instance._previous_shift_id = (
+            Roll.objects.filter(pk=instance.pk).values_list('shift_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Shift)
+def refresh_shift_rollup(sender, instance, raw=False, **kwargs):
+    """Recalcule après le commit l'agrégat du poste créé, modifié ou supprimé."""
+    if raw:
+        return
+    RollupService.schedule_refresh(*_shift_key(instance))
+    previous = getattr(instance, '_previous_rollup_key', None)
+    if previous and previous != _shift_key(instance):
+        RollupService.schedule_refresh(*previous)
+
+
+@receiver([post_save, post_delete], sender=Roll)
+@receiver([post_save, post_delete], sender=LostTimeEntry)
+@receiver([post_save, post_delete], sender=TRS)
+def refresh_related_rollup(sender, instance, raw=False, **kwargs):
+    """
+    Recalcule l'agrégat du poste d'un rouleau, temps perdu ou TRS modifié
+    après la clôture du poste (rien à faire tant qu'il n'est pas rattaché).
+    """
+    if raw:
+        return
+    if instance.shift_id is not None:
+        if sender.shift.is_cached(instance):
+            RollupService.schedule_refresh(*_shift_key(instance.shift))
+        else:
+            _schedule_for_shifts(Shift.objects.filter(pk=instance.shift_id))
+    previous = getattr(instance, '_previous_shift_id', None)
+    if previous is not None and previous != instance.shift_id:
+        _schedule_for_shifts(Shift.objects.filter(pk=previous))
+
+
+@receiver([post_save, post_delete], sender=RollDefect)
+def refresh_defect_rollup(sender, instance, raw=False, **kwargs):
+    """Recalcule l'agrégat du poste du rouleau d'un défaut modifié après la clôture."""
+    if raw:
+        return
+    _schedule_for_shifts(Shift.objects.filter(rolls=instance.roll_id))
+
+
+@receiver(pre_delete, sender=Operator)
+def release_operator_rollups(sender, instance, **kwargs):
+    """
+    Les postes d'un opérateur supprimé passent sans opérateur : ses agrégats
+    sont supprimés puis les agrégats « sans opérateur » recalculés.
+    """
+    rollups = DailyProductionRollup.objects.filter(operator=instance)
+    keys = list(rollups.values_list('date', 'vacation'))
+    rollups.delete()
+    for date, vacation in keys:
+        RollupService.schedule_refresh(date, vacation, None)
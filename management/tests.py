@@ -1,3 +1,479 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import QualityDefectType
+from planification.models import Operator
+from production.models import Shift, Roll
+from quality.models import RollDefect, RollThickness
+from wcm.models import LostTimeEntry, TRS
+
+from management.loadtest import compare_to_baseline, run_load_test
+from management.management.commands.check_query_plans import Command as CheckQueryPlansCommand
+from management.middleware import RequestMetricsMiddleware
+from management.request_metrics import metrics_store
+from management.models import DailyProductionRollup
+from management.services import ReportService, StatisticsService, RollupService
+
+
+class ProductionDataMixin:
+    """Création de postes, TRS, rouleaux, défauts et temps perdus de test."""
+
+    def setUp(self):
+        self.defect_type = QualityDefectType.objects.create(name='Trou', severity='blocking')
+        self.roll_counter = 0
+
+    def _create_data(self, days, operators_count):
+        today = timezone.now().date()
+        operators = [
+            Operator.objects.create(first_name=f'Op{i}', last_name=f'Test{days}')
+            for i in range(operators_count)
+        ]
+
+        for day in range(days):
+            date = today - timedelta(days=day)
+            for index, operator in enumerate(operators):
+                shift = Shift.objects.create(
+                    date=date,
+                    operator=operator,
+                    vacation='Matin',
+                    total_length=Decimal('1000'),
+                    ok_length=Decimal('900'),
+                    nok_length=Decimal('100'),
+                )
+                # Un poste sur deux sans TRS pré-calculé (anciens postes)
+                if index % 2 == 0:
+                    TRS.objects.create(
+                        shift=shift,
+                        opening_time=timedelta(hours=8),
+                        availability_time=timedelta(hours=7),
+                        lost_time=timedelta(hours=1),
+                        total_length=shift.total_length,
+                        ok_length=shift.ok_length,
+                        nok_length=shift.nok_length,
+                        trs_percentage=Decimal('55.0'),
+                        availability_percentage=Decimal('87.5'),
+                        performance_percentage=Decimal('70.0'),
+                        quality_percentage=Decimal('90.0'),
+                        theoretical_production=Decimal('1500'),
+                        profile_name='Profil test',
+                        belt_speed_m_per_min=Decimal('3.0'),
+                    )
+                LostTimeEntry.objects.create(shift=shift, motif='Panne', duration=30)
+
+                self.roll_counter += 1
+                roll = Roll.objects.create(
+                    roll_id=f'ROLL_TEST_{self.roll_counter:05d}',
+                    shift=shift,
+                    production_date=date,
+                    vacation='Matin',
+                    length=Decimal('100'),
+                    tube_mass=Decimal('500'),
+                    total_mass=Decimal('2500'),
+                )
+                RollDefect.objects.create(
+                    roll=roll,
+                    defect_type=self.defect_type,
+                    meter_position=10,
+                    side_position='GC',
+                    production_date=date,
+                )
+
+        RollupService.rebuild()
+
+
+class DashboardStatisticsQueriesTest(ProductionDataMixin, TestCase):
+    """Le nombre de requêtes du dashboard ne dépend pas du volume de données."""
+
+    def _count_queries(self):
+        with self.assertNumQueries(4) as context:
+            stats = StatisticsService.get_dashboard_statistics()
+        return stats, context
+
+    def test_query_count_is_constant(self):
+        self._create_data(days=2, operators_count=2)
+        small_stats, _ = self._count_queries()
+
+        self._create_data(days=40, operators_count=6)
+        large_stats, _ = self._count_queries()
+
+        self.assertEqual(small_stats['current_kpis']['shifts_count'], 2)
+        self.assertEqual(large_stats['current_kpis']['shifts_count'], 8)
+
+    def test_statistics_values(self):
+        self._create_data(days=2, operators_count=2)
+        stats = StatisticsService.get_dashboard_statistics()
+
+        today = stats['daily_trends'][-1]
+        self.assertEqual(today['shifts_count'], 2)
+        self.assertEqual(today['total_production'], 2000)
+        self.assertEqual(today['rolls_count'], 2)
+        self.assertEqual(today['defects_count'], 2)
+        self.assertEqual(today['lost_time'], 60)
+
+        self.assertEqual(stats['defects_analysis']['total_count'], 4)
+        self.assertEqual(len(stats['operator_performance']), 2)
+        # Alertes TRS : postes avec TRS à 55% (et repli calculé pour les autres)
+        self.assertTrue(any(alert['type'] == 'trs_low' for alert in stats['alerts']))
+
+
+class DailyProductionRollupTest(TestCase):
+    """Mise à jour incrémentale des agrégats journaliers."""
+
+    def test_update_for_shift_matches_rebuild(self):
+        operator = Operator.objects.create(first_name='Jean', last_name='Dupont')
+        today = timezone.now().date()
+        shift = Shift.objects.create(
+            date=today, operator=operator, vacation='Matin',
+            total_length=Decimal('500'), ok_length=Decimal('450'), nok_length=Decimal('50'),
+        )
+        LostTimeEntry.objects.create(shift=shift, motif='Panne', duration=20)
+        RollupService.update_for_shift(shift)
+
+        second = Shift.objects.create(
+            date=today, operator=operator, vacation='Matin', shift_id='second',
+            total_length=Decimal('300'), ok_length=Decimal('300'), nok_length=Decimal('0'),
+        )
+        RollupService.update_for_shift(second)
+
+        rollup = DailyProductionRollup.objects.get()
+        self.assertEqual(rollup.shifts_count, 2)
+        self.assertEqual(rollup.total_length, Decimal('800'))
+        self.assertEqual(rollup.lost_time, 20)
+
+        incremental = DailyProductionRollup.objects.values().get()
+        RollupService.rebuild()
+        rebuilt = DailyProductionRollup.objects.values().get()
+        for field in ['shifts_count', 'total_length', 'ok_length', 'lost_time', 'kpi_length', 'trs_weighted']:
+            self.assertEqual(incremental[field], rebuilt[field])
+
+
+class RollupSignalsTest(TestCase):
+    """Agrégats recalculés après chaque écriture, y compris après la clôture du poste."""
+
+    def setUp(self):
+        self.operator = Operator.objects.create(first_name='Jean', last_name='Dupont')
+        self.today = timezone.now().date()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shift = Shift.objects.create(
+                date=self.today, operator=self.operator, vacation='Matin',
+                total_length=Decimal('500'), ok_length=Decimal('450'), nok_length=Decimal('50'),
+            )
+            self.roll = Roll.objects.create(
+                roll_id='R1', shift=self.shift, length=Decimal('100'),
+                tube_mass=Decimal('500'), total_mass=Decimal('2500'),
+            )
+
+    def rollup(self, **key):
+        key = {'date': self.today, 'vacation': 'Matin', 'operator': self.operator, **key}
+        return DailyProductionRollup.objects.filter(**key).first()
+
+    def test_writes_after_close_refresh_rollup(self):
+        self.assertEqual((self.rollup().shifts_count, self.rollup().rolls_count), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LostTimeEntry.objects.create(shift=self.shift, motif='Panne', duration=25)
+        self.assertEqual(self.rollup().lost_time, 25)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RollDefect.objects.create(
+                roll=self.roll, defect_type=QualityDefectType.objects.create(name='Trou', severity='blocking'),
+                meter_position=10, side_position='GC',
+            )
+        self.assertEqual(self.rollup().blocking_defects_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.roll.delete()
+        self.assertEqual((self.rollup().rolls_count, self.rollup().blocking_defects_count), (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shift.total_length = Decimal('800')
+            self.shift.save()
+        self.assertEqual(self.rollup().total_length, Decimal('800'))
+
+    def test_changed_key_and_deletion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shift.vacation = 'Nuit'
+            self.shift.save()
+        self.assertIsNone(self.rollup())
+        self.assertEqual(self.rollup(vacation='Nuit').shifts_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shift.delete()
+        self.assertFalse(DailyProductionRollup.objects.exists())
+
+    def test_refresh_scheduled_once_per_key(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for duration in (5, 10, 15):
+                LostTimeEntry.objects.create(shift=self.shift, motif='Panne', duration=duration)
+            self.shift.save()
+
+        # Invalidation du cache à chaque écriture, un seul recalcul de l'agrégat
+        self.assertEqual(len(callbacks), 4 + 1)
+
+    def test_operator_deletion_merges_into_rollup_without_operator(self):
+        other = Operator.objects.create(first_name='Paul', last_name='Martin')
+        with self.captureOnCommitCallbacks(execute=True):
+            Shift.objects.create(date=self.today, operator=other, vacation='Matin', total_length=Decimal('300'))
+            Shift.objects.create(date=self.today, operator=None, vacation='Matin', total_length=Decimal('200'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+
+        rollup = self.rollup(operator=None)
+        self.assertEqual((rollup.shifts_count, rollup.total_length), (2, Decimal('500')))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyProductionRollup.objects.create(date=self.today, vacation='Matin', operator=None)
+
+
+class ReportServiceBatchKpisTest(ProductionDataMixin, TestCase):
+    """KPIs de plusieurs postes calculés en un nombre fixe de requêtes."""
+
+    def test_batch_kpis_query_count(self):
+        self._create_data(days=5, operators_count=4)
+
+        # Postes avec TRS (jointure) + anciens postes (temps perdus groupés)
+        with self.assertNumQueries(2):
+            results = ReportService.calculate_kpis_batch(Shift.objects.all())
+
+        self.assertEqual(len(results), 20)
+        for shift, kpis in results:
+            self.assertEqual(kpis, ReportService._calculate_kpis(Shift.objects.get(pk=shift.pk)))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DashboardStatisticsCacheTest(ProductionDataMixin, TestCase):
+    """Réponses conditionnelles et invalidation du cache des statistiques."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_not_modified_until_data_changes(self):
+        self._create_data(days=1, operators_count=1)
+        url = reverse('management:api-dashboard-stats')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Une écriture sur un rouleau change la version après le commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Roll.objects.filter(shift__isnull=False).first().save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LoadTestHarnessTest(TransactionTestCase):
+    """Scénario de charge (un poste de travail) et comparaison à une référence."""
+
+    def test_shift_scenario_runs_without_errors(self):
+        result = run_load_test(stations=1, shifts=1, rolls=2, thicknesses=6, defects=1, lost_times=1)
+
+        endpoints = {row['url_name']: row for row in result['endpoints']}
+        self.assertEqual(endpoints['production:roll-list']['requests'], 2)
+        self.assertTrue(all(row['errors'] == 0 for row in result['endpoints']))
+
+        shift = Shift.objects.get()
+        self.assertEqual(shift.rolls.count(), 2)
+        self.assertEqual(shift.lost_time_entries.count(), 1)
+
+    def test_regressions_against_baseline(self):
+        row = {'url_name': 'production:roll-list', 'p95_ms': 40.0, 'avg_queries': 12.0, 'errors': 0}
+        baseline = {'throughput_rps': 50.0, 'endpoints': [row]}
+
+        self.assertEqual(compare_to_baseline(baseline, baseline), [])
+
+        slower = {'throughput_rps': 30.0, 'endpoints': [{**row, 'p95_ms': 80.0, 'avg_queries': 14.0}]}
+        self.assertEqual(len(compare_to_baseline(slower, baseline)), 3)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SyntheticHistoryTest(TestCase):
+    """Génération d'un historique synthétique reproductible."""
+
+    def setUp(self):
+        cache.clear()
+        call_command('load_initial_data', stdout=StringIO())
+
+    def generate(self, *args):
+        call_command(
+            'generate_synthetic_history', '--years', '0.02', '--end', '2025-06-08',
+            '--rolls-per-shift', '4', '--thicknesses', '6', *args, stdout=StringIO()
+        )
+        return (
+            Shift.objects.count(),
+            Roll.objects.aggregate(total=Sum('length'))['total'],
+            RollThickness.objects.aggregate(total=Sum('thickness_value'))['total'],
+        )
+
+    def test_history_is_consistent_and_reproducible(self):
+        first = self.generate()
+
+        # Du lundi 2 au dimanche 8 juin : 5 jours en 3x8 (semaine 23 impaire, samedi non travaillé)
+        self.assertEqual(first[0], 15)
+        self.assertEqual(TRS.objects.count(), 15)
+        self.assertFalse(Roll.objects.filter(shift__isnull=True).exists())
+        self.assertEqual(RollThickness.objects.count(), Roll.objects.count() * 6)
+        self.assertEqual(Roll.objects.earliest('created_at').created_at.date(), date(2025, 6, 2))
+        self.assertTrue(DailyProductionRollup.objects.filter(date=date(2025, 6, 2)).exists())
+
+        self.assertEqual(self.generate('--clear'), first)
+
+
+class QueryPlanCheckTest(TestCase):
+    """Les requêtes de statistiques et de rapports utilisent un index."""
+
+    def setUp(self):
+        cache.clear()
+        call_command('load_initial_data', stdout=StringIO())
+        call_command(
+            'generate_synthetic_history', '--years', '0.1', '--end', '2025-06-08',
+            '--rolls-per-shift', '4', '--thicknesses', '6', stdout=StringIO()
+        )
+
+    def test_no_full_scan_on_large_tables(self):
+        out = StringIO()
+        call_command('check_query_plans', '--min-rows', '100', '--analyze', stdout=out)
+
+        self.assertIn('production_roll', out.getvalue())
+        self.assertNotIn('SCAN ', out.getvalue())
+
+    def test_index_scans_are_full_scans(self):
+        command = CheckQueryPlansCommand()
+        plan = [
+            'SCAN production_roll',
+            'SCAN quality_rolldefect USING INDEX quality_rolldefect_roll_id_26bdcaee',
+            'SCAN production_shift USING COVERING INDEX production__date_01510c_idx',
+            'SEARCH wcm_trs USING INDEX wcm_trs_shift_i_dcddbc_idx (shift_id=?)',
+            'SCAN CONSTANT ROW',
+            'SCAN (subquery-1)',
+            'USE TEMP B-TREE FOR ORDER BY',
+        ]
+
+        self.assertEqual(
+            command._full_scans(plan), {'production_roll', 'quality_rolldefect', 'production_shift'}
+        )
+
+
+class RequestMetricsTest(TestCase):
+    """Mesures du middleware RequestMetricsMiddleware et rapport agrégé."""
+
+    def setUp(self):
+        self.dump_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dump_dir, ignore_errors=True)
+        self.config = {'ENABLED': True, 'DUMP_DIR': self.dump_dir, 'DUMP_INTERVAL': 3600}
+        metrics_store.clear()
+        self.addCleanup(metrics_store.clear)
+
+    def test_disabled_by_default(self):
+        self.client.get(reverse('production:roll-list'))
+
+        self.assertEqual(metrics_store.snapshot(), [])
+
+    def test_request_recorded_with_query_count(self):
+        Roll.objects.create(
+            roll_id='R1', shift_id_str='S1', length=Decimal('100'), status='CONFORME',
+            tube_mass=Decimal('500'), total_mass=Decimal('2500'),
+        )
+
+        with override_settings(REQUEST_METRICS=self.config):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('production:roll-list'))
+
+        [record] = metrics_store.snapshot()
+        self.assertEqual(record['url_name'], 'production:roll-list')
+        self.assertEqual(record['status'], response.status_code)
+        self.assertEqual(record['queries'], len(queries))
+        self.assertGreater(record['queries'], 0)
+
+    def test_streaming_queries_attributed(self):
+        def content():
+            for roll_id in ['R1', 'R2', 'R3']:
+                yield str(Roll.objects.filter(roll_id=roll_id).exists())
+
+        with override_settings(REQUEST_METRICS=self.config):
+            middleware = RequestMetricsMiddleware(lambda request: StreamingHttpResponse(content()))
+        response = middleware(RequestFactory().get('/export/'))
+
+        self.assertEqual(metrics_store.snapshot(), [])
+        b''.join(response.streaming_content)
+
+        [record] = metrics_store.snapshot()
+        self.assertEqual(record['queries'], 3)
+
+    def write_dump(self, pid, records):
+        path = os.path.join(self.dump_dir, f'request_metrics.{pid}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+        return path
+
+    def report(self, *args):
+        output = os.path.join(tempfile.mkdtemp(dir=self.dump_dir), 'report.json')
+        call_command(
+            'request_metrics_report', '--dir', self.dump_dir, '--format', 'json',
+            '--output', output, *args, stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as f:
+            return {row['url_name']: row for row in json.load(f)}
+
+    def test_report_aggregates_live_dumps(self):
+        def record(url_name, duration_ms, queries, repeated=()):
+            return {
+                'url_name': url_name, 'method': 'GET', 'status': 200, 'duration_ms': duration_ms,
+                'queries': queries, 'sql_ms': 2.0, 'repeated': list(repeated), 'timestamp': '',
+            }
+
+        repeated = [{'sql': 'SELECT ... WHERE id = ?', 'count': 6}]
+        self.write_dump(os.getpid(), [
+            record('production:roll-list', 10.0, 4),
+            record('production:roll-list', 30.0, 8, repeated),
+            record('management:api-alerts', 5.0, 1),
+        ])
+        self.write_dump(os.getpid() + 1, [record('production:roll-list', 20.0, 6)])
+        dead_dump = self.write_dump(99999999, [record('production:roll-list', 900.0, 50)])
+
+        with mock.patch('management.request_metrics.pid_is_alive', lambda pid: pid != 99999999):
+            rows = self.report()
+
+            self.assertEqual(rows['production:roll-list']['requests'], 3)
+            self.assertEqual(rows['production:roll-list']['p50_ms'], 20.0)
+            self.assertEqual(rows['production:roll-list']['p95_ms'], 30.0)
+            self.assertEqual(rows['production:roll-list']['avg_queries'], 6.0)
+            self.assertEqual(rows['production:roll-list']['max_queries'], 8)
+            self.assertEqual(rows['production:roll-list']['n_plus_one_requests'], 1)
+            self.assertEqual(rows['production:roll-list']['n_plus_one_shapes'], repeated)
+            self.assertEqual(rows['management:api-alerts']['requests'], 1)
+
+            rows = self.report('--include-dead')
+            self.assertEqual(rows['production:roll-list']['requests'], 4)
+
+            # Au démarrage d'un processus, les sauvegardes des processus terminés sont supprimées
+            with override_settings(REQUEST_METRICS=self.config):
+                RequestMetricsMiddleware(lambda request: None)
+            self.assertFalse(os.path.exists(dead_dump))
+            self.assertEqual(len(list(Path(self.dump_dir).glob('*.json'))), 2)
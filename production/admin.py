@@ -122,7 +122,7 @@ class RollAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Traçabilité', {
-            'fields': ('shift_id_str', 'session_key'),
+            'fields': ('shift_id_str', 'session_key', 'production_date', 'vacation'),
             'classes': ('collapse',)
         }),
         ('Commentaire', {
@@ -131,7 +131,7 @@ class RollAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ['roll_id', 'net_mass', 'grammage_calc']
+    readonly_fields = ['roll_id', 'net_mass', 'grammage_calc', 'production_date', 'vacation']
     
     inlines = [RollThicknessInline, RollDefectInline]
     
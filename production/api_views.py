@@ -6,6 +6,7 @@ from django.db import transaction
 from .models import Roll, Shift
 from .serializers import RollSerializer, ShiftSerializer
 from .services import roll_service, shift_service
+from livesession.store import LiveShiftStore
 
 
 class RollViewSet(viewsets.ModelViewSet):
@@ -40,9 +41,10 @@ class RollViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'], url_path='next-number')
     def next_number(self, request):
         """
-        Récupère le prochain numéro de rouleau disponible pour un OF donné.
+        Réserve le prochain numéro de rouleau disponible pour un OF donné.
         
-        Trouve le premier numéro manquant dans la séquence.
+        Trouve le premier numéro manquant dans la séquence, hors numéros
+        réservés par d'autres postes, et le réserve pour cette session.
         """
         of_number = request.query_params.get('of')
         
@@ -52,29 +54,18 @@ class RollViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Récupérer tous les numéros de rouleaux existants pour cet OF
-        existing_numbers = Roll.objects.filter(
-            roll_id__startswith=f"{of_number}_"
-        ).exclude(
-            roll_number__isnull=True
-        ).values_list('roll_number', flat=True).order_by('roll_number')
-        
-        # Convertir en liste d'entiers
-        existing_numbers = [int(num) for num in existing_numbers if num is not None]
-        
-        # Trouver le premier numéro manquant
-        next_number = 1
-        for num in existing_numbers:
-            if num == next_number:
-                next_number += 1
-            elif num > next_number:
-                # On a trouvé un trou dans la séquence
-                break
+        # Une session est nécessaire pour rattacher la réservation au poste
+        if not request.session.session_key:
+            request.session.save()
+        
+        next_number = roll_service.reserve_next_roll_number(
+            of_number,
+            session_key=request.session.session_key
+        )
         
         return Response({
             'of_number': of_number,
-            'next_number': next_number,
-            'existing_numbers': existing_numbers
+            'next_number': next_number
         })
     
     def create(self, request):
@@ -88,9 +79,11 @@ class RollViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         # Préparer les données de session
+        state = LiveShiftStore.for_request(request)
         session_data = {
-            'shift_id': serializer.validated_data.get('shift_id_str') or request.session.get('shift_id'),
+            'shift_id': serializer.validated_data.get('shift_id_str') or state.get('shift_id'),
             'session_key': request.session.session_key,
+            'profile_id': state.get('profile_id'),
         }
         
         # Vérifier qu'on a bien un shift_id
@@ -209,13 +202,14 @@ class ShiftViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         # Récupérer toutes les données de session nécessaires
+        state = LiveShiftStore.for_request(request)
         session_data = {
             'session_key': request.session.session_key,
-            'checklist_responses': request.session.get('checklist_responses', {}),
-            'checklist_signature': request.session.get('checklist_signature'),
-            'checklist_signature_time': request.session.get('checklist_signature_time'),
-            'quality_control': request.session.get('quality_control', {}),
-            'lost_time_entries': request.session.get('lost_time_entries', []),
+            'checklist_responses': state.get('checklist_responses', {}),
+            'checklist_signature': state.get('checklist_signature'),
+            'checklist_signature_time': state.get('checklist_signature_time'),
+            'quality_control': state.get('quality_control', {}),
+            'lost_time_entries': state.get('lost_time_entries', []),
         }
         
         # Ajouter les données de signature de checklist si présentes
@@ -307,11 +301,10 @@ class ShiftViewSet(viewsets.ModelViewSet):
             'comment': ''
         }
         
-        # Sauvegarder en session
-        for key, value in next_shift_data.items():
-            request.session[key] = value
-        
-        request.session.save()
+        # Sauvegarder dans l'état du poste
+        state = LiveShiftStore.for_request(request)
+        state.update(next_shift_data)
+        state.save()
         
         # Retourner les données pour la réponse
         return next_shift_data
@@ -347,10 +340,11 @@ class ShiftViewSet(viewsets.ModelViewSet):
             'wound_length_total'
         ]
         
+        state = LiveShiftStore.for_request(request)
         for key in keys_to_remove:
-            request.session.pop(key, None)
+            state.pop(key, None)
         
-        request.session.save()
+        state.save()
     
     @action(detail=False, methods=['get'])
     def check_id(self, request):
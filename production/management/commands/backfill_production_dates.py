@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from production.models import Shift
+from production.services import shift_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Recopie la date et la vacation des postes sur leurs rouleaux et leurs défauts "
+        "(champs production_date et vacation utilisés par les statistiques) ; "
+        "à relancer après la correction de la date ou de la vacation d'un poste"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='start_date',
+            help='Postes à partir de cette date (AAAA-MM-JJ)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='end_date',
+            help="Postes jusqu'à cette date incluse (AAAA-MM-JJ)",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre de postes traités par transaction',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size doit être >= 1')
+
+        shifts = Shift.objects.all()
+        start_date = self._parse_date(options['start_date'])
+        end_date = self._parse_date(options['end_date'])
+        if start_date:
+            shifts = shifts.filter(date__gte=start_date)
+        if end_date:
+            shifts = shifts.filter(date__lte=end_date)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Recopie des dates de production'))
+
+        shift_ids = list(shifts.order_by('date', 'pk').values_list('pk', flat=True))
+        totals = {'rolls': 0, 'defects': 0}
+        for offset in range(0, len(shift_ids), options['batch_size']):
+            batch = shift_ids[offset:offset + options['batch_size']]
+            with transaction.atomic():
+                counts = shift_service.propagate_production_dates(batch)
+            for key in totals:
+                totals[key] += counts[key]
+            self.stdout.write(f"  {offset + len(batch)}/{len(shift_ids)} postes traités")
+
+        if totals['rolls'] or totals['defects']:
+            # update() n'émet pas de signal : invalider le cache des statistiques
+            from management.services.statistics_cache import StatisticsCache
+            StatisticsCache.bump_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['rolls']} rouleau(x) et {totals['defects']} défaut(s) mis à jour"
+        ))
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Date invalide: {value} (format attendu AAAA-MM-JJ)")
@@ -0,0 +1,136 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from catalog.models import QualityDefectType
+from planification.models import FabricationOrder
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la latence p50/p99 de POST /api/rolls/ selon le nombre de "
+        "mesures d'épaisseur (les données créées sont annulées à la fin)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--measurements',
+            type=str,
+            default='6,30,60',
+            help="Nombres de mesures d'épaisseur à tester (séparés par des virgules)",
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Nombre de rouleaux créés par palier',
+        )
+        parser.add_argument(
+            '--defects',
+            type=int,
+            default=2,
+            help='Nombre de défauts par rouleau',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            measurement_counts = [int(n) for n in options['measurements'].split(',') if n.strip()]
+        except ValueError:
+            raise CommandError('--measurements doit être une liste d\'entiers')
+        
+        iterations = options['iterations']
+        if iterations < 1:
+            raise CommandError('--iterations doit être >= 1')
+        
+        self.stdout.write(self.style.MIGRATE_HEADING('Benchmark POST /api/rolls/'))
+        self.stdout.write(f"{'Mesures':>8} {'p50 (ms)':>10} {'p99 (ms)':>10} {'max (ms)':>10} {'Requêtes SQL':>13}")
+        
+        # Tout est fait dans une transaction annulée : la base reste intacte
+        # et l'export Excel (déclenché après commit) n'est jamais lancé
+        with override_settings(ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            defect_type = QualityDefectType.objects.filter(is_active=True).first()
+            if defect_type is None:
+                defect_type = QualityDefectType.objects.create(
+                    name='Benchmark', severity='non_blocking'
+                )
+            
+            client = Client()
+            
+            for count in measurement_counts:
+                fabrication_order = FabricationOrder.objects.create(
+                    order_number=f'BENCH{count}'
+                )
+                timings, queries = self._run_series(
+                    client, fabrication_order, defect_type, count, iterations, options['defects']
+                )
+                self.stdout.write(
+                    f"{count:>8} "
+                    f"{self._percentile(timings, 50):>10.1f} "
+                    f"{self._percentile(timings, 99):>10.1f} "
+                    f"{max(timings):>10.1f} "
+                    f"{sum(queries) / len(queries):>13.1f}"
+                )
+            
+            transaction.set_rollback(True)
+
+    def _run_series(self, client, fabrication_order, defect_type, count, iterations, defects_count):
+        """Crée `iterations` rouleaux avec `count` mesures et retourne les temps (ms)."""
+        points = ['GG', 'GC', 'GD', 'DG', 'DC', 'DD']
+        timings = []
+        queries = []
+        
+        for i in range(1, iterations + 1):
+            payload = {
+                'roll_id': f'{fabrication_order.order_number}_{i:03d}',
+                'shift_id_str': 'BENCH_Shift',
+                'fabrication_order': fabrication_order.id,
+                'roll_number': i,
+                'length': 100,
+                'tube_mass': 900,
+                'total_mass': 9000,
+                'thicknesses': [
+                    {
+                        'meter_position': 3 + (n // len(points)) * 5,
+                        'measurement_point': points[n % len(points)],
+                        'thickness_value': 6.5,
+                        'is_catchup': False,
+                        'is_within_tolerance': True,
+                    }
+                    for n in range(count)
+                ],
+                'defects': [
+                    {
+                        'defect_type_id': defect_type.id,
+                        'meter_position': n * 10,
+                        'side_position': points[n % len(points)],
+                        'comment': '',
+                    }
+                    for n in range(defects_count)
+                ],
+            }
+            
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.post('/api/rolls/', payload, content_type='application/json')
+                elapsed = (time.perf_counter() - start) * 1000
+            
+            if response.status_code != 201:
+                raise CommandError(
+                    f'Création du rouleau échouée ({response.status_code}): {response.content[:200]}'
+                )
+            
+            timings.append(elapsed)
+            queries.append(len(context.captured_queries))
+        
+        return timings, queries
+
+    @staticmethod
+    def _percentile(values, percentile):
+        """Percentile par rang le plus proche."""
+        ordered = sorted(values)
+        index = max(0, math.ceil(percentile / 100 * len(ordered)) - 1)
+        return ordered[index]
@@ -0,0 +1,92 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.models import ProfileTemplate
+from production.models import Roll
+from production.services import roll_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule le grammage, les tolérances d'épaisseur et le statut des rouleaux "
+        "existants d'après les spécifications actuelles de leur profil"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile',
+            help="Ne traiter que les rouleaux des postes de ce profil (par défaut : tous, chacun avec le profil historisé dans le TRS de son poste)",
+        )
+        parser.add_argument(
+            '--from',
+            dest='start_date',
+            help='Rouleaux créés à partir de cette date (AAAA-MM-JJ)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='end_date',
+            help="Rouleaux créés jusqu'à cette date incluse (AAAA-MM-JJ)",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre de rouleaux traités par lot',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher le résultat sans rien modifier',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size doit être >= 1')
+
+        rolls = Roll.objects.all()
+        start_date = self._parse_date(options['start_date'])
+        end_date = self._parse_date(options['end_date'])
+        if start_date:
+            rolls = rolls.filter(created_at__date__gte=start_date)
+        if end_date:
+            rolls = rolls.filter(created_at__date__lte=end_date)
+
+        profile_id = None
+        if options['profile']:
+            try:
+                profile_id = ProfileTemplate.objects.get(name=options['profile']).pk
+            except ProfileTemplate.DoesNotExist:
+                raise CommandError(f"Profil introuvable: {options['profile']}")
+            rolls = rolls.filter(shift__trs__profile_name=options['profile'])
+
+        title = 'Réévaluation de la conformité des rouleaux'
+        if options['dry_run']:
+            title += ' (simulation)'
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+
+        total = rolls.count()
+
+        def progress(counts):
+            self.stdout.write(f"  {counts['processed']}/{total} rouleaux traités")
+
+        counts = roll_service.reevaluate_rolls(
+            rolls,
+            profile_id=profile_id,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            progress=progress,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['updated']} rouleau(x) mis à jour dont {counts['status_changed']} "
+            f"changement(s) de statut ; {counts['skipped']} sans profil ignoré(s)"
+        ))
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Date invalide: {value} (format attendu AAAA-MM-JJ)")
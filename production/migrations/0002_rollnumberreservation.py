@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollNumberReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('of_number', models.CharField(max_length=50, verbose_name="Numéro d'OF")),
+                ('roll_number', models.PositiveIntegerField(verbose_name='N° Rouleau')),
+                ('session_key', models.CharField(blank=True, max_length=255, null=True, verbose_name='Session')),
+                ('expires_at', models.DateTimeField(verbose_name='Expire le')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Réservation de numéro de rouleau',
+                'verbose_name_plural': 'Réservations de numéros de rouleau',
+                'indexes': [models.Index(fields=['of_number', 'session_key'], name='production__of_numb_2949a4_idx'), models.Index(fields=['expires_at'], name='production__expires_423a7a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('of_number', 'roll_number'), name='unique_roll_number_reservation')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planification', '0001_initial'),
+        ('production', '0002_rollnumberreservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='roll',
+            index=models.Index(fields=['shift_id_str', '-created_at'], name='production__shift_i_9c0afa_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planification', '0001_initial'),
+        ('production', '0003_roll_shift_id_str_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roll',
+            name='production_date',
+            field=models.DateField(blank=True, help_text='Date du poste associé', null=True, verbose_name='Date de production'),
+        ),
+        migrations.AddField(
+            model_name='roll',
+            name='vacation',
+            field=models.CharField(blank=True, choices=[('Matin', 'Matin'), ('ApresMidi', 'Après-midi'), ('Nuit', 'Nuit'), ('Journee', 'Journée')], help_text='Vacation du poste associé', max_length=20, null=True, verbose_name='Vacation'),
+        ),
+        migrations.AddIndex(
+            model_name='roll',
+            index=models.Index(fields=['production_date', 'vacation'], name='production__product_ecf9fc_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_production_dates(apps, schema_editor):
+    """
+    Recopie la date et la vacation des postes existants sur leurs rouleaux et
+    leurs défauts (même calcul que ShiftService.propagate_production_dates,
+    avec les modèles historiques).
+    """
+    Shift = apps.get_model('production', 'Shift')
+    Roll = apps.get_model('production', 'Roll')
+    RollDefect = apps.get_model('quality', 'RollDefect')
+
+    shift_row = Shift.objects.filter(pk=OuterRef('shift_id'))
+    Roll.objects.filter(shift__isnull=False).exclude(
+        production_date=F('shift__date'), vacation=F('shift__vacation')
+    ).update(
+        production_date=Subquery(shift_row.values('date')[:1]),
+        vacation=Subquery(shift_row.values('vacation')[:1]),
+    )
+
+    roll_row = Roll.objects.filter(pk=OuterRef('roll_id'))
+    RollDefect.objects.filter(roll__shift__isnull=False).exclude(
+        production_date=F('roll__shift__date')
+    ).update(production_date=Subquery(roll_row.values('production_date')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('production', '0004_roll_production_date_roll_vacation_and_more'),
+        ('quality', '0002_rolldefect_production_date_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_production_dates, migrations.RunPython.noop),
+    ]
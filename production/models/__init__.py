@@ -2,5 +2,6 @@
 from .shift import Shift
 from .roll import Roll
 from .current import CurrentProfile
+from .reservation import RollNumberReservation
 
-__all__ = ['Shift', 'Roll', 'CurrentProfile']
\ No newline at end of file
+__all__ = ['Shift', 'Roll', 'CurrentProfile', 'RollNumberReservation']
\ No newline at end of file
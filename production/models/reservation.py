@@ -0,0 +1,51 @@
+from django.db import models
+
+
+class RollNumberReservation(models.Model):
+    """
+    Numéro de rouleau réservé par un poste de saisie pour un OF.
+    
+    La contrainte d'unicité (OF, numéro) garantit que deux postes ne
+    reçoivent jamais le même numéro. La réservation est libérée à la
+    création du rouleau ou à son expiration.
+    """
+    
+    of_number = models.CharField(
+        max_length=50,
+        verbose_name="Numéro d'OF"
+    )
+    
+    roll_number = models.PositiveIntegerField(
+        verbose_name="N° Rouleau"
+    )
+    
+    session_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        verbose_name="Session"
+    )
+    
+    expires_at = models.DateTimeField(
+        verbose_name="Expire le"
+    )
+    
+    # Métadonnées
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Réservation de numéro de rouleau"
+        verbose_name_plural = "Réservations de numéros de rouleau"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['of_number', 'roll_number'],
+                name='unique_roll_number_reservation'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['of_number', 'session_key']),
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.of_number}_{self.roll_number:03d} (réservé)"
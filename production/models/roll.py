@@ -75,6 +75,24 @@ class Roll(models.Model):
         help_text="Clé de session pour lier au shift en cours"
     )
     
+    # Date et vacation du poste, recopiées à la sauvegarde du poste :
+    # les statistiques par période filtrent les rouleaux sans jointure
+    production_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Date de production",
+        help_text="Date du poste associé"
+    )
+    
+    vacation = models.CharField(
+        max_length=20,
+        choices=Shift.VACATION_CHOICES,
+        null=True,
+        blank=True,
+        verbose_name="Vacation",
+        help_text="Vacation du poste associé"
+    )
+    
     fabrication_order = models.ForeignKey(
         'planification.FabricationOrder',
         on_delete=models.CASCADE,
@@ -197,6 +215,8 @@ class Roll(models.Model):
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['fabrication_order', 'roll_number']),
             models.Index(fields=['session_key', '-created_at']),
+            models.Index(fields=['shift_id_str', '-created_at']),
+            models.Index(fields=['production_date', 'vacation']),
         ]
     
     def __str__(self):
@@ -212,7 +212,12 @@ class Shift(models.Model):
         return self.shift_id
     
     def save(self, *args, **kwargs):
-        """Génère automatiquement le shift_id si non fourni."""
+        """
+        Génère automatiquement le shift_id si non fourni.
+        
+        Si la date ou la vacation d'un poste existant change, la copie faite
+        sur ses rouleaux et ses défauts (production_date, vacation) suit.
+        """
         # Générer le shift_id si non fourni
         if not self.shift_id:
             date_str = self.date.strftime('%d%m%y')
@@ -222,4 +227,13 @@ class Shift(models.Model):
                 operator_clean = "SansOperateur"
             self.shift_id = f"{date_str}_{operator_clean}_{self.vacation}"
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        update_fields = kwargs.get('update_fields')
+        previous = None
+        if self.pk and (update_fields is None or {'date', 'vacation'} & set(update_fields)):
+            previous = Shift.objects.filter(pk=self.pk).values_list('date', 'vacation').first()
+        
+        super().save(*args, **kwargs)
+        
+        if previous and previous != (self.date, self.vacation):
+            from production.services import shift_service
+            shift_service.propagate_production_dates([self.pk])
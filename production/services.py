@@ -1,16 +1,26 @@
+from collections import Counter
 from decimal import Decimal
 from datetime import timedelta
-from django.db import transaction
-from django.db.models import Avg, Q, Sum
-from .models import Roll, Shift
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Exists, F, Min, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from .models import Roll, RollNumberReservation, Shift
 from quality.models import RollThickness, RollDefect
 from catalog.models import ProfileTemplate
+from catalog.tolerances import GRAMMAGE_SPEC, THICKNESS_SPEC, ToleranceIndex
 from wcm.models import LostTimeEntry
 
 
 class RollService:
     """Service contenant toute la logique métier pour les rouleaux."""
     
+    # Durée de validité d'un numéro réservé par un poste de saisie
+    reservation_ttl = timedelta(minutes=30)
+    
+    # Cellules NOK tolérées si la spec Épaisseur n'a pas de max_nok
+    # (même règle que calculateConformity dans roll-business-logic.js)
+    default_max_nok_cells = 3
+    
     @staticmethod
     def calculate_net_mass(total_mass, tube_mass):
         """Calcule la masse nette du rouleau."""
@@ -82,6 +92,67 @@ class RollService:
         
         return True
     
+    @staticmethod
+    def evaluate_grammage(grammage, profile_id=None):
+        """
+        Vérifie le grammage calculé par rapport à la spec Masse Surfacique Globale du profil.
+        
+        Returns:
+            bool: False si hors limites min/max, True sinon ;
+                  None si pas de grammage ou pas de limites dans le profil
+        """
+        if grammage is None:
+            return None
+        tolerance = ToleranceIndex.get(profile_id, GRAMMAGE_SPEC)
+        if tolerance is None or not tolerance.has_limits:
+            return None
+        return tolerance.classify(grammage) != 'nok'
+    
+    @staticmethod
+    def evaluate_thicknesses(thicknesses, profile_id=None):
+        """
+        Classe les épaisseurs d'un rouleau selon la spec Épaisseur du profil.
+        
+        Met à jour is_within_tolerance de chaque mesure (les valeurs envoyées
+        par le client sont ignorées) à partir de l'index des tolérances en
+        mémoire : aucune requête.
+        
+        Règle de non-conformité, comme côté client et quel que soit le
+        drapeau is_blocking de la spec : plus de max_nok cellules (3 par
+        défaut) avec une épaisseur NOK, ou deux épaisseurs NOK dans une même
+        cellule.
+        
+        Returns:
+            dict: nok_count, nok_cells, has_issues, is_blocking ;
+                  None si le profil n'a pas de limites d'épaisseur
+        """
+        tolerance = ToleranceIndex.get(profile_id, THICKNESS_SPEC)
+        if tolerance is None or not tolerance.has_limits:
+            return None
+        
+        statuses = tolerance.classify_many(t.thickness_value for t in thicknesses)
+        
+        nok_cells = Counter()
+        for thickness, thickness_status in zip(thicknesses, statuses):
+            thickness.is_within_tolerance = thickness_status != 'nok'
+            if thickness_status == 'nok':
+                nok_cells[(thickness.meter_position, thickness.measurement_point)] += 1
+        
+        max_nok = tolerance.max_nok
+        if max_nok is None:
+            max_nok = RollService.default_max_nok_cells
+        is_blocking = (
+            len(nok_cells) > max_nok
+            or any(count >= 2 for count in nok_cells.values())
+        )
+        
+        return {
+            'nok_count': sum(nok_cells.values()),
+            'nok_cells': len(nok_cells),
+            'has_issues': bool(nok_cells),
+            'is_blocking': is_blocking,
+        }
+    
     @staticmethod
     def determine_thickness_issues(thicknesses, profile=None):
         """Détermine s'il y a des problèmes d'épaisseur."""
@@ -90,9 +161,10 @@ class RollService:
         
         # Si on a un profil, vérifier les tolérances
         if profile:
-            # TODO: Récupérer les specs d'épaisseur du profil
-            # Pour l'instant, on vérifie juste is_within_tolerance
-            pass
+            profile_id = getattr(profile, 'pk', profile)
+            evaluation = RollService.evaluate_thicknesses(thicknesses, profile_id)
+            if evaluation is not None:
+                return evaluation['has_issues']
         
         # Vérifier s'il y a des épaisseurs hors tolérance
         return any(not t.is_within_tolerance for t in thicknesses)
@@ -138,11 +210,100 @@ class RollService:
         
         return 'PRODUCTION'
     
+    @staticmethod
+    def find_first_free_roll_number(of_number, start=1):
+        """
+        Premier numéro de rouleau >= start non utilisé pour un OF.
+        
+        Le trou est cherché en SQL (NOT EXISTS sur le numéro suivant) via
+        l'index (fabrication_order, roll_number), sans charger les numéros.
+        """
+        rolls = Roll.objects.filter(
+            fabrication_order__order_number=of_number,
+            roll_number__isnull=False
+        )
+        
+        if not rolls.filter(roll_number=start).exists():
+            return start
+        
+        # Plus petit numéro utilisé dont le suivant est libre
+        last_before_gap = rolls.filter(
+            roll_number__gte=start
+        ).filter(
+            ~Exists(rolls.filter(roll_number=OuterRef('roll_number') + 1))
+        ).aggregate(Min('roll_number'))['roll_number__min']
+        
+        return last_before_gap + 1
+    
+    def reserve_next_roll_number(self, of_number, session_key=None):
+        """
+        Réserve le premier numéro de rouleau libre d'un OF pour un poste de saisie.
+        
+        Un numéro est libre s'il n'est ni utilisé par un rouleau ni réservé par
+        un autre poste. La réservation repose sur une contrainte d'unicité :
+        deux postes concurrents ne peuvent pas obtenir le même numéro.
+        
+        Args:
+            of_number: Numéro d'OF
+            session_key: Clé de session du poste (une réservation par session)
+        
+        Returns:
+            int: Le numéro réservé
+        """
+        now = timezone.now()
+        expires_at = now + self.reservation_ttl
+        
+        with transaction.atomic():
+            RollNumberReservation.objects.filter(expires_at__lte=now).delete()
+            
+            if session_key:
+                # Libérer les réservations de ce poste sur d'autres OF
+                RollNumberReservation.objects.filter(
+                    session_key=session_key
+                ).exclude(of_number=of_number).delete()
+                
+                # Réservation déjà détenue par ce poste : on la prolonge
+                existing = RollNumberReservation.objects.filter(
+                    of_number=of_number,
+                    session_key=session_key
+                ).order_by('roll_number').first()
+                if existing:
+                    existing.expires_at = expires_at
+                    existing.save(update_fields=['expires_at'])
+                    return existing.roll_number
+            
+            reserved = set(
+                RollNumberReservation.objects.filter(
+                    of_number=of_number
+                ).values_list('roll_number', flat=True)
+            )
+            
+            candidate = self.find_first_free_roll_number(of_number)
+            while True:
+                if candidate not in reserved:
+                    try:
+                        with transaction.atomic():
+                            RollNumberReservation.objects.create(
+                                of_number=of_number,
+                                roll_number=candidate,
+                                session_key=session_key,
+                                expires_at=expires_at
+                            )
+                        return candidate
+                    except IntegrityError:
+                        # Réservé entre-temps par un autre poste
+                        reserved.add(candidate)
+                candidate = self.find_first_free_roll_number(of_number, start=candidate + 1)
+    
     @transaction.atomic
     def create_roll_with_measurements(self, validated_data, session_data):
         """
         Crée un rouleau complet avec toutes ses mesures et calculs.
         
+        Tous les calculs (masse nette, grammage, moyennes, conformité) sont
+        faits en mémoire avant l'écriture : le rouleau est inséré une seule
+        fois puis ses mesures et défauts en bulk_create.
+        
         Args:
             validated_data: Données validées du serializer
             session_data: Données de session (shift_id, session_key, etc.)
@@ -183,27 +344,22 @@ class RollService:
         )
         validated_data['net_mass'] = net_mass
         
-        # Calculer le grammage
+        # Calculer le grammage avec la laize du profil
+        profile_id = session_data.get('profile_id')
         grammage = self.calculate_grammage(
             net_mass,
             validated_data.get('length'),
-            width=1  # TODO: Récupérer depuis le profil
+            width=ToleranceIndex.get_felt_width(profile_id)
         )
         validated_data['grammage_calc'] = grammage
         
-        # Créer le rouleau
-        roll = Roll.objects.create(**validated_data)
-        
-        # Créer les épaisseurs
-        thickness_objects = []
-        for thickness_data in thicknesses_data:
-            thickness = RollThickness.objects.create(
-                roll=roll,
-                **thickness_data
-            )
-            thickness_objects.append(thickness)
+        # Préparer les épaisseurs en mémoire (pas encore liées au rouleau)
+        thickness_objects = [
+            RollThickness(**thickness_data)
+            for thickness_data in thicknesses_data
+        ]
         
-        # Créer les défauts (en évitant les doublons dans la liste)
+        # Préparer les défauts (en évitant les doublons dans la liste)
         defect_objects = []
         seen_defects = set()
         for defect_data in defects_data:
@@ -219,54 +375,202 @@ class RollService:
                 continue
                 
             seen_defects.add(defect_key)
-            
-            defect = RollDefect.objects.create(
-                roll=roll,
-                **defect_data
-            )
-            defect_objects.append(defect)
+            defect_objects.append(RollDefect(**defect_data))
         
         # Calculer les moyennes d'épaisseur
-        roll.avg_thickness_left = self.calculate_avg_thickness(
+        validated_data['avg_thickness_left'] = self.calculate_avg_thickness(
             thickness_objects, side='left'
         )
-        roll.avg_thickness_right = self.calculate_avg_thickness(
+        validated_data['avg_thickness_right'] = self.calculate_avg_thickness(
             thickness_objects, side='right'
         )
         
-        # Déterminer les problèmes
-        roll.has_thickness_issues = self.determine_thickness_issues(
-            thickness_objects
-        )
-        roll.has_blocking_defects = self.determine_blocking_defects(
+        # Déterminer les problèmes (épaisseurs classées selon le profil du poste)
+        thickness_evaluation = self.evaluate_thicknesses(thickness_objects, profile_id)
+        if thickness_evaluation is not None:
+            validated_data['has_thickness_issues'] = thickness_evaluation['has_issues']
+            # Seules les épaisseurs bloquantes (règle max_nok) rendent le rouleau non conforme
+            thickness_non_conform = thickness_evaluation['is_blocking']
+        else:
+            validated_data['has_thickness_issues'] = self.determine_thickness_issues(
+                thickness_objects
+            )
+            thickness_non_conform = validated_data['has_thickness_issues']
+        validated_data['has_blocking_defects'] = self.determine_blocking_defects(
             defect_objects
         )
         
-        # Déterminer le statut si non fourni
-        if not validated_data.get('status'):
-            # TODO: Vérifier le grammage par rapport au profil
-            grammage_ok = True  # Pour l'instant
-            
-            roll.status = self.determine_roll_status(
-                roll.has_thickness_issues,
-                roll.has_blocking_defects,
-                grammage_ok
+        # Statut calculé par le serveur dans tous les cas : le statut envoyé
+        # par le client peut déclasser le rouleau, jamais le rendre conforme
+        grammage_ok = self.evaluate_grammage(grammage, profile_id) is not False
+        server_status = self.determine_roll_status(
+            thickness_non_conform,
+            validated_data['has_blocking_defects'],
+            grammage_ok
+        )
+        client_status = validated_data.get('status')
+        if server_status == 'NON_CONFORME' or client_status == 'NON_CONFORME':
+            validated_data['status'] = 'NON_CONFORME'
+        else:
+            validated_data['status'] = 'CONFORME'
+        
+        # Déterminer la destination si non fournie (ou incompatible avec un
+        # rouleau déclassé par le serveur)
+        if (
+            not validated_data.get('destination')
+            or (validated_data['status'] != client_status and validated_data['destination'] == 'PRODUCTION')
+        ):
+            validated_data['destination'] = self.determine_destination(
+                validated_data['status']
             )
         
-        # Déterminer la destination si non fournie
-        if not validated_data.get('destination'):
-            roll.destination = self.determine_destination(roll.status)
+        # Créer le rouleau en une seule écriture
+        roll = Roll.objects.create(**validated_data)
+        
+        # Créer les mesures et défauts en lot
+        for thickness in thickness_objects:
+            thickness.roll = roll
+        for defect in defect_objects:
+            defect.roll = roll
         
-        # Sauvegarder les changements
-        roll.save()
+        if thickness_objects:
+            RollThickness.objects.bulk_create(thickness_objects)
+        if defect_objects:
+            RollDefect.objects.bulk_create(defect_objects)
+        
+        # Le numéro est maintenant utilisé : libérer sa réservation
+        if roll.fabrication_order and roll.roll_number:
+            RollNumberReservation.objects.filter(
+                of_number=roll.fabrication_order.order_number,
+                roll_number=roll.roll_number
+            ).delete()
         
         return roll
+    
+    def reevaluate_rolls(self, rolls, profile_id=None, batch_size=500, dry_run=False, progress=None):
+        """
+        Recalcule grammage, tolérances d'épaisseur et statut de rouleaux existants.
+        
+        À lancer après la modification d'une spec de profil. Les rouleaux sont
+        traités par lots d'id croissants (mesures préchargées, écritures en
+        bulk_update) ; la destination n'est jamais modifiée. bulk_update
+        n'émet pas de signal : les totaux des postes concernés (et donc leurs
+        agrégats journaliers), le cache des statistiques et l'export Excel
+        des rouleaux modifiés sont mis à jour à la fin.
+        
+        Args:
+            rolls: QuerySet de rouleaux
+            profile_id: Profil à appliquer (sinon celui historisé dans le TRS du poste)
+            batch_size: Nombre de rouleaux par lot
+            dry_run: Calculer sans rien écrire
+            progress: Fonction appelée après chaque lot avec les compteurs
+        
+        Returns:
+            dict: processed, skipped (sans profil), updated, status_changed
+        """
+        counts = {'processed': 0, 'skipped': 0, 'updated': 0, 'status_changed': 0}
+        rolls = rolls.select_related('shift__trs').prefetch_related('thickness_measurements').order_by('id')
+        last_id = 0
+        updated_roll_ids = []
+        shift_ids = set()
+        
+        while True:
+            batch = list(rolls.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            
+            changed_rolls = []
+            changed_thicknesses = []
+            for roll in batch:
+                counts['processed'] += 1
+                roll_profile_id = profile_id or self._historical_profile_id(roll)
+                if not roll_profile_id:
+                    counts['skipped'] += 1
+                    continue
+                
+                thicknesses = list(roll.thickness_measurements.all())
+                before = {t.pk: t.is_within_tolerance for t in thicknesses}
+                
+                grammage = self.calculate_grammage(
+                    roll.net_mass, roll.length,
+                    width=ToleranceIndex.get_felt_width(roll_profile_id)
+                )
+                grammage_ok = self.evaluate_grammage(grammage, roll_profile_id) is not False
+                
+                evaluation = self.evaluate_thicknesses(thicknesses, roll_profile_id)
+                if evaluation is not None:
+                    has_thickness_issues = evaluation['has_issues']
+                    thickness_non_conform = evaluation['is_blocking']
+                else:
+                    has_thickness_issues = roll.has_thickness_issues
+                    thickness_non_conform = has_thickness_issues
+                
+                status = self.determine_roll_status(
+                    thickness_non_conform, roll.has_blocking_defects, grammage_ok
+                )
+                
+                changed_thicknesses.extend(
+                    t for t in thicknesses if t.is_within_tolerance != before[t.pk]
+                )
+                if (roll.grammage_calc, roll.has_thickness_issues, roll.status) != (grammage, has_thickness_issues, status):
+                    if roll.status != status:
+                        counts['status_changed'] += 1
+                    roll.grammage_calc = grammage
+                    roll.has_thickness_issues = has_thickness_issues
+                    roll.status = status
+                    changed_rolls.append(roll)
+            
+            counts['updated'] += len(changed_rolls)
+            if not dry_run:
+                with transaction.atomic():
+                    Roll.objects.bulk_update(changed_rolls, ['grammage_calc', 'has_thickness_issues', 'status'])
+                    RollThickness.objects.bulk_update(changed_thicknesses, ['is_within_tolerance'])
+                updated_roll_ids.extend(roll.pk for roll in changed_rolls)
+                shift_ids.update(roll.shift_id for roll in changed_rolls if roll.shift_id)
+            
+            if progress:
+                progress(counts)
+        
+        if updated_roll_ids:
+            self._propagate_reevaluation(updated_roll_ids, shift_ids)
+        
+        return counts
+    
+    @staticmethod
+    def _propagate_reevaluation(roll_ids, shift_ids):
+        """Répercute des statuts modifiés sans signal (bulk_update) : postes, statistiques, export."""
+        from exporting.services import export_queue
+        from management.services.statistics_cache import StatisticsCache
+        
+        with transaction.atomic():
+            # save() des postes : les signaux recalculent leurs agrégats journaliers
+            shift_service.refresh_production_summaries(shift_ids)
+            transaction.on_commit(StatisticsCache.bump_version)
+            transaction.on_commit(lambda: export_queue.enqueue_many(roll_ids))
+    
+    @staticmethod
+    def _historical_profile_id(roll):
+        """Profil du poste du rouleau, d'après le nom historisé dans son TRS."""
+        if roll.shift is None:
+            return None
+        trs = getattr(roll.shift, 'trs', None)
+        if trs is None:
+            return None
+        return ToleranceIndex.get_profile_id(trs.profile_name)
 
 
 # Instance singleton du service
 roll_service = RollService()
 
 
+# Champs du poste calculés depuis ses rouleaux (calculate_production_summary)
+SHIFT_SUMMARY_FIELDS = [
+    'total_length', 'ok_length', 'nok_length', 'raw_waste_length',
+    'avg_thickness_left_shift', 'avg_thickness_right_shift', 'avg_grammage_shift',
+]
+
+
 class ShiftService:
     """Service contenant toute la logique métier pour les postes."""
     
@@ -313,92 +617,85 @@ class ShiftService:
         
         return availability_time if availability_time.total_seconds() > 0 else timedelta(0)
     
+    def apply_production_summary(self, shift, rolls):
+        """Reporte sur le poste (sans l'enregistrer) les totaux et moyennes de ses rouleaux."""
+        summary = self.calculate_production_summary(rolls)
+        for field in SHIFT_SUMMARY_FIELDS:
+            setattr(shift, field, summary[field])
+    
+    def refresh_production_summaries(self, shift_ids):
+        """
+        Recalcule et enregistre les totaux et moyennes de postes clôturés
+        (rouleaux réévalués après la clôture).
+        """
+        for shift in Shift.objects.filter(pk__in=shift_ids):
+            self.apply_production_summary(shift, shift.rolls.all())
+            shift.save(update_fields=SHIFT_SUMMARY_FIELDS + ['updated_at'])
+    
     @staticmethod
-    def calculate_production_totals(rolls):
-        """
-        Calcule les totaux de production à partir des rouleaux.
-        Retourne un dict avec: total_length, ok_length, nok_length, raw_waste_length
-        """
-        if not rolls:
-            return {
-                'total_length': 0,
-                'ok_length': 0,
-                'nok_length': 0,
-                'raw_waste_length': 0
-            }
-        
-        totals = {
-            'total_length': 0,
-            'ok_length': 0,
-            'nok_length': 0,
-            'raw_waste_length': 0
-        }
+    def calculate_production_summary(rolls):
+        """
+        Calcule les totaux et moyennes du poste à partir des rouleaux.
         
-        for roll in rolls:
-            if roll.length:
-                totals['total_length'] += roll.length
-                
-                # Répartir selon le statut
-                if roll.status == 'CONFORME':
-                    totals['ok_length'] += roll.length
-                else:
-                    totals['nok_length'] += roll.length
-                
-                # TODO: Calculer raw_waste_length selon la logique métier
+        Un seul aggregate() conditionnel côté base, quel que soit le nombre
+        de rouleaux du poste.
+        
+        Returns:
+            dict: total_length, ok_length, nok_length, raw_waste_length,
+            avg_thickness_left_shift, avg_thickness_right_shift, avg_grammage_shift
+        """
+        with_length = Q(length__isnull=False)
+        result = rolls.aggregate(
+            total_length=Sum('length', filter=with_length),
+            ok_length=Sum('length', filter=with_length & Q(status='CONFORME')),
+            nok_length=Sum('length', filter=with_length & ~Q(status='CONFORME')),
+            avg_thickness_left=Avg('avg_thickness_left'),
+            avg_thickness_right=Avg('avg_thickness_right'),
+            avg_grammage=Avg('grammage_calc')
+        )
         
-        return totals
+        return {
+            'total_length': result['total_length'] or 0,
+            'ok_length': result['ok_length'] or 0,
+            'nok_length': result['nok_length'] or 0,
+            # TODO: Calculer raw_waste_length selon la logique métier
+            'raw_waste_length': 0,
+            'avg_thickness_left_shift': (
+                round(result['avg_thickness_left'], 2) if result['avg_thickness_left'] is not None else None
+            ),
+            'avg_thickness_right_shift': (
+                round(result['avg_thickness_right'], 2) if result['avg_thickness_right'] is not None else None
+            ),
+            'avg_grammage_shift': (
+                round(result['avg_grammage'], 1) if result['avg_grammage'] is not None else None
+            )
+        }
     
     @staticmethod
-    def calculate_shift_averages(rolls):
-        """
-        Calcule les moyennes du poste à partir des rouleaux.
-        Retourne un dict avec: avg_thickness_left, avg_thickness_right, avg_grammage
-        """
-        if not rolls:
-            return {
-                'avg_thickness_left_shift': None,
-                'avg_thickness_right_shift': None,
-                'avg_grammage_shift': None
-            }
-        
-        # Collecter les valeurs non nulles
-        thickness_left_values = []
-        thickness_right_values = []
-        grammage_values = []
-        
-        for roll in rolls:
-            if roll.avg_thickness_left is not None:
-                thickness_left_values.append(roll.avg_thickness_left)
-            if roll.avg_thickness_right is not None:
-                thickness_right_values.append(roll.avg_thickness_right)
-            if roll.grammage_calc is not None:
-                grammage_values.append(roll.grammage_calc)
-        
-        # Calculer les moyennes
-        averages = {}
-        
-        if thickness_left_values:
-            averages['avg_thickness_left_shift'] = round(
-                sum(thickness_left_values) / len(thickness_left_values), 2
-            )
-        else:
-            averages['avg_thickness_left_shift'] = None
+    def propagate_production_dates(shifts):
+        """
+        Recopie la date et la vacation des postes sur leurs rouleaux et leurs défauts.
         
-        if thickness_right_values:
-            averages['avg_thickness_right_shift'] = round(
-                sum(thickness_right_values) / len(thickness_right_values), 2
-            )
-        else:
-            averages['avg_thickness_right_shift'] = None
+        Deux UPDATE avec sous-requête, quel que soit le nombre de postes ;
+        seules les lignes dont la copie diffère sont modifiées.
         
-        if grammage_values:
-            averages['avg_grammage_shift'] = round(
-                sum(grammage_values) / len(grammage_values), 1
-            )
-        else:
-            averages['avg_grammage_shift'] = None
+        Returns:
+            dict: rolls, defects (nombre de lignes mises à jour)
+        """
+        shift_row = Shift.objects.filter(pk=OuterRef('shift_id'))
+        rolls = Roll.objects.filter(shift__in=shifts).exclude(
+            production_date=F('shift__date'), vacation=F('shift__vacation')
+        ).update(
+            production_date=Subquery(shift_row.values('date')[:1]),
+            vacation=Subquery(shift_row.values('vacation')[:1]),
+        )
+        
+        roll_row = Roll.objects.filter(pk=OuterRef('roll_id'))
+        defects = RollDefect.objects.filter(roll__shift__in=shifts).exclude(
+            production_date=F('roll__shift__date')
+        ).update(production_date=Subquery(roll_row.values('production_date')[:1]))
         
-        return averages
+        return {'rolls': rolls, 'defects': defects}
     
     @transaction.atomic
     def create_shift_with_associations(self, validated_data, session_data):
@@ -508,21 +805,13 @@ class ShiftService:
         # Récupérer les rouleaux du poste
         rolls = Roll.objects.filter(shift_id_str=shift.shift_id)
         
-        # Lier les rouleaux au poste via la ForeignKey
-        rolls.update(shift=shift)
+        # Lier les rouleaux au poste via la ForeignKey et recopier la date
+        # et la vacation du poste (statistiques par période sans jointure)
+        rolls.update(shift=shift, production_date=shift.date, vacation=shift.vacation)
+        RollDefect.objects.filter(roll__shift=shift).update(production_date=shift.date)
         
-        # Calculer les totaux de production
-        production_totals = self.calculate_production_totals(rolls)
-        shift.total_length = production_totals['total_length']
-        shift.ok_length = production_totals['ok_length']
-        shift.nok_length = production_totals['nok_length']
-        shift.raw_waste_length = production_totals['raw_waste_length']
-        
-        # Calculer les moyennes
-        averages = self.calculate_shift_averages(rolls)
-        shift.avg_thickness_left_shift = averages['avg_thickness_left_shift']
-        shift.avg_thickness_right_shift = averages['avg_thickness_right_shift']
-        shift.avg_grammage_shift = averages['avg_grammage_shift']
+        # Calculer les totaux de production et les moyennes (une seule requête)
+        self.apply_production_summary(shift, rolls)
         
         # Sauvegarder les changements
         shift.save()
@@ -548,6 +837,16 @@ class ShiftService:
             logger = logging.getLogger(__name__)
             logger.error(f"Erreur création TRS: {str(e)}", exc_info=True)
         
+        # L'agrégat journalier du management est recalculé après le commit
+        # (signaux de management.signals)
+        
+        # Rouleaux liés par update() (sans signal) : les réexporter, le
+        # classeur a maintenant leur opérateur, leur poste et leur profil (TRS)
+        from exporting.services import export_queue
+        roll_ids = list(shift.rolls.values_list('pk', flat=True))
+        if roll_ids:
+            transaction.on_commit(lambda: export_queue.enqueue_many(roll_ids))
+        
         return shift
 
 
@@ -1,3 +1,604 @@
-from django.test import TestCase
+import threading
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from catalog.models import (
+    ParamItem, ProfileTemplate, ProfileParamValue, ProfileSpecValue, QualityDefectType, SpecItem
+)
+from catalog.tolerances import ToleranceIndex
+from exporting.models import ExportJob
+from management.models import DailyProductionRollup
+from management.services.statistics_cache import StatisticsCache
+from planification.models import FabricationOrder, Operator
+from quality.models import RollDefect, RollThickness
+
+from .models import Roll, RollNumberReservation, Shift
+from .services import roll_service, shift_service
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ThicknessToleranceTest(TestCase):
+    """Tests de la classification des épaisseurs selon la spec du profil."""
+
+    def setUp(self):
+        cache.clear()
+        self.profile = ProfileTemplate.objects.create(name='80g/m²')
+        self.spec_value = ProfileSpecValue.objects.create(
+            profile=self.profile,
+            spec_item=SpecItem.objects.create(name='Épaisseur', display_name='Épaisseur', unit='mm', order=1),
+            value_min=Decimal('3.2'),
+            value_min_alert=Decimal('4.0'),
+            value_nominal=Decimal('6.5'),
+            value_max_alert=Decimal('9.0'),
+            max_nok=2,
+            is_blocking=True,
+        )
+
+    def thicknesses(self, values):
+        return [
+            {'meter_position': position, 'measurement_point': point, 'thickness_value': Decimal(value)}
+            for position, point, value in values
+        ]
+
+    def create_roll(self, roll_id, values, **extra):
+        data = {
+            'roll_id': roll_id,
+            'tube_mass': Decimal('800'),
+            'total_mass': Decimal('9000'),
+            'length': Decimal('100'),
+            'thicknesses': self.thicknesses(values),
+            **extra,
+        }
+        return roll_service.create_roll_with_measurements(
+            data, {'shift_id': 'S1', 'session_key': 'abc', 'profile_id': self.profile.pk}
+        )
+
+    def test_client_tolerance_flag_is_ignored(self):
+        roll = self.create_roll('R1', [(3, 'GG', '3.0'), (3, 'GC', '5.0'), (3, 'GD', '9.5')])
+
+        within = dict(roll.thickness_measurements.values_list('measurement_point', 'is_within_tolerance'))
+        self.assertEqual(within, {'GG': False, 'GC': True, 'GD': True})
+        self.assertTrue(roll.has_thickness_issues)
+        # 1 cellule NOK <= max_nok : conforme
+        self.assertEqual(roll.status, 'CONFORME')
+
+    def test_max_nok_rule_blocks_roll(self):
+        roll = self.create_roll('R2', [(3, 'GG', '3.0'), (3, 'GC', '3.0'), (13, 'DD', '2.5')])
+        self.assertEqual(roll.status, 'NON_CONFORME')
+
+        roll = self.create_roll('R3', [(3, 'GG', '3.0'), (3, 'GG', '3.1')])
+        self.assertEqual(roll.status, 'NON_CONFORME')
+
+    def test_client_status_cannot_override_server_verdict(self):
+        nok_cells = [(3, 'GG', '3.0'), (3, 'GC', '3.0'), (13, 'DD', '2.5')]
+
+        # Le client envoie toujours status et destination (sticky-bottom.js)
+        roll = self.create_roll('R10', nok_cells, status='CONFORME', destination='PRODUCTION')
+        self.assertEqual(roll.status, 'NON_CONFORME')
+        self.assertEqual(roll.destination, 'DECOUPE')
+
+        roll = self.create_roll('R11', [(3, 'GG', '6.5')], status='CONFORME', destination='PRODUCTION')
+        self.assertEqual((roll.status, roll.destination), ('CONFORME', 'PRODUCTION'))
+
+        # Un rouleau déclassé par l'opérateur reste non conforme
+        roll = self.create_roll('R12', [(3, 'GG', '6.5')], status='NON_CONFORME', destination='DECOUPE_FORCEE')
+        self.assertEqual((roll.status, roll.destination), ('NON_CONFORME', 'DECOUPE_FORCEE'))
+
+    def test_client_status_through_api(self):
+        self.client.patch('/api/session/', {'profile_id': self.profile.pk}, content_type='application/json')
+
+        response = self.client.post('/api/rolls/', {
+            'roll_id': 'R13',
+            'shift_id_str': 'S1',
+            'length': 100,
+            'tube_mass': 800,
+            'total_mass': 9000,
+            'status': 'CONFORME',
+            'destination': 'PRODUCTION',
+            'thicknesses': [
+                {'meter_position': 3, 'measurement_point': 'GG', 'thickness_value': 3.0},
+                {'meter_position': 3, 'measurement_point': 'GG', 'thickness_value': 3.1},
+            ],
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Roll.objects.get(roll_id='R13').status, 'NON_CONFORME')
+
+    def test_nok_rule_ignores_spec_blocking_flag(self):
+        # Même règle que calculateConformity côté client
+        self.spec_value.is_blocking = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spec_value.save()
+
+        roll = self.create_roll('R4', [(3, 'GG', '3.0'), (3, 'GC', '3.0'), (13, 'DD', '2.5')])
+        self.assertTrue(roll.has_thickness_issues)
+        self.assertEqual(roll.status, 'NON_CONFORME')
+
+        roll = self.create_roll('R5', [(3, 'GG', '3.0'), (3, 'GG', '3.1')])
+        self.assertEqual(roll.status, 'NON_CONFORME')
+
+        roll = self.create_roll('R6', [(3, 'GG', '3.0'), (13, 'DD', '2.5')])
+        self.assertEqual(roll.status, 'CONFORME')
+
+    def test_default_max_nok_cells(self):
+        self.spec_value.max_nok = None
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spec_value.save()
+
+        cells = [(3, 'GG', '3.0'), (3, 'GC', '3.0'), (13, 'DD', '2.5')]
+        roll = self.create_roll('R7', cells)
+        self.assertEqual(roll.status, 'CONFORME')
+
+        roll = self.create_roll('R8', cells + [(23, 'DC', '3.1')])
+        self.assertEqual(roll.status, 'NON_CONFORME')
+
+    def test_index_is_compiled_once(self):
+        ToleranceIndex.get_index()
+        thicknesses = [RollThickness(**data) for data in self.thicknesses([(3, 'GG', '3.0')])]
+
+        with self.assertNumQueries(0):
+            evaluation = roll_service.evaluate_thicknesses(thicknesses, self.profile.pk)
+
+        self.assertEqual(evaluation['nok_cells'], 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GrammageConformityTest(TestCase):
+    """Tests du contrôle du grammage selon la spec Masse Surfacique Globale."""
+
+    def setUp(self):
+        cache.clear()
+        self.profile = ProfileTemplate.objects.create(name='80g/m²')
+        self.spec_value = ProfileSpecValue.objects.create(
+            profile=self.profile,
+            spec_item=SpecItem.objects.create(
+                name='Masse Surfacique Globale', display_name='Masse Surfacique Globale', unit='g/m²', order=1
+            ),
+            value_min=Decimal('72'),
+            value_nominal=Decimal('81'),
+            value_max=Decimal('88'),
+        )
+        ProfileParamValue.objects.create(
+            profile=self.profile,
+            param_item=ParamItem.objects.create(name='Laize', display_name='Laize', category='autre', unit='m'),
+            value=Decimal('2.00'),
+        )
+
+    def create_roll(self, roll_id, total_mass):
+        data = {
+            'roll_id': roll_id,
+            'tube_mass': Decimal('1000'),
+            'total_mass': Decimal(total_mass),
+            'length': Decimal('100'),
+        }
+        return roll_service.create_roll_with_measurements(
+            data, {'shift_id': 'S1', 'session_key': 'abc', 'profile_id': self.profile.pk}
+        )
+
+    def test_grammage_uses_profile_width(self):
+        # (17 200 - 1 000) g / (100 m x 2 m) = 81 g/m²
+        roll = self.create_roll('R1', '17200')
+
+        self.assertEqual(roll.grammage_calc, Decimal('81.00'))
+        self.assertEqual(roll.status, 'CONFORME')
+
+    def test_grammage_out_of_spec_is_non_conform(self):
+        roll = self.create_roll('R2', '20000')
+
+        self.assertEqual(roll.grammage_calc, Decimal('95.00'))
+        self.assertEqual(roll.status, 'NON_CONFORME')
+
+    def test_reevaluation_after_spec_change(self):
+        roll = self.create_roll('R3', '17200')
+
+        self.spec_value.value_max = Decimal('80')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spec_value.save()
+
+        counts = roll_service.reevaluate_rolls(Roll.objects.all(), profile_id=self.profile.pk, batch_size=1)
+
+        roll.refresh_from_db()
+        self.assertEqual(roll.status, 'NON_CONFORME')
+        self.assertEqual(counts['status_changed'], 1)
+
+
+    def test_client_status_cannot_hide_grammage_out_of_spec(self):
+        data = {
+            'roll_id': 'R4',
+            'tube_mass': Decimal('1000'),
+            'total_mass': Decimal('20000'),
+            'length': Decimal('100'),
+            'status': 'CONFORME',
+            'destination': 'PRODUCTION',
+        }
+        roll = roll_service.create_roll_with_measurements(
+            data, {'shift_id': 'S1', 'session_key': 'abc', 'profile_id': self.profile.pk}
+        )
+
+        self.assertEqual(roll.grammage_calc, Decimal('95.00'))
+        self.assertEqual((roll.status, roll.destination), ('NON_CONFORME', 'DECOUPE'))
+
+    def test_reevaluation_updates_shift_rollup_statistics_and_export(self):
+        operator = Operator.objects.create(first_name='Jean', last_name='Dupont')
+        roll = self.create_roll('R5', '17200')
+        with self.captureOnCommitCallbacks(execute=True):
+            shift = Shift.objects.create(date=date(2025, 6, 2), operator=operator, vacation='Matin')
+            Roll.objects.filter(pk=roll.pk).update(shift=shift)
+            shift_service.refresh_production_summaries([shift.pk])
+        self.assertEqual(DailyProductionRollup.objects.get(date=shift.date).ok_length, Decimal('100'))
+
+        self.spec_value.value_max = Decimal('80')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spec_value.save()
+        ExportJob.objects.all().delete()
+        version = StatisticsCache.get_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            roll_service.reevaluate_rolls(Roll.objects.all(), profile_id=self.profile.pk)
+
+        shift.refresh_from_db()
+        self.assertEqual((shift.ok_length, shift.nok_length), (0, Decimal('100')))
+        rollup = DailyProductionRollup.objects.get(date=shift.date)
+        self.assertEqual((rollup.ok_length, rollup.nok_length), (0, Decimal('100')))
+        self.assertNotEqual(StatisticsCache.get_version(), version)
+        self.assertEqual(list(ExportJob.objects.values_list('roll_id', 'status')), [(roll.pk, 'pending')])
+
+
+class ShiftProductionSummaryTest(TestCase):
+    """Totaux et moyennes du poste calculés en un seul aggregate."""
+
+    def create_roll(self, roll_id, length, status, left=None, right=None, grammage=None):
+        return Roll.objects.create(
+            roll_id=roll_id, shift_id_str='S1', length=length, status=status,
+            tube_mass=Decimal('500'), total_mass=Decimal('2500'),
+            avg_thickness_left=left, avg_thickness_right=right, grammage_calc=grammage,
+        )
+
+    def per_roll_summary(self, rolls):
+        """Calcul d'origine, rouleau par rouleau en Python."""
+        totals = {'total_length': 0, 'ok_length': 0, 'nok_length': 0, 'raw_waste_length': 0}
+        values = {'left': [], 'right': [], 'grammage': []}
+        for roll in rolls:
+            if roll.length:
+                totals['total_length'] += roll.length
+                totals['ok_length' if roll.status == 'CONFORME' else 'nok_length'] += roll.length
+            for key, value in [
+                ('left', roll.avg_thickness_left),
+                ('right', roll.avg_thickness_right),
+                ('grammage', roll.grammage_calc),
+            ]:
+                if value is not None:
+                    values[key].append(value)
+
+        def average(items, places):
+            return round(sum(items) / len(items), places) if items else None
+
+        return {
+            **totals,
+            'avg_thickness_left_shift': average(values['left'], 2),
+            'avg_thickness_right_shift': average(values['right'], 2),
+            'avg_grammage_shift': average(values['grammage'], 1),
+        }
+
+    def test_summary_matches_per_roll_calculation(self):
+        self.create_roll('R1', Decimal('100'), 'CONFORME', Decimal('6.10'), Decimal('6.25'), Decimal('80.40'))
+        self.create_roll('R2', Decimal('50.5'), 'NON_CONFORME', Decimal('6.32'), None, Decimal('82.35'))
+        self.create_roll('R3', None, 'CONFORME', None, Decimal('6.02'), None)
+        self.create_roll('R4', Decimal('0'), 'NON_CONFORME')
+        rolls = Roll.objects.filter(shift_id_str='S1')
+
+        with self.assertNumQueries(1):
+            summary = shift_service.calculate_production_summary(rolls)
+
+        self.assertEqual(summary, self.per_roll_summary(rolls))
+        self.assertEqual(summary['total_length'], Decimal('150.5'))
+        self.assertEqual(summary['ok_length'], Decimal('100'))
+        self.assertEqual(summary['nok_length'], Decimal('50.5'))
+        self.assertEqual(summary['avg_thickness_left_shift'], Decimal('6.21'))
+        self.assertEqual(summary['avg_thickness_right_shift'], Decimal('6.14'))
+        self.assertEqual(summary['avg_grammage_shift'], Decimal('81.4'))
+
+    def test_summary_without_rolls(self):
+        with self.assertNumQueries(1):
+            summary = shift_service.calculate_production_summary(Roll.objects.filter(shift_id_str='S0'))
+
+        self.assertEqual(summary, self.per_roll_summary([]))
+
+
+class RollNumberAllocationTest(TestCase):
+    """Attribution des numéros de rouleau : trous, réservations concurrentes, expiration."""
+
+    def setUp(self):
+        self.order = FabricationOrder.objects.create(order_number='3249')
+        for number in (1, 2, 4):
+            self.create_roll(number)
+
+    def create_roll(self, number):
+        return Roll.objects.create(
+            roll_id=f'3249_{number:03d}', fabrication_order=self.order, roll_number=number,
+            tube_mass=Decimal('500'), total_mass=Decimal('2500'),
+        )
+
+    def test_first_free_number_fills_gaps(self):
+        # Numéro de départ libre ? puis NOT EXISTS sur le numéro suivant
+        with self.assertNumQueries(2):
+            self.assertEqual(roll_service.find_first_free_roll_number('3249'), 3)
+
+        self.assertEqual(roll_service.find_first_free_roll_number('3249', start=4), 5)
+        self.assertEqual(roll_service.find_first_free_roll_number('3249', start=6), 6)
+        self.assertEqual(roll_service.find_first_free_roll_number('9999'), 1)
+
+        self.create_roll(3)
+        self.assertEqual(roll_service.find_first_free_roll_number('3249'), 5)
+
+    def test_second_session_skips_active_reservation(self):
+        self.assertEqual(roll_service.reserve_next_roll_number('3249', 'poste-1'), 3)
+        self.assertEqual(roll_service.reserve_next_roll_number('3249', 'poste-2'), 5)
+
+        # Même poste : la réservation est prolongée, pas dupliquée
+        self.assertEqual(roll_service.reserve_next_roll_number('3249', 'poste-1'), 3)
+        self.assertEqual(RollNumberReservation.objects.count(), 2)
+
+    def test_expired_reservation_is_reused(self):
+        roll_service.reserve_next_roll_number('3249', 'poste-1')
+        RollNumberReservation.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(roll_service.reserve_next_roll_number('3249', 'poste-2'), 3)
+        self.assertEqual(
+            list(RollNumberReservation.objects.values_list('session_key', flat=True)), ['poste-2']
+        )
+
+    def test_concurrent_reservation_retries_next_number(self):
+        manager = RollNumberReservation.objects
+        create = manager.create
+        attempts = []
+
+        def racing_create(**kwargs):
+            # Un autre poste réserve le même numéro juste avant nous
+            # (insertion annulée avec le savepoint de la tentative)
+            attempts.append(kwargs['roll_number'])
+            if len(attempts) == 1:
+                create(**{**kwargs, 'session_key': 'poste-concurrent'})
+            return create(**kwargs)
+
+        with mock.patch.object(manager, 'create', side_effect=racing_create):
+            number = roll_service.reserve_next_roll_number('3249', 'poste-1')
+
+        self.assertEqual(attempts, [3, 5])
+        self.assertEqual(number, 5)
+        self.assertEqual(
+            list(RollNumberReservation.objects.values_list('roll_number', 'session_key')),
+            [(5, 'poste-1')],
+        )
+
+    def test_reservation_released_when_roll_created(self):
+        number = roll_service.reserve_next_roll_number('3249', 'poste-1')
+
+        roll_service.create_roll_with_measurements(
+            {
+                'roll_id': f'3249_{number:03d}',
+                'fabrication_order': self.order,
+                'roll_number': number,
+                'length': Decimal('100'),
+                'tube_mass': Decimal('500'),
+                'total_mass': Decimal('2500'),
+            },
+            {'shift_id': 'S1', 'session_key': 'poste-1'},
+        )
+
+        self.assertFalse(RollNumberReservation.objects.exists())
+        self.assertEqual(roll_service.reserve_next_roll_number('3249', 'poste-2'), 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ALLOWED_HOSTS=['testserver'])
+class LiveShiftStateReadersTest(TestCase):
+    """Création de rouleaux et de postes depuis l'état du poste en cours (LiveShiftStore)."""
+
+    def setUp(self):
+        cache.clear()
+        self.operator = Operator.objects.create(first_name='Jean', last_name='Dupont')
+
+    def patch_session(self, data):
+        response = self.client.patch('/api/session/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_roll_uses_profile_of_live_state(self):
+        profile = ProfileTemplate.objects.create(name='80g/m²')
+        ProfileParamValue.objects.create(
+            profile=profile,
+            param_item=ParamItem.objects.create(name='Laize', display_name='Laize', category='autre', unit='m'),
+            value=Decimal('2.00'),
+        )
+        self.patch_session({'profile_id': profile.pk})
+
+        response = self.client.post('/api/rolls/', {
+            'roll_id': 'R1', 'shift_id_str': 'S1', 'length': 100, 'tube_mass': 1000, 'total_mass': 17200,
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        roll = Roll.objects.get(roll_id='R1')
+        # (17 200 - 1 000) g / (100 m x 2 m) : laize du profil de la session
+        self.assertEqual(roll.grammage_calc, Decimal('81.00'))
+        self.assertEqual(roll.session_key, self.client.session.session_key)
+
+    def test_shift_uses_and_resets_live_state(self):
+        self.patch_session({
+            'shift_id': '020625_JeanDupont_Matin',
+            'checklist_responses': {'1': 'ok', '2': 'nok'},
+            'checklist_signature': 'JD',
+            'comment': 'RAS',
+            'wound_length_ok': 250,
+        })
+
+        response = self.client.post('/api/shifts/', {
+            'date': '2025-06-02',
+            'operator': self.operator.pk,
+            'vacation': 'Matin',
+            'start_time': '04:00',
+            'end_time': '12:00',
+            'started_at_beginning': False,
+            'started_at_end': False,
+            'operator_comments': '',
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        checklist = Shift.objects.get().checklist_response
+        self.assertEqual(checklist.responses, {'1': 'ok', '2': 'nok'})
+        self.assertEqual(checklist.operator_signature, 'JD')
+
+        data = self.client.get('/api/session/').json()
+        self.assertIsNone(data['checklist_responses'])
+        self.assertEqual(data['comment'], '')
+        self.assertEqual(data['vacation'], 'ApresMidi')
+        self.assertEqual(data['wound_length_ok'], 0)
+
+
+class ConcurrentRollCreationTest(TransactionTestCase):
+    """Rouleaux enregistrés en même temps par plusieurs postes (base de test sur fichier)."""
+
+    STATIONS = 6
+    ROLLS = 5
+
+    def test_parallel_roll_saves_do_not_fail(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+
+        profile = ProfileTemplate.objects.create(name='80g/m²')
+        order = FabricationOrder.objects.create(order_number='OF1')
+        barrier = threading.Barrier(self.STATIONS)
+        statuses = []
+
+        def station(number):
+            client = Client()
+            try:
+                barrier.wait()
+                for i in range(1, self.ROLLS + 1):
+                    response = client.patch(
+                        '/api/session/', {'profile_id': profile.pk}, content_type='application/json'
+                    )
+                    statuses.append(response.status_code)
+                    response = client.post('/api/rolls/', {
+                        'roll_id': f'OF1_{number}{i:02d}',
+                        'roll_number': number * 100 + i,
+                        'fabrication_order': order.pk,
+                        'shift_id_str': f'S{number}',
+                        'length': 100,
+                        'tube_mass': 900,
+                        'total_mass': 9000,
+                        'thicknesses': [
+                            {'meter_position': 3 + (n // 6) * 5, 'measurement_point': point, 'thickness_value': 6.5}
+                            for n, point in enumerate(['GG', 'GC', 'GD', 'DG', 'DC', 'DD'] * 10)
+                        ],
+                    }, content_type='application/json')
+                    statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=station, args=(n,)) for n in range(1, self.STATIONS + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(set(statuses)), [200, 201])
+        self.assertEqual(Roll.objects.count(), self.STATIONS * self.ROLLS)
+        self.assertEqual(RollThickness.objects.count(), self.STATIONS * self.ROLLS * 60)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductionDateTest(TestCase):
+    """Date et vacation du poste recopiées sur les rouleaux et les défauts."""
+
+    def setUp(self):
+        cache.clear()
+        self.operator = Operator.objects.create(first_name='Jean', last_name='Dupont')
+        self.defect_type = QualityDefectType.objects.create(name='Trou', severity='blocking')
+
+    def create_roll(self, roll_id, shift_id_str, shift=None):
+        roll = Roll.objects.create(
+            roll_id=roll_id,
+            shift=shift,
+            shift_id_str=shift_id_str,
+            length=Decimal('100'),
+            tube_mass=Decimal('500'),
+            total_mass=Decimal('2500'),
+        )
+        RollDefect.objects.create(
+            roll=roll, defect_type=self.defect_type, meter_position=10, side_position='GC'
+        )
+        return roll
+
+    def test_shift_close_copies_date_to_rolls_and_defects(self):
+        roll = self.create_roll('R1', '020625_JeanDupont_Matin')
+
+        shift_service.create_shift_with_associations(
+            {
+                'date': date(2025, 6, 2),
+                'operator': self.operator,
+                'vacation': 'Matin',
+                'start_time': time(4, 0),
+                'end_time': time(12, 0),
+            },
+            {'session_key': None},
+        )
+
+        roll.refresh_from_db()
+        self.assertEqual(roll.production_date, date(2025, 6, 2))
+        self.assertEqual(roll.vacation, 'Matin')
+        self.assertEqual(roll.defects.get().production_date, date(2025, 6, 2))
+
+    def test_shift_edit_updates_copies(self):
+        shift = Shift.objects.create(date=date(2025, 6, 2), operator=self.operator, vacation='Nuit')
+        roll = self.create_roll('R1', shift.shift_id, shift=shift)
+        shift_service.propagate_production_dates([shift.pk])
+
+        shift.date = date(2025, 6, 4)
+        shift.vacation = 'Matin'
+        shift.save()
+
+        roll.refresh_from_db()
+        self.assertEqual((roll.production_date, roll.vacation), (date(2025, 6, 4), 'Matin'))
+        self.assertEqual(roll.defects.get().production_date, date(2025, 6, 4))
+
+        # Sauvegarde sans changement de date ni de vacation : pas de recopie
+        with CaptureQueriesContext(connection) as queries:
+            shift.save(update_fields=['operator_comments'])
+        self.assertFalse([q for q in queries.captured_queries if 'production_roll' in q['sql']])
+
+    def test_backfill_command(self):
+        shift = Shift.objects.create(date=date(2025, 6, 2), operator=self.operator, vacation='Nuit')
+        roll = self.create_roll('R1', shift.shift_id, shift=shift)
+        self.create_roll('R2', 'sans_poste')
+
+        call_command('backfill_production_dates', '--batch-size', '1', stdout=StringIO())
+
+        roll.refresh_from_db()
+        self.assertEqual((roll.production_date, roll.vacation), (date(2025, 6, 2), 'Nuit'))
+        self.assertEqual(roll.defects.get().production_date, date(2025, 6, 2))
+        self.assertFalse(Roll.objects.filter(roll_id='R2', production_date__isnull=False).exists())
+
+        # Correction de la date du poste : la recopie suit, seules les lignes modifiées sont écrites
+        Shift.objects.filter(pk=shift.pk).update(date=date(2025, 6, 3))
+        self.assertEqual(
+            shift_service.propagate_production_dates([shift.pk]), {'rolls': 1, 'defects': 1}
+        )
+        self.assertEqual(
+            shift_service.propagate_production_dates([shift.pk]), {'rolls': 0, 'defects': 0}
+        )
+        self.assertEqual(RollDefect.objects.get(roll=roll).production_date, date(2025, 6, 3))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+        ('production', '0004_roll_production_date_roll_vacation_and_more'),
+        ('quality', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rolldefect',
+            name='production_date',
+            field=models.DateField(blank=True, help_text='Date du poste du rouleau', null=True, verbose_name='Date de production'),
+        ),
+        migrations.AddIndex(
+            model_name='rolldefect',
+            index=models.Index(fields=['production_date', 'defect_type'], name='quality_rol_product_438f28_idx'),
+        ),
+    ]
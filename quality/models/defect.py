@@ -41,6 +41,15 @@ class RollDefect(models.Model):
         help_text="Position transversale du défaut sur la laize"
     )
     
+    # Date du poste du rouleau, recopiée à la sauvegarde du poste
+    # (statistiques par période sans jointure sur les rouleaux et les postes)
+    production_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Date de production",
+        help_text="Date du poste du rouleau"
+    )
+    
     # Détails
     comment = models.TextField(
         blank=True,
@@ -60,6 +69,7 @@ class RollDefect(models.Model):
         indexes = [
             models.Index(fields=['roll', 'meter_position']),
             models.Index(fields=['defect_type', '-created_at']),
+            models.Index(fields=['production_date', 'defect_type']),
         ]
     
     def __str__(self):
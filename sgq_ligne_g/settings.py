@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -54,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'management.middleware.RequestMetricsMiddleware',  # En premier : mesure toute la requête (si REQUEST_METRICS['ENABLED'])
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,14 +90,82 @@ WSGI_APPLICATION = 'sgq_ligne_g.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# SQLite par défaut ; SGQ_DB_ENGINE=postgresql pour un serveur PostgreSQL.
+# Le poste opérateur, le management et le worker d'export écrivent en même
+# temps : SQLite est configuré en WAL (lectures non bloquées par l'écriture),
+# avec attente des verrous et transactions IMMEDIATE (le verrou d'écriture est
+# pris au début de la transaction, pas lors du passage lecture -> écriture,
+# ce qui provoquait les "database is locked" immédiats).
+
+DB_ENGINE = os.environ.get('SGQ_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('SGQ_DB_NAME', 'sgq_ligne_g'),
+            'USER': os.environ.get('SGQ_DB_USER', 'sgq'),
+            'PASSWORD': os.environ.get('SGQ_DB_PASSWORD', ''),
+            'HOST': os.environ.get('SGQ_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('SGQ_DB_PORT', '5432'),
+            # Connexions persistantes, vérifiées avant réutilisation
+            'CONN_MAX_AGE': int(os.environ.get('SGQ_DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SGQ_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': 20,  # Attente d'un verrou (secondes) avant "database is locked"
+                'transaction_mode': 'IMMEDIATE',
+                # Appliqué à chaque nouvelle connexion
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=268435456;'  # 256 Mo
+                    'PRAGMA cache_size=-20000;'  # 20 Mo
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+            # Base de test sur fichier : mêmes verrous qu'en production (threads concurrents)
+            'TEST': {
+                'NAME': os.path.join(tempfile.gettempdir(), 'test_sgq_ligne_g.sqlite3'),
+            },
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Cache partagé entre les processus (statistiques management, version des données)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
 
+# Métriques des requêtes (management.middleware.RequestMetricsMiddleware)
+# Désactivé par défaut ; activation : SGQ_REQUEST_METRICS=1
+# Rapport : python manage.py request_metrics_report
+
+REQUEST_METRICS = {
+    'ENABLED': os.environ.get('SGQ_REQUEST_METRICS', '0') == '1',
+    'BUFFER_SIZE': 5000,  # Mesures conservées par processus
+    'DUMP_DIR': BASE_DIR / 'metrics',
+    'DUMP_INTERVAL': 30,  # Sauvegarde du buffer (secondes)
+    'N_PLUS_ONE_THRESHOLD': 5,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 